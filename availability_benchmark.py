@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''Measures the availability engine on synthetic days of 10000 and 100000 resources.
+
+Needs the App Engine SDK on PYTHONPATH. For every size in --sizes it builds an
+AvailabilityState in memory, with resources spread over a few opening windows
+and --bookings bookings per resource, then times free-slot lookups against a
+scan of every resource, as the engine did before resources were grouped by
+window, and the encoding and decoding of the day as snapshot rows. With
+--datastore it also stores the day in the local datastore stub and times the
+full scan a snapshot build makes against loading the snapshot, which is what a
+cold instance does.'''
+
+import argparse
+import json
+import random
+import time
+import zlib
+
+import resourceShare
+
+DEFAULT_SIZES = '10000,100000'
+DEFAULT_BOOKINGS = 4
+LOOKUPS = 2000
+SLOT_MINUTES = 15
+WINDOWS = [(8 * 60, 20 * 60), (9 * 60, 17 * 60), (6 * 60, 23 * 60), (7 * 60, 22 * 60), (10 * 60, 16 * 60)]
+SEED = 2016
+
+'''helper function to describe count resources, their windows and their bookings on one day'''
+def syntheticDay(count, bookingsPerResource):
+    generator = random.Random(SEED)
+    resources = []
+    for index in range(count):
+        primaryKey = str(resourceShare.LEGACY_KEY_MAX + index + 1)
+        window = generator.choice(WINDOWS)
+        bookings = []
+        for booking in range(bookingsPerResource):
+            start = generator.randrange(window[0], window[1] - SLOT_MINUTES, SLOT_MINUTES)
+            bookings.append(('%s-%d' % (primaryKey, booking), start, start + generator.choice([15, 30, 60])))
+        resources.append((primaryKey, window, bookings))
+    return resources
+
+'''helper function to pick the slots the lookups ask for'''
+def lookupSlots():
+    generator = random.Random(SEED + 1)
+    slots = []
+    for index in range(LOOKUPS):
+        start = generator.randrange(8 * 60, 19 * 60, SLOT_MINUTES)
+        slots.append((start, start + generator.choice([30, 60])))
+    return slots
+
+'''helper function to answer a lookup the way the engine did before: check every resource whose window covers the
+slot, then cut the answer to the limit'''
+def scanFree(state, start, end, limit):
+    freeKeys = []
+    for primaryKey, window in state.windows.items():
+        if window[0] <= start and window[1] >= end:
+            booked = state.bookings.get(primaryKey)
+            if booked is None or not booked.overlaps(start, end):
+                freeKeys.append(state.resourceKeys[primaryKey])
+    return freeKeys[:limit]
+
+def report(step, count, seconds, detail=''):
+    print('%-32s %9d ops %9.3f s %12.0f ops/s   %s' % (step, count, seconds, count / max(seconds, 1e-9), detail))
+
+def benchmarkMemory(count, bookingsPerResource):
+    day = resourceShare.localNow().date()
+    resources = syntheticDay(count, bookingsPerResource)
+    started = time.time()
+    state = resourceShare.AvailabilityState(day)
+    for primaryKey, window, bookings in resources:
+        state.setWindow(primaryKey, resourceShare.entityKey(resourceShare.Resource, primaryKey), window)
+        for reservationKey, start, end in bookings:
+            state.book(primaryKey, reservationKey, (start, end), day)
+    report('build %d resources' % count, count, time.time() - started,
+           '%d windows, %d bookings' % (len(state.groups), count * bookingsPerResource))
+
+    slots = lookupSlots()
+    started = time.time()
+    found = sum(len(state.free(start, end, resourceShare.TIME_SEARCH_LIMIT)) for start, end in slots)
+    report('lookup, grouped windows', len(slots), time.time() - started, '%d resources found' % found)
+    started = time.time()
+    found = sum(len(scanFree(state, start, end, resourceShare.TIME_SEARCH_LIMIT)) for start, end in slots)
+    report('lookup, scan every resource', len(slots), time.time() - started, '%d resources found' % found)
+
+    started = time.time()
+    windows, bookings = state.rows()
+    encoded = zlib.compress(json.dumps([windows, bookings]))
+    report('encode snapshot rows', count, time.time() - started, '%d compressed bytes' % len(encoded))
+    started = time.time()
+    windows, bookings = json.loads(zlib.decompress(encoded))
+    resourceShare.AvailabilityState.fromRows(day, windows, bookings)
+    report('decode snapshot rows', count, time.time() - started)
+
+def benchmarkDatastore(count, bookingsPerResource):
+    from google.appengine.ext import ndb
+    from tests import fixture
+    bed = fixture.setUpStubs()
+    ndb.get_context().set_cache_policy(False)
+    try:
+        day = resourceShare.localNow().date()
+        entities = []
+        for primaryKey, window, bookings in syntheticDay(count, bookingsPerResource):
+            resource = resourceShare.Resource(key=resourceShare.entityKey(resourceShare.Resource, primaryKey),
+                                              primaryKey=primaryKey,
+                                              resource_StartTime=resourceShare.toTimeString(window[0]),
+                                              resource_EndTime=resourceShare.toTimeString(window[1]))
+            schedule = resourceShare.ResourceSchedule(key=resourceShare.scheduleKey(primaryKey, day),
+                                                      resource_PrimaryKey=primaryKey, day=day)
+            for reservationKey, start, end in sorted(bookings, key=lambda booking: booking[1]):
+                if not schedule.overlaps(start, end):
+                    schedule.insert(reservationKey, start, end)
+            entities.extend([resource, schedule])
+        for index in range(0, len(entities), 500):
+            ndb.put_multi(entities[index:index + 500])
+
+        started = time.time()
+        resourceShare.buildAvailabilitySnapshot(day.toordinal())
+        report('snapshot build (full scan)', count, time.time() - started)
+        started = time.time()
+        resourceShare.readAvailabilitySnapshot(day)
+        report('snapshot load', count, time.time() - started)
+    finally:
+        bed.deactivate()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure the availability engine on synthetic days.')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='comma separated resource counts')
+    parser.add_argument('--bookings', type=int, default=DEFAULT_BOOKINGS, help='bookings per resource')
+    parser.add_argument('--datastore', action='store_true', help='also time snapshot builds and loads on the stubs')
+    options = parser.parse_args()
+    for size in [int(size) for size in options.sizes.split(',')]:
+        benchmarkMemory(size, options.bookings)
+        if options.datastore:
+            benchmarkDatastore(size, options.bookings)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''Fires concurrent bookings at the local stubs and checks nothing was lost or double booked.
+
+Needs the App Engine SDK on PYTHONPATH and WebTest installed. --threads
+threads (50 by default) each book --bookings reservations (1 by default) of a
+random slot and length on a random one of --resources resources and --days days
+(1 of each by default, so every booking contends) through bookReservation, in a
+fresh NDB context, retrying when the transaction fails on contention. It prints
+the throughput and then asserts that every booking either went through or was
+turned down as a conflict, that the counter shards of every resource add up to
+its bookings that went through, as does the count pages show, and that the
+stored reservations of every resource and day neither overlap nor differ from
+its schedule. With --min-rate it also fails below that many bookings a second.'''
+
+import argparse
+import datetime
+import random
+import threading
+import time
+
+from google.appengine.api import datastore_errors
+from google.appengine.ext import ndb
+
+import resourceShare
+from tests import fixture
+
+DEFAULT_THREADS = 50
+DEFAULT_BOOKINGS = 1
+DEFAULT_RESOURCES = 1
+DEFAULT_DAYS = 1
+# bookings pick a start among the first SLOTS quarter hours from 08:00 and one of DURATIONS, so they clash often
+SLOT_MINUTES = 15
+SLOTS = 16
+DURATIONS = [15, 30, 60]
+MAX_ATTEMPTS = 20
+SEED = 2016
+
+'''the outcome of every booking, filled in by the threads; booked holds (primaryKey, resource primaryKey, day)'''
+class Outcomes(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.booked = []
+        self.conflicts = 0
+        self.failed = []
+        self.retries = 0
+
+    def record(self, booked=None, conflict=False, failed=None, retries=0):
+        with self.lock:
+            if booked is not None:
+                self.booked.append(booked)
+            if conflict:
+                self.conflicts += 1
+            if failed is not None:
+                self.failed.append(failed)
+            self.retries += retries
+
+'''helper function to book one random slot of the resource on the day, retrying when contention fails the
+transaction, and record the outcome'''
+def bookOne(resource, day, generator, outcomes):
+    start = 8 * 60 + generator.randrange(SLOTS) * SLOT_MINUTES
+    duration = generator.choice(DURATIONS)
+    for attempt in range(MAX_ATTEMPTS):
+        reservation = resourceShare.reservationFromJson({
+            'reservation_StartTime': resourceShare.toTimeString(start),
+            'reservation_Duration': duration,
+            'reservation_Date': day.isoformat(),
+        }, resource, fixture.OWNER)
+        try:
+            resourceShare.bookReservation(resource, reservation)
+        except resourceShare.ReservationConflict:
+            outcomes.record(conflict=True, retries=attempt)
+            return
+        except datastore_errors.TransactionFailedError:
+            time.sleep(generator.random() * 0.05 * (attempt + 1))
+            continue
+        except Exception as exception:
+            outcomes.record(failed='%s: %s' % (exception.__class__.__name__, exception), retries=attempt)
+            return
+        outcomes.record(booked=(reservation.primaryKey, resource.primaryKey, day), retries=attempt)
+        return
+    outcomes.record(failed='gave up after %d attempts' % MAX_ATTEMPTS, retries=MAX_ATTEMPTS)
+
+'''helper function to book bookingCount random slots of random resources and days from one thread'''
+def bookMany(resources, days, bookingCount, generator, outcomes):
+    fixture.freshContext()
+    for booking in range(bookingCount):
+        bookOne(generator.choice(resources), generator.choice(days), generator, outcomes)
+
+'''helper function to check the stored reservations, schedule and counter of one resource on one day against the
+bookings that went through'''
+def checkDay(resource, day, booked):
+    stored = resourceShare.Reservation.query(resourceShare.Reservation.resource_PrimaryKey == resource.primaryKey,
+                                             resourceShare.Reservation.reservation_Date == day).fetch()
+    assert sorted(reservation.primaryKey for reservation in stored) == sorted(booked), (
+        '%d reservations of %s on %s stored, %d booked' % (len(stored), resource.primaryKey, day, len(booked)))
+    intervals = sorted(resourceShare.reservationInterval(reservation) for reservation in stored)
+    for previous, following in zip(intervals, intervals[1:]):
+        assert previous[1] <= following[0], 'reservations %s and %s of %s on %s overlap' % (
+            previous, following, resource.primaryKey, day)
+    schedule = resourceShare.scheduleKey(resource.primaryKey, day).get()
+    scheduled = sorted(schedule.reservationKeys) if schedule else []
+    assert scheduled == sorted(booked), '%d of %s on %s scheduled, %d booked' % (
+        len(scheduled), resource.primaryKey, day, len(booked))
+
+'''helper function to check every resource and day against the bookings that went through'''
+def check(resources, days, outcomes, bookingCount):
+    fixture.freshContext()
+    assert not outcomes.failed, 'bookings failed: %s' % outcomes.failed[:5]
+    assert len(outcomes.booked) + outcomes.conflicts == bookingCount, (
+        '%d booked and %d conflicts of %d bookings' % (len(outcomes.booked), outcomes.conflicts, bookingCount))
+    shown = resourceShare.attachReservationCounts(ndb.get_multi([resource.key for resource in resources]))
+    for resource, counted in zip(resources, shown):
+        booked = [entry[0] for entry in outcomes.booked if entry[1] == resource.primaryKey]
+        shards = [shard for shard in ndb.get_multi(resourceShare.reservationShardKeys(resource.primaryKey)) if shard]
+        shardSum = sum(shard.count for shard in shards)
+        assert shardSum == len(booked), 'counter shards of %s add up to %d, %d booked' % (
+            resource.primaryKey, shardSum, len(booked))
+        assert counted.reservationCount == len(booked), 'pages show %d reservations of %s, %d booked' % (
+            counted.reservationCount, resource.primaryKey, len(booked))
+        for day in days:
+            checkDay(resource, day, [entry[0] for entry in outcomes.booked
+                                     if entry[1] == resource.primaryKey and entry[2] == day])
+
+def loadtestBookings(threadCount, bookingCount, resourceCount, dayCount, minRate):
+    resources = [resourceShare.applyResourceJson(resourceShare.newResource(fixture.OWNER), {
+        'resource_Name': 'Contended %d' % index, 'resource_StartTime': '08:00', 'resource_EndTime': '20:00'})
+        for index in range(resourceCount)]
+    ndb.put_multi(resources)
+    today = resourceShare.localNow().date()
+    days = [today + datetime.timedelta(days=offset) for offset in range(1, dayCount + 1)]
+    outcomes = Outcomes()
+    generator = random.Random(SEED)
+    threads = [threading.Thread(target=bookMany, args=(
+        resources, days, bookingCount, random.Random(generator.random()), outcomes)) for index in range(threadCount)]
+    started = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.time() - started
+    total = threadCount * bookingCount
+    rate = total / max(seconds, 1e-9)
+    print('%d bookings of %d resources on %d days from %d threads: %d booked, %d conflicts, %d failed, %d retries '
+          'in %.2f s, %.1f bookings/s' % (total, resourceCount, dayCount, threadCount, len(outcomes.booked),
+                                          outcomes.conflicts, len(outcomes.failed), outcomes.retries, seconds, rate))
+    check(resources, days, outcomes, total)
+    print('counts, counter shards and schedules agree')
+    if minRate is not None:
+        assert rate >= minRate, '%.1f bookings/s, below the %.1f asked for' % (rate, minRate)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fire concurrent bookings at the stubs.')
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS, help='threads booking at once')
+    parser.add_argument('--bookings', type=int, default=DEFAULT_BOOKINGS, help='bookings per thread')
+    parser.add_argument('--resources', type=int, default=DEFAULT_RESOURCES, help='resources the bookings spread over')
+    parser.add_argument('--days', type=int, default=DEFAULT_DAYS, help='days from tomorrow the bookings spread over')
+    parser.add_argument('--min-rate', type=float, help='fail below this many bookings a second')
+    options = parser.parse_args()
+    bed = fixture.setUpStubs()
+    try:
+        loadtestBookings(options.threads, options.bookings, options.resources, options.days, options.min_rate)
+    finally:
+        bed.deactivate()
@@ -0,0 +1,20 @@
+$(document).ready(function(){
+  // Suggest resource names from the JSON typeahead endpoint while typing
+  var timer = null;
+  $("#name").on('input', function() {
+    var text = $(this).val();
+    clearTimeout(timer);
+    if (text.length < 2) {
+      $("#nameSuggestions").empty();
+      return;
+    }
+    timer = setTimeout(function() {
+      $.getJSON("/searchResource/suggest", {q: text}, function(suggestions) {
+        var list = $("#nameSuggestions").empty();
+        $.each(suggestions, function(i, suggestion) {
+          list.append($("<option>").attr("value", suggestion.name));
+        });
+      });
+    }, 200);
+  });
+})
@@ -24,6 +24,11 @@ function validateForm() {
 			temp = false;
 			return false;
 		}
+		if (document.getElementById("repeat").value && !document.getElementById("until").value) {
+			alert("Please enter the last day of the repeating reservation.");
+			temp = false;
+			return false;
+		}
 		if (temp) {
 			alert(" Success! Reservation Completed! ");
 		}
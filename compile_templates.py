@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''Precompiles the page templates into compiled_templates/ for jinja2.ModuleLoader.
+
+Run before every deploy (make deploy does it), with the jinja2 version app.yaml
+pins. The names of the templates and the jinja2 version go into
+compiled_templates/manifest.json; the app skips a compiled template of another
+jinja2 version, or one whose module is older than its source. With --benchmark
+it also reports the mean load and render time of every template, from source
+and precompiled.'''
+
+import json
+import os
+import sys
+import timeit
+
+import jinja2
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+COMPILED_TEMPLATES_DIR = os.path.join(APP_DIR, 'compiled_templates')
+# the jinja2 library version app.yaml pins; modules compiled by another version are not used by the app
+JINJA2_VERSION = '2.6'
+BENCHMARK_RUNS = 200
+BENCHMARK_ROWS = 50
+LOAD_RUNS = 20
+
+'''helper function to build an environment configured like JINJA_ENVIRONMENT in resourceShare/rendering.py'''
+def makeEnvironment(loader):
+    return jinja2.Environment(
+        loader=loader,
+        extensions=['jinja2.ext.autoescape'],
+        autoescape=True)
+
+'''helper function to list the page and fragment templates at the top of the app'''
+def templateNames():
+    return sorted(name for name in os.listdir(APP_DIR) if name.endswith('.html'))
+
+def compileTemplates():
+    if jinja2.__version__ != JINJA2_VERSION:
+        print('Warning: compiling with jinja2 %s, but app.yaml pins %s; the app will not use these modules' % (
+            jinja2.__version__, JINJA2_VERSION))
+    environment = makeEnvironment(jinja2.FileSystemLoader(APP_DIR))
+    names = set(templateNames())
+    environment.compile_templates(COMPILED_TEMPLATES_DIR, filter_func=lambda name: name in names,
+                                  zip=None, ignore_errors=False)
+    manifest = {'jinja2': jinja2.__version__, 'templates': sorted(names)}
+    with open(os.path.join(COMPILED_TEMPLATES_DIR, 'manifest.json'), 'w') as manifestFile:
+        json.dump(manifest, manifestFile, indent=2, sort_keys=True)
+    print('Compiled %d templates into %s' % (len(names), COMPILED_TEMPLATES_DIR))
+
+'''helper function to build template values resembling a busy page, rowCount rows per table'''
+def sampleValues(rowCount):
+    resource = {
+        'resource_Name': 'Conference Room 3A',
+        'resource_Owner': 'owner@example.com',
+        'resource_StartTime': '09:00',
+        'resource_EndTime': '17:00',
+        'resource_tag': ['meeting', 'projector', 'third floor'],
+        'primaryKey': '123456',
+        'date': '2016-11-30 10:00:00',
+        'justCreated': 0,
+        'reservationCount': 12,
+    }
+    reservation = {
+        'resource_Name': 'Conference Room 3A',
+        'resource_PrimaryKey': '123456',
+        'reservation_Owner': 'user@example.com',
+        'reservation_StartTime': '10:00',
+        'reservation_EndTime': '11:00',
+        'reservation_Duration': 60,
+        'reservation_Notes': 'Weekly sync',
+        'primaryKey': '654321',
+    }
+    summary = {'tagName': 'meeting', 'count': 42}
+    return {
+        'user': 'user@example.com',
+        'username': 'user',
+        'url': '/logout',
+        'url_linktext': 'Logout',
+        'showFull': True,
+        'isEditable': True,
+        'conflict': False,
+        'resources': [resource] * rowCount,
+        'nextCursor': 'cursor',
+        'userResources': [resource] * rowCount,
+        'userReservations': [reservation] * rowCount,
+        'allResourcesTable': '',
+        'reservingResource': resource['resource_Name'],
+        'reservingResourceDetails': [resource],
+        'reservingResourceKey': resource['primaryKey'],
+        'outputResource': [resource],
+        'outputReservation': [reservation],
+        'upcomingReservations': [reservation] * rowCount,
+        'tagName': 'meeting',
+        'tagResources': [resource] * rowCount,
+        'tagSummary': summary,
+        'tagCloud': [summary] * rowCount,
+        'resource': resource,
+        'selectedReservations': [reservation] * rowCount,
+        'selectedResources': [resource] * rowCount,
+        'searchString': 'room',
+        'startTime': '10:00',
+        'endTime': '11:00',
+        'type': 'name',
+    }
+
+def benchmark():
+    compiledEnvironment = makeEnvironment(jinja2.ModuleLoader(COMPILED_TEMPLATES_DIR))
+    values = sampleValues(BENCHMARK_ROWS)
+    print('%-24s %16s %16s %12s' % ('template', 'source load ms', 'compiled load ms', 'render ms'))
+    for name in templateNames():
+        loadSource = timeit.timeit(lambda: makeEnvironment(jinja2.FileSystemLoader(APP_DIR)).get_template(name), number=LOAD_RUNS) / LOAD_RUNS
+        loadCompiled = timeit.timeit(lambda: makeEnvironment(jinja2.ModuleLoader(COMPILED_TEMPLATES_DIR)).get_template(name), number=LOAD_RUNS) / LOAD_RUNS
+        template = compiledEnvironment.get_template(name)
+        render = timeit.timeit(lambda: template.render(values), number=BENCHMARK_RUNS) / BENCHMARK_RUNS
+        print('%-24s %16.3f %16.3f %12.3f' % (name, loadSource * 1000, loadCompiled * 1000, render * 1000))
+
+if __name__ == '__main__':
+    compileTemplates()
+    if '--benchmark' in sys.argv[1:]:
+        benchmark()
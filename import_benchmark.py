@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''Measures bulk import and export throughput against the local datastore stub.
+
+Needs the App Engine SDK on PYTHONPATH. Builds a resources file and a
+reservations file of --rows rows each (100000 by default, as CSV or with
+--jsonl as JSONL), imports them through runImport and exports them again
+through runExport, printing rows per second for every step.'''
+
+import datetime
+import json
+import sys
+import time
+from StringIO import StringIO
+
+from google.appengine.ext import ndb
+
+import resourceShare
+from tests import fixture
+
+DEFAULT_ROWS = 100000
+OWNER = 'benchmark@example.com'
+SLOT_MINUTES = 15
+SLOTS_PER_RESOURCE = 48
+
+'''helper function to write records as a CSV or JSONL file held in memory'''
+def buildFile(fields, records, fileFormat):
+    data = StringIO()
+    if fileFormat == 'csv':
+        data.write(','.join(fields) + '\n')
+        for record in records:
+            data.write(','.join(str(record[field]) for field in fields) + '\n')
+    else:
+        for record in records:
+            data.write(json.dumps(record) + '\n')
+    data.seek(0)
+    return data
+
+'''helper function to describe rowCount resources open from 08:00 till 20:00'''
+def resourceRecords(rowCount):
+    for index in xrange(rowCount):
+        yield {
+            'resource_Name': 'Room %d' % index,
+            'resource_StartTime': '08:00',
+            'resource_EndTime': '20:00',
+            'resource_tag': 'site%d;floor%d' % (index % 10, index % 7),
+        }
+
+'''helper function to describe rowCount back to back reservations, filling one resource before the next and moving
+to the following day once every resource is full'''
+def reservationRecords(rowCount, primaryKeys):
+    today = resourceShare.localNow().date()
+    for index in xrange(rowCount):
+        slot = index % SLOTS_PER_RESOURCE
+        resourceIndex = index // SLOTS_PER_RESOURCE
+        yield {
+            'resource_PrimaryKey': primaryKeys[resourceIndex % len(primaryKeys)],
+            'reservation_StartTime': resourceShare.toTimeString(8 * 60 + slot * SLOT_MINUTES),
+            'reservation_Duration': SLOT_MINUTES,
+            'reservation_Notes': 'benchmark',
+            'reservation_Date': (today + datetime.timedelta(days=resourceIndex // len(primaryKeys))).isoformat(),
+        }
+
+'''helper function to import a file and run the job, and its continuations, to the end'''
+def importFile(kind, fileFormat, data):
+    job = resourceShare.createImportJob(OWNER, kind, fileFormat, data)
+    while job.status not in ('done', 'failed'):
+        resourceShare.runImport(job.key.id())
+        job = job.key.get()
+    return job
+
+'''helper function to run an export job of the benchmark owner, and its continuations, to the end and count the
+bytes of its chunks'''
+def exportBytes(kind, fileFormat):
+    job = resourceShare.createExportJob(OWNER, kind, fileFormat)
+    while job.status != 'done':
+        resourceShare.runExport(job.key.id())
+        job = job.key.get()
+    chunks = ndb.get_multi([resourceShare.exportChunkKey(job.key, index) for index in range(job.chunkCount)])
+    return job, sum(len(chunk.data) for chunk in chunks)
+
+def report(step, rowCount, seconds, detail):
+    print('%-24s %8d rows %10.1f s %10.0f rows/s   %s' % (step, rowCount, seconds, rowCount / max(seconds, 1e-9), detail))
+
+def benchmark(rowCount, fileFormat):
+    resourceFields = ['resource_Name', 'resource_StartTime', 'resource_EndTime', 'resource_tag']
+    started = time.time()
+    job = importFile('resources', fileFormat, buildFile(resourceFields, resourceRecords(rowCount), fileFormat))
+    report('import resources', job.rowNumber, time.time() - started, 'imported %d, failed %d' % (job.imported, job.failed))
+
+    primaryKeys = [key.id() for key in resourceShare.Resource.query().fetch(keys_only=True)]
+    reservationFields = ['resource_PrimaryKey', 'reservation_StartTime', 'reservation_Duration', 'reservation_Notes',
+                         'reservation_Date']
+    started = time.time()
+    job = importFile('reservations', fileFormat,
+                     buildFile(reservationFields, reservationRecords(rowCount, primaryKeys), fileFormat))
+    report('import reservations', job.rowNumber, time.time() - started, 'imported %d, failed %d' % (job.imported, job.failed))
+
+    started = time.time()
+    job, size = exportBytes('resources', fileFormat)
+    report('export resources', job.rowCount, time.time() - started, '%d bytes in %d parts' % (size, job.chunkCount))
+    started = time.time()
+    job, size = exportBytes('reservations', fileFormat)
+    report('export reservations', job.rowCount, time.time() - started, '%d bytes in %d parts' % (size, job.chunkCount))
+
+if __name__ == '__main__':
+    arguments = sys.argv[1:]
+    rowCount = int(arguments[arguments.index('--rows') + 1]) if '--rows' in arguments else DEFAULT_ROWS
+    bed = fixture.setUpStubs(OWNER)
+    ndb.get_context().set_cache_policy(False)
+    try:
+        benchmark(rowCount, 'jsonl' if '--jsonl' in arguments else 'csv')
+    finally:
+        bed.deactivate()
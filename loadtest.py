@@ -0,0 +1,499 @@
+#!/usr/bin/env python
+
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''Load-tests every route of the app against the local App Engine stubs.
+
+Needs the App Engine SDK on PYTHONPATH and WebTest installed. Seeds the
+datastore, memcache, users, mail and task queue stubs with --resources
+resources (1000 by default) carrying tags, --reservations reservations (10000
+by default) and --rules recurring reservations (200 by default), then sends
+--requests requests (50 by default) to every scenario from --concurrency
+threads (8 by default). Latency percentiles, the RPC counts reported by
+PerformanceMiddleware and the peak memory of the process are printed per
+scenario and appended as one JSON line to --output (loadtest_results.jsonl by
+default), so runs at different sizes and revisions can be compared. With
+--strict a request over the RPC budget of its route counts as an error.
+
+With --sweep 1000,10000,100000 it instead seeds fresh stubs at every listed
+number of resources, keeping --reservations per --resources reservations per
+resource and the signed in user's own share fixed, and prints the latency,
+datastore RPCs and entities read of the landing page at each size. The sweep
+renders the All Resources fragment on every request instead of serving it from
+memcache, so the numbers show the queries behind the page.'''
+
+import argparse
+import datetime
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from StringIO import StringIO
+from resource import getrusage, RUSAGE_SELF
+
+from google.appengine.ext import ndb
+import webtest
+
+import resourceShare
+from tests import fixture
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_RESOURCES = 1000
+DEFAULT_RESERVATIONS = 10000
+DEFAULT_RULES = 200
+DEFAULT_REQUESTS = 50
+DEFAULT_CONCURRENCY = 8
+DEFAULT_OUTPUT = 'loadtest_results.jsonl'
+# the landing page scenarios a --sweep runs at every size, and how many resources and reservations of each the signed
+# in user owns however large the datastore grows
+SWEEP_SCENARIOS = ('main page', 'main page, own only')
+SWEEP_OWN = 20
+OWNER = 'loadtest@example.com'
+# one resource and reservation in OWNER_SHARE belongs to the signed in user, the rest to OTHER_USERS other users
+OWNER_SHARE = 10
+OTHER_USERS = 50
+TAGS = ['lab', 'projector', 'quiet', 'whiteboard', 'video', 'floor1', 'floor2', 'floor3', 'large', 'small']
+# single reservations take the slots from 08:00 till 18:00 and rules the ones from 18:00 till 20:00, so seeding
+# never clashes
+SLOT_MINUTES = 15
+RESERVATION_SLOTS = 40
+RULE_SLOTS = 8
+SEED = 2016
+
+'''the seeded entities the scenarios pick from; the disposable ones belong to the signed in user and are handed out
+once each to the scenarios that delete'''
+class Dataset(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.generator = random.Random(SEED)
+        self.resources = []
+        self.ownResources = []
+        self.reservations = []
+        self.ownReservations = []
+        self.rules = []
+        self.disposable = {'resources': [], 'reservations': [], 'rules': []}
+        self.importJobId = None
+        self.exportJobId = None
+
+    def pick(self, values):
+        with self.lock:
+            return self.generator.choice(values)
+
+    def number(self, upper):
+        with self.lock:
+            return self.generator.randrange(upper)
+
+    def take(self, kind, count=1):
+        with self.lock:
+            taken = self.disposable[kind][:count]
+            del self.disposable[kind][:count]
+            return taken
+
+    def futureDay(self):
+        with self.lock:
+            day = resourceShare.localNow().date() + datetime.timedelta(days=self.generator.randint(30, 365))
+            return day.isoformat()
+
+    def slot(self, slots, offset=0):
+        with self.lock:
+            return resourceShare.toTimeString(8 * 60 + (offset + self.generator.randrange(slots)) * SLOT_MINUTES)
+
+'''helper function to pick the owner of the index-th seeded entity; with ownLimit the signed in user owns no more
+than that many'''
+def seededOwner(index, ownLimit=None):
+    if index % OWNER_SHARE == 0 and (ownLimit is None or index < ownLimit * OWNER_SHARE):
+        return OWNER
+    return 'user%d@example.com' % (index % OTHER_USERS)
+
+'''helper function to seed resources, reservations, recurring reservations, an import job and a finished export job
+through the same code paths the app writes them with; every disposable entity is seeded on top of the requested sizes'''
+def seed(dataset, resourceCount, reservationCount, ruleCount, requestCount, ownLimit=None):
+    today = resourceShare.localNow().date()
+    resources = []
+    for index in range(resourceCount + requestCount * 2):
+        owner = OWNER if index >= resourceCount else seededOwner(index, ownLimit)
+        resource = resourceShare.applyResourceJson(resourceShare.newResource(owner), {
+            'resource_Name': 'Room %d' % index,
+            'resource_StartTime': '08:00',
+            'resource_EndTime': '20:00',
+            'resource_tag': [TAGS[index % len(TAGS)], TAGS[(index // len(TAGS)) % len(TAGS)]],
+        })
+        resources.append(resource)
+    ndb.put_multi(resources)
+    resourceShare.resourcesImported(resources)
+    dataset.resources = [seeded.primaryKey for seeded in resources[:resourceCount]]
+    dataset.ownResources = [seeded.primaryKey for seeded in resources[:resourceCount] if seeded.resource_Owner == OWNER]
+    dataset.disposable['resources'] = [seeded.primaryKey for seeded in resources[resourceCount:]]
+
+    byResource = {}
+    for index in range(reservationCount + requestCount * 3):
+        disposable = index >= reservationCount
+        resource = resources[index % resourceCount]
+        slot = (index // resourceCount) % RESERVATION_SLOTS
+        reservation = resourceShare.reservationFromJson({
+            'reservation_StartTime': resourceShare.toTimeString(8 * 60 + slot * SLOT_MINUTES),
+            'reservation_Duration': SLOT_MINUTES,
+            'reservation_Notes': 'load test',
+            'reservation_Date': (today + datetime.timedelta(
+                days=1 + index // (resourceCount * RESERVATION_SLOTS))).isoformat(),
+        }, resource, OWNER if disposable else seededOwner(index, ownLimit))
+        byResource.setdefault(resource.primaryKey, (resource, []))[1].append((reservation, disposable))
+    for resource, entries in byResource.values():
+        booked, conflicts = resourceShare.bookReservations(resource, [entry[0] for entry in entries])
+        resourceShare.reservationsImported(resource, booked)
+        for reservation, disposable in entries:
+            if disposable:
+                dataset.disposable['reservations'].append(reservation.primaryKey)
+            else:
+                dataset.reservations.append(reservation.primaryKey)
+                if reservation.reservation_Owner == OWNER:
+                    dataset.ownReservations.append(reservation.primaryKey)
+
+    for index in range(ruleCount + requestCount):
+        disposable = index >= ruleCount
+        resource = resources[index % resourceCount]
+        rule = resourceShare.recurrenceFromJson({
+            'reservation_StartTime': resourceShare.toTimeString(
+                8 * 60 + (RESERVATION_SLOTS + (index // resourceCount) % RULE_SLOTS) * SLOT_MINUTES),
+            'reservation_Duration': SLOT_MINUTES,
+            'frequency': 'WEEKLY',
+            'weekdays': [(index // (resourceCount * RULE_SLOTS)) % 7],
+            'untilDate': (today + datetime.timedelta(days=90)).isoformat(),
+        }, resource, OWNER if disposable else seededOwner(index, ownLimit))
+        if not resourceShare.bookRecurrence(resource, rule):
+            (dataset.disposable['rules'] if disposable else dataset.rules).append(rule.primaryKey)
+
+    lines = [json.dumps({'resource_Name': 'Imported %d' % index, 'resource_StartTime': '08:00',
+                         'resource_EndTime': '20:00'}) for index in range(10)]
+    dataset.importJobId = resourceShare.createImportJob(OWNER, 'resources', 'jsonl', StringIO('\n'.join(lines))).key.id()
+    dataset.exportJobId = resourceShare.createExportJob(OWNER, 'resources', 'csv').key.id()
+    resourceShare.runExport(dataset.exportJobId)
+    resourceShare.buildAvailabilitySnapshot()
+
+'''helper function to describe one resource for the JSON API'''
+def resourceJson(dataset):
+    return {'resource_Name': 'Load %d' % dataset.number(1000000), 'resource_StartTime': '08:00',
+            'resource_EndTime': '20:00', 'resource_tag': [dataset.pick(TAGS)]}
+
+'''helper function to describe one reservation for the JSON API, on a random future day and slot'''
+def reservationJson(dataset):
+    return {'resource_PrimaryKey': dataset.pick(dataset.resources),
+            'reservation_StartTime': dataset.slot(RESERVATION_SLOTS),
+            'reservation_Duration': SLOT_MINUTES, 'reservation_Notes': 'load test', 'reservation_Date': dataset.futureDay()}
+
+'''helper function to describe one weekly recurring reservation for the JSON API, in the evening slots'''
+def recurrenceJson(dataset):
+    startDate = dataset.futureDay()
+    untilDate = (datetime.datetime.strptime(startDate, '%Y-%m-%d').date() + datetime.timedelta(days=28)).isoformat()
+    return {'resource_PrimaryKey': dataset.pick(dataset.resources),
+            'reservation_StartTime': dataset.slot(RULE_SLOTS, RESERVATION_SLOTS),
+            'reservation_Duration': SLOT_MINUTES, 'frequency': 'WEEKLY', 'startDate': startDate, 'untilDate': untilDate}
+
+'''helper function to describe a reservation for the HTML form'''
+def reservationForm(dataset):
+    return {'resourcePrimaryKey': dataset.pick(dataset.resources), 'resourceName': 'Room',
+            'startTime': dataset.slot(RESERVATION_SLOTS),
+            'duration': str(SLOT_MINUTES), 'notes': 'load test'}
+
+'''helper function to describe a resource for the HTML forms'''
+def resourceForm(dataset, primaryKey=None):
+    form = {'resourceName': 'Load %d' % dataset.number(1000000), 'startTime': '08:00', 'endTime': '20:00',
+            'tags': ', '.join([dataset.pick(TAGS), dataset.pick(TAGS)])}
+    if primaryKey:
+        form['resourceKey'] = primaryKey
+    return form
+
+'''the scenarios as (name, handler, method, request) where request turns the dataset into a URL and a body: a dict
+is sent as a form, a JSON scenario wraps it in ('json', document)'''
+SCENARIOS = [
+    ('main page', 'MainPage', 'GET', lambda d: ('/', None)),
+    ('main page, own only', 'MainPage', 'GET', lambda d: ('/?keyVal=onlyUser', None)),
+    ('view resource', 'ViewResource', 'GET', lambda d: ('/viewResource?keyVal=' + d.pick(d.resources), None)),
+    ('view reservation', 'ViewReservation', 'GET', lambda d: ('/viewReservation?keyVal=' + d.pick(d.reservations), None)),
+    ('view recurring reservation', 'ViewReservation', 'GET', lambda d: (
+        '/viewReservation?kind=rule&keyVal=' + d.pick(d.rules), None)),
+    ('new resource form', 'AddResource', 'GET', lambda d: ('/addResource', None)),
+    ('add resource', 'AddResource', 'POST', lambda d: ('/addResource', resourceForm(d))),
+    ('new reservation form', 'AddReservation', 'GET', lambda d: ('/addReservation?keyVal=' + d.pick(d.resources), None)),
+    ('add reservation', 'AddReservation', 'POST', lambda d: ('/addReservation', reservationForm(d))),
+    ('add weekly reservation', 'AddReservation', 'POST', lambda d: ('/addReservation', dict(
+        reservationForm(d), startTime=d.slot(RULE_SLOTS, RESERVATION_SLOTS), repeat='WEEKLY',
+        until=(resourceShare.localNow().date() + datetime.timedelta(days=21)).isoformat()))),
+    ('edit resource', 'EditResource', 'POST', lambda d: ('/editResource', resourceForm(d, d.pick(d.ownResources)))),
+    ('delete reservation', 'DeleteReservation', 'POST', lambda d: ('/deleteReservation', {
+        'reservationKey': d.take('reservations')[0]})),
+    ('tag page', 'Tags', 'GET', lambda d: ('/tags?tag=' + d.pick(TAGS), None)),
+    ('rss page', 'RSS', 'GET', lambda d: ('/rss?keyVal=' + d.pick(d.resources), None)),
+    ('rss feed', 'Feed', 'GET', lambda d: ('/feed?keyVal=' + d.pick(d.resources), None)),
+    ('search by name', 'Search', 'GET', lambda d: ('/searchResource?type=name&name=Room+%d' % d.number(100), None)),
+    ('search by time', 'Search', 'GET', lambda d: (
+        '/searchResource?type=time&duration=30&startTime=' + d.slot(RESERVATION_SLOTS), None)),
+    ('suggest', 'SuggestResource', 'GET', lambda d: ('/searchResource/suggest?q=Roo', None)),
+    ('start migration', 'Migrate', 'GET', lambda d: ('/admin/migrate', None)),
+    ('lookup stats', 'LookupStatsPage', 'GET', lambda d: ('/admin/lookupStats', None)),
+    ('send confirmations', 'SendConfirmations', 'POST', lambda d: ('/tasks/sendConfirmations', {'owner': OWNER})),
+    ('prune upcoming', 'PruneUpcoming', 'GET', lambda d: ('/tasks/pruneUpcoming', None)),
+    ('prune exports', 'PruneExports', 'GET', lambda d: ('/tasks/pruneExports', None)),
+    ('build availability', 'BuildAvailability', 'GET', lambda d: ('/tasks/buildAvailability', None)),
+    ('warmup', 'Warmup', 'GET', lambda d: ('/_ah/warmup', None)),
+    ('api list resources', 'ApiResources', 'GET', lambda d: ('/api/v1/resources?limit=20', None)),
+    ('api list resource summaries', 'ApiResources', 'GET', lambda d: (
+        '/api/v1/resources?limit=100&fields=primaryKey,resource_Name', None)),
+    ('api create resource', 'ApiResources', 'POST', lambda d: ('/api/v1/resources', ('json', resourceJson(d)))),
+    ('api create resources', 'ApiResourcesBatch', 'POST', lambda d: ('/api/v1/resources/batch', (
+        'json', {'items': [resourceJson(d) for index in range(10)]}))),
+    ('api delete resources', 'ApiResourcesBatchDelete', 'POST', lambda d: ('/api/v1/resources/batchDelete', (
+        'json', {'keys': d.take('resources')}))),
+    ('api get resource', 'ApiResource', 'GET', lambda d: ('/api/v1/resources/' + d.pick(d.resources), None)),
+    ('api update resource', 'ApiResource', 'PUT', lambda d: ('/api/v1/resources/' + d.pick(d.ownResources), (
+        'json', {'resource_Name': 'Renamed %d' % d.number(1000000)}))),
+    ('api delete resource', 'ApiResource', 'DELETE', lambda d: ('/api/v1/resources/' + d.take('resources')[0], None)),
+    ('api list own reservations', 'ApiReservations', 'GET', lambda d: ('/api/v1/reservations?limit=20', None)),
+    ('api list resource reservations', 'ApiReservations', 'GET', lambda d: (
+        '/api/v1/reservations?resource=' + d.pick(d.resources), None)),
+    ('api book reservation', 'ApiReservations', 'POST', lambda d: ('/api/v1/reservations', ('json', reservationJson(d)))),
+    ('api book reservations', 'ApiReservationsBatch', 'POST', lambda d: ('/api/v1/reservations/batch', (
+        'json', {'items': [reservationJson(d) for index in range(10)]}))),
+    ('api cancel reservations', 'ApiReservationsBatchDelete', 'POST', lambda d: ('/api/v1/reservations/batchDelete', (
+        'json', {'keys': d.take('reservations')}))),
+    ('api get reservation', 'ApiReservation', 'GET', lambda d: ('/api/v1/reservations/' + d.pick(d.reservations), None)),
+    ('api update reservation', 'ApiReservation', 'PUT', lambda d: ('/api/v1/reservations/' + d.pick(d.ownReservations), (
+        'json', {'reservation_Notes': 'updated'}))),
+    ('api cancel reservation', 'ApiReservation', 'DELETE', lambda d: (
+        '/api/v1/reservations/' + d.take('reservations')[0], None)),
+    ('api list recurrences', 'ApiRecurrences', 'GET', lambda d: ('/api/v1/recurrences', None)),
+    ('api book recurrence', 'ApiRecurrences', 'POST', lambda d: ('/api/v1/recurrences', ('json', recurrenceJson(d)))),
+    ('api get recurrence', 'ApiRecurrence', 'GET', lambda d: ('/api/v1/recurrences/' + d.pick(d.rules), None)),
+    ('api cancel recurrence', 'ApiRecurrence', 'DELETE', lambda d: ('/api/v1/recurrences/' + d.take('rules')[0], None)),
+    ('api recurrence occurrences', 'ApiRecurrenceOccurrences', 'GET', lambda d: (
+        '/api/v1/recurrences/%s/occurrences?to=%s' % (
+            d.pick(d.rules), (resourceShare.localNow().date() + datetime.timedelta(days=90)).isoformat()), None)),
+    ('api resource occurrences', 'ApiResourceOccurrences', 'GET', lambda d: (
+        '/api/v1/resources/%s/occurrences' % d.pick(d.resources), None)),
+    ('api search by name', 'ApiSearch', 'GET', lambda d: ('/api/v1/search?name=Room+%d' % d.number(100), None)),
+    ('api search by time', 'ApiSearch', 'GET', lambda d: (
+        '/api/v1/search?duration=30&startTime=' + d.slot(RESERVATION_SLOTS), None)),
+    ('api tags', 'ApiTags', 'GET', lambda d: ('/api/v1/tags', None)),
+    ('api tag', 'ApiTag', 'GET', lambda d: ('/api/v1/tags/' + d.pick(TAGS), None)),
+    ('api import', 'ApiImport', 'POST', lambda d: ('/api/v1/import?kind=resources&format=jsonl', (
+        'raw', '\n'.join(json.dumps(resourceJson(d)) for index in range(20))))),
+    ('api import progress', 'ApiImportJob', 'GET', lambda d: ('/api/v1/import/%d' % d.importJobId, None)),
+    ('api export resources', 'ApiExport', 'POST', lambda d: ('/api/v1/export?kind=resources', None)),
+    ('api export reservations', 'ApiExport', 'POST', lambda d: ('/api/v1/export?kind=reservations&format=csv', None)),
+    ('api export progress', 'ApiExportJob', 'GET', lambda d: ('/api/v1/export/%d' % d.exportJobId, None)),
+    ('api export part', 'ApiExportPart', 'GET', lambda d: ('/api/v1/export/%d/1' % d.exportJobId, None)),
+]
+
+'''helper function to get the value at a percentile of sorted values, by the nearest rank'''
+def percentile(values, fraction):
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, int(math.ceil(fraction * len(values))) - 1))]
+
+'''helper function to run requestCount requests of one scenario from concurrency threads and sum them up'''
+def runScenario(dataset, scenario, requestCount, concurrency):
+    name, handler, method, request = scenario
+    results = []
+    remaining = [requestCount]
+    lock = threading.Lock()
+
+    def worker():
+        client = webtest.TestApp(resourceShare.app)
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            try:
+                url, body = request(dataset)
+            except IndexError:
+                return
+            started = time.time()
+            try:
+                response = fixture.send(client, method, url, body)
+                status = response.status_int
+                perf = json.loads(response.headers.get('X-Perf', 'null'))
+                error = None if status < 500 else response.status
+            except Exception as exception:
+                status = None
+                perf = None
+                error = '%s: %s' % (exception.__class__.__name__, exception)
+            with lock:
+                results.append((time.time() - started, status, perf, error))
+
+    peakBefore = getrusage(RUSAGE_SELF).ru_maxrss
+    started = time.time()
+    threads = [threading.Thread(target=worker) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.time() - started
+    peakAfter = getrusage(RUSAGE_SELF).ru_maxrss
+
+    latencies = sorted(result[0] * 1000 for result in results)
+    perfs = [result[2] for result in results if result[2]]
+    statuses = {}
+    for result in results:
+        statuses[str(result[1])] = statuses.get(str(result[1]), 0) + 1
+    errors = [result[3] for result in results if result[3]]
+    summary = {
+        'scenario': name,
+        'handler': handler,
+        'method': method,
+        'requests': len(results),
+        'seconds': round(seconds, 3),
+        'requestsPerSecond': round(len(results) / max(seconds, 1e-9), 1),
+        'statuses': statuses,
+        'errors': len(errors),
+        'firstError': errors[0] if errors else None,
+        'latencyMs': {
+            'p50': round(percentile(latencies, 0.50), 1) if latencies else None,
+            'p95': round(percentile(latencies, 0.95), 1) if latencies else None,
+            'p99': round(percentile(latencies, 0.99), 1) if latencies else None,
+            'max': round(latencies[-1], 1) if latencies else None,
+            'mean': round(sum(latencies) / len(latencies), 1) if latencies else None,
+        },
+        'peakRssKb': peakAfter,
+        'peakRssGrowthKb': peakAfter - peakBefore,
+    }
+    for field in ('datastoreRpcs', 'entitiesRead', 'memcacheRpcs', 'taskqueueCalls', 'mailCalls', 'templateMs'):
+        values = sorted(perf[field] for perf in perfs)
+        summary[field] = {'mean': round(sum(values) / float(len(values)), 1) if values else None,
+                          'max': values[-1] if values else None}
+    summary['rpcBudget'] = perfs[0]['rpcBudget'] if perfs else None
+    summary['overBudget'] = sum(1 for perf in perfs if perf['overBudget'])
+    return summary
+
+'''helper function to list the handlers of routes no scenario drives'''
+def uncoveredHandlers():
+    covered = set(scenario[1] for scenario in SCENARIOS)
+    handlers = set(getattr(route.handler, '__name__', str(route.handler))
+                   for route in resourceShare.application.router.match_routes)
+    return sorted(handlers - covered)
+
+'''helper function to get the revision being measured, or None outside a git checkout'''
+def revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=APP_DIR).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def report(summary):
+    latency = summary['latencyMs']
+    print('%-32s %5d req %4d err %8s %8s %8s ms p50/p95/p99 %6s ds %6s mc %8d kB' % (
+        summary['scenario'], summary['requests'], summary['errors'], latency['p50'], latency['p95'], latency['p99'],
+        summary['datastoreRpcs']['mean'], summary['memcacheRpcs']['mean'], summary['peakRssKb']))
+
+def loadtest(options):
+    dataset = Dataset()
+    started = time.time()
+    seed(dataset, options['resources'], options['reservations'], options['rules'], options['requests'])
+    seedSeconds = time.time() - started
+    print('seeded %d resources, %d reservations and %d recurring reservations in %.1f s' % (
+        len(dataset.resources), len(dataset.reservations), len(dataset.rules), seedSeconds))
+    resourceShare.app.strict = options['strict']
+    scenarios = [scenario for scenario in SCENARIOS if not options['only'] or options['only'] in scenario[0]]
+    summaries = []
+    for scenario in scenarios:
+        summary = runScenario(dataset, scenario, options['requests'], options['concurrency'])
+        report(summary)
+        summaries.append(summary)
+    uncovered = uncoveredHandlers()
+    if uncovered:
+        print('routes without a scenario: ' + ', '.join(uncovered))
+    run = {
+        'finished': datetime.datetime.utcnow().isoformat() + 'Z',
+        'revision': revision(),
+        'options': options,
+        'dataset': {'resources': len(dataset.resources), 'reservations': len(dataset.reservations),
+                    'rules': len(dataset.rules), 'seedSeconds': round(seedSeconds, 1)},
+        'scenarios': summaries,
+        'uncoveredHandlers': uncovered,
+    }
+    with open(options['output'], 'a') as output:
+        output.write(json.dumps(run, sort_keys=True) + '\n')
+    print('results appended to ' + options['output'])
+    return sum(summary['errors'] for summary in summaries)
+
+def reportSweep(size, summary):
+    latency = summary['latencyMs']
+    print('%-24s %8d resources %8s %8s ms p50/p95 %6s ds %8s entities' % (
+        summary['scenario'], size, latency['p50'], latency['p95'], summary['datastoreRpcs']['mean'],
+        summary['entitiesRead']['mean']))
+
+'''helper function to run the landing page scenarios against datastores of every size in --sweep, each on fresh stubs,
+with the signed in user owning the same SWEEP_OWN resources and reservations at every size, so their latency and
+entity reads show what the total entity count costs them; fragments are rendered from their queries every time'''
+def sweep(options):
+    ratio = options['reservations'] / float(options['resources'])
+    sizes = []
+    resourceShare.rendering.fragmentCache = False
+    for size in [int(size) for size in options['sweep'].split(',')]:
+        bed = fixture.setUpStubs(OWNER)
+        try:
+            fixture.resetInstance()
+            dataset = Dataset()
+            seed(dataset, size, int(size * ratio), options['rules'], options['requests'], SWEEP_OWN)
+            summaries = []
+            for scenario in SCENARIOS:
+                if scenario[0] in SWEEP_SCENARIOS:
+                    summary = runScenario(dataset, scenario, options['requests'], options['concurrency'])
+                    reportSweep(size, summary)
+                    summaries.append(summary)
+        finally:
+            bed.deactivate()
+        sizes.append({'resources': size, 'reservations': int(size * ratio), 'scenarios': summaries})
+    resourceShare.rendering.fragmentCache = True
+    run = {
+        'finished': datetime.datetime.utcnow().isoformat() + 'Z',
+        'revision': revision(),
+        'options': options,
+        'sweep': sizes,
+    }
+    with open(options['output'], 'a') as output:
+        output.write(json.dumps(run, sort_keys=True) + '\n')
+    print('results appended to ' + options['output'])
+    return sum(summary['errors'] for size in sizes for summary in size['scenarios'])
+
+'''helper function to read the command line options, falling back to the defaults'''
+def parseOptions(arguments):
+    parser = argparse.ArgumentParser(description='Load-test every route of the app against the local stubs.')
+    parser.add_argument('--resources', type=int, default=DEFAULT_RESOURCES, help='resources to seed')
+    parser.add_argument('--reservations', type=int, default=DEFAULT_RESERVATIONS, help='reservations to seed')
+    parser.add_argument('--rules', type=int, default=DEFAULT_RULES, help='recurring reservations to seed')
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help='threads sending requests')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='file the results are appended to')
+    parser.add_argument('--only', help='run only the scenarios whose name contains this')
+    parser.add_argument('--strict', action='store_true', help='count requests over their RPC budget as errors')
+    parser.add_argument('--sweep', help='comma separated resource counts to run the landing page scenarios at')
+    return vars(parser.parse_args(arguments))
+
+if __name__ == '__main__':
+    options = parseOptions(sys.argv[1:])
+    if options['sweep']:
+        failed = sweep(options)
+    else:
+        bed = fixture.setUpStubs(OWNER)
+        try:
+            failed = loadtest(options)
+        finally:
+            bed.deactivate()
+    sys.exit(1 if failed else 0)
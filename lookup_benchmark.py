@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''Measures the datastore reads of the pages that load one resource or reservation by its primaryKey.
+
+Needs the App Engine SDK on PYTHONPATH and WebTest installed. Seeds the local
+stubs with --entities resources, each with one reservation, stored under the
+keys named by their primaryKey, and as many stored the way they were before:
+under an automatic id with a random primaryKey, which only the primaryKey query
+finds. Every page is requested for --entities entities of each, once cold, with
+memcache flushed, and once warm, right after, each request in a fresh NDB
+context as a new request on App Engine gets. The mean datastore RPCs, Get and
+RunQuery calls and entities read per request come from the X-Perf header.'''
+
+import argparse
+import datetime
+import json
+import random
+
+from google.appengine.api import memcache
+from google.appengine.ext import ndb
+import webtest
+
+import resourceShare
+from tests import fixture
+
+DEFAULT_ENTITIES = 50
+SEED = 2016
+PAGES = [
+    ('view resource', '/viewResource?keyVal=%(resource)s'),
+    ('view reservation', '/viewReservation?keyVal=%(reservation)s'),
+    ('new reservation form', '/addReservation?keyVal=%(resource)s'),
+    ('rss page', '/rss?keyVal=%(resource)s'),
+    ('api get resource', '/api/v1/resources/%(resource)s'),
+    ('api get reservation', '/api/v1/reservations/%(reservation)s'),
+]
+
+'''helper function to seed count resources with one reservation each under keys named by their primaryKey, through
+the same code paths the app writes them with'''
+def seedKeyed(count):
+    day = resourceShare.localNow().date() + datetime.timedelta(days=1)
+    seeded = []
+    for index in range(count):
+        resource = resourceShare.applyResourceJson(resourceShare.newResource(fixture.OWNER), {
+            'resource_Name': 'Keyed %d' % index, 'resource_StartTime': '08:00', 'resource_EndTime': '20:00'})
+        resource.put()
+        reservation = resourceShare.reservationFromJson({
+            'reservation_StartTime': '09:00', 'reservation_Duration': 30, 'reservation_Date': day.isoformat(),
+        }, resource, fixture.OWNER)
+        resourceShare.bookReservations(resource, [reservation])
+        seeded.append({'resource': resource.primaryKey, 'reservation': reservation.primaryKey})
+    return seeded
+
+'''helper function to seed count resources with one reservation each as they were stored before keyed lookups: under
+automatic ids, with random primaryKeys no alias points to'''
+def seedLegacy(count):
+    day = resourceShare.localNow().date() + datetime.timedelta(days=1)
+    primaryKeys = [str(primaryKey) for primaryKey in random.Random(SEED).sample(
+        xrange(1, resourceShare.LEGACY_KEY_MAX + 1), count * 2)]
+    entities = []
+    seeded = []
+    for index in range(count):
+        resource = resourceShare.Resource(primaryKey=primaryKeys[index * 2], resource_Owner=fixture.OWNER,
+                                          resource_Name='Legacy %d' % index, resource_StartTime='08:00',
+                                          resource_EndTime='20:00', resource_tag=[], totalReservations=1)
+        reservation = resourceShare.Reservation(primaryKey=primaryKeys[index * 2 + 1],
+                                                resource_PrimaryKey=resource.primaryKey,
+                                                resource_Name=resource.resource_Name,
+                                                reservation_Owner=fixture.OWNER, reservation_StartTime='09:00',
+                                                reservation_EndTime='09:30', reservation_Duration=30,
+                                                reservation_Date=day)
+        entities.extend([resource, reservation])
+        seeded.append({'resource': resource.primaryKey, 'reservation': reservation.primaryKey})
+    ndb.put_multi(entities)
+    return seeded
+
+'''helper function to request a page, flushing memcache first when cold, and return its X-Perf summary'''
+def measure(client, url, cold):
+    if cold:
+        memcache.flush_all()
+    response = fixture.send(client, 'GET', url)
+    if response.status_int != 200:
+        raise AssertionError('%s answered %s' % (url, response.status))
+    return json.loads(response.headers['X-Perf'])
+
+def report(page, stored, cache, perfs):
+    def mean(values):
+        return sum(values) / float(len(values))
+    print('%-22s %-7s %-5s %6.1f ds %6.1f get %6.1f query %6.1f entities' % (
+        page, stored, cache, mean([perf['datastoreRpcs'] for perf in perfs]),
+        mean([perf['datastoreCalls'].get('Get', 0) for perf in perfs]),
+        mean([perf['datastoreCalls'].get('RunQuery', 0) for perf in perfs]),
+        mean([perf['entitiesRead'] for perf in perfs])))
+
+def benchmark(count):
+    datasets = [('keyed', seedKeyed(count)), ('legacy', seedLegacy(count))]
+    client = webtest.TestApp(resourceShare.app)
+    for page, url in PAGES:
+        for stored, seeded in datasets:
+            cold = []
+            warm = []
+            for entity in seeded:
+                cold.append(measure(client, url % entity, True))
+                warm.append(measure(client, url % entity, False))
+            report(page, stored, 'cold', cold)
+            report(page, stored, 'warm', warm)
+    print('lookups: ' + json.dumps(resourceShare.model.lookup.lookupStats.snapshot(), sort_keys=True))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure the datastore reads of primaryKey lookups per page.')
+    parser.add_argument('--entities', type=int, default=DEFAULT_ENTITIES, help='resources and reservations of each kind')
+    options = parser.parse_args()
+    bed = fixture.setUpStubs()
+    try:
+        benchmark(options.entities)
+    finally:
+        bed.deactivate()
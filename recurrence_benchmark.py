@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''Measures how fast recurring reservation rules expand and are checked for conflicts.
+
+Needs the App Engine SDK on PYTHONPATH, but no datastore: the rules are built
+in memory. Spreads --rules rules (5000 by default) over --resources resources
+(100 by default), then times expanding them over a week, a month and a year,
+checking single slots against the rules of their resource and checking new
+rules against the existing ones, printing operations per second for every step.'''
+
+import datetime
+import random
+import sys
+import time
+
+import resourceShare
+
+DEFAULT_RULES = 5000
+DEFAULT_RESOURCES = 100
+PROBES = 100000
+CANDIDATES = 1000
+SEED = 2016
+
+'''helper function to describe one rule of a resource: daily or weekly, every one to four periods, for up to a year'''
+def randomRule(generator, primaryKey, resourcePrimaryKey, today):
+    rule = resourceShare.RecurringReservation(
+        primaryKey=str(primaryKey),
+        resource_PrimaryKey=resourcePrimaryKey,
+        resource_Name='Room ' + resourcePrimaryKey,
+        reservation_Owner='benchmark@example.com',
+        reservation_StartTime=resourceShare.toTimeString(generator.randrange(8 * 60, 18 * 60, 15)),
+        reservation_Duration=generator.choice([15, 30, 60, 90]),
+        frequency=generator.choice(resourceShare.RECURRENCE_FREQUENCIES),
+        interval=generator.randint(1, 4),
+        startDate=today + datetime.timedelta(days=generator.randint(0, 60)))
+    rule.reservation_EndTime = resourceShare.toTimeString(
+        resourceShare.toMinutes(rule.reservation_StartTime) + rule.reservation_Duration)
+    rule.untilDate = rule.startDate + datetime.timedelta(days=generator.randint(7, resourceShare.RECURRENCE_MAX_DAYS))
+    if rule.frequency == 'WEEKLY':
+        rule.weekdays = sorted(generator.sample(range(5), generator.randint(1, 3)))
+    return rule
+
+def report(step, count, seconds, detail=''):
+    print('%-28s %9d ops %9.2f s %12.0f ops/s   %s' % (step, count, seconds, count / max(seconds, 1e-9), detail))
+
+def benchmark(ruleCount, resourceCount):
+    generator = random.Random(SEED)
+    today = resourceShare.localNow().date()
+    resourceKeys = [str(resourceShare.LEGACY_KEY_MAX + index + 1) for index in range(resourceCount)]
+    rules = [randomRule(generator, resourceShare.LEGACY_KEY_MAX + resourceCount + index + 1,
+                        generator.choice(resourceKeys), today) for index in range(ruleCount)]
+
+    started = time.time()
+    specs = [resourceShare.recurrenceSpec(rule) for rule in rules]
+    report('compile rules', len(specs), time.time() - started)
+
+    for days in (7, 31, resourceShare.RECURRENCE_MAX_DAYS):
+        started = time.time()
+        occurrences = resourceShare.expandRecurrences(rules, today, today + datetime.timedelta(days=days - 1))
+        report('expand %d days' % days, len(rules), time.time() - started, '%d occurrences' % len(occurrences))
+
+    byResource = dict((primaryKey, resourceShare.ResourceRecurrences(rules=[])) for primaryKey in resourceKeys)
+    for rule, spec in zip(rules, specs):
+        byResource[rule.resource_PrimaryKey].rules.append(spec)
+
+    probes = []
+    for index in range(PROBES):
+        start = generator.randrange(8 * 60, 18 * 60, 15)
+        probes.append((byResource[generator.choice(resourceKeys)],
+                       today + datetime.timedelta(days=generator.randint(0, 90)), start, start + 30))
+    started = time.time()
+    taken = sum(1 for recurrences, day, start, end in probes if recurrences.overlaps(day, start, end))
+    report('check single slots', len(probes), time.time() - started, '%d taken' % taken)
+
+    candidates = [randomRule(generator, index, generator.choice(resourceKeys), today) for index in range(CANDIDATES)]
+    started = time.time()
+    clashing = 0
+    for candidate in candidates:
+        if byResource[candidate.resource_PrimaryKey].conflicts(resourceShare.recurrenceSpec(candidate)):
+            clashing += 1
+    report('check new rules', len(candidates), time.time() - started, '%d conflicting' % clashing)
+
+if __name__ == '__main__':
+    arguments = sys.argv[1:]
+    ruleCount = int(arguments[arguments.index('--rules') + 1]) if '--rules' in arguments else DEFAULT_RULES
+    resourceCount = int(arguments[arguments.index('--resources') + 1]) if '--resources' in arguments else DEFAULT_RESOURCES
+    benchmark(ruleCount, resourceCount)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''resourceShare App Engine app, split by concern:
+
+settings        sizes, limits, cache key prefixes and API field lists
+rendering       templates and the fragment cache
+profiling       per-request RPC profiling and the RPC budgets of the routes
+model           the datastore models and primaryKey lookups
+availability    the in-memory availability engine time search answers from
+feed            the iCalendar feed of a resource
+booking         the booking transactions, the views they maintain and their write effects
+web             the HTML pages, the JSON API, bulk import and export, and the admin handlers
+
+Every public name of the modules is also importable from the package, which
+is what scripts, the tests and deferred tasks queued before the split refer
+to.'''
+
+# [START imports]
+import time
+IMPORT_STARTED = time.time()
+
+import os
+import logging
+
+import webapp2
+
+from resourceShare.settings import *
+from resourceShare.rendering import *
+from resourceShare.profiling import *
+from resourceShare.model.lookup import *
+from resourceShare.model.reservations import *
+from resourceShare.model.counter import *
+from resourceShare.model.schedule import *
+from resourceShare.model.resources import *
+from resourceShare.model.rules import *
+from resourceShare.availability import *
+from resourceShare.model.tags import *
+from resourceShare.feed import *
+from resourceShare.booking.confirmations import *
+from resourceShare.booking.upcoming import *
+from resourceShare.booking.bookings import *
+from resourceShare.booking.recurrence import *
+from resourceShare.booking.effects import *
+from resourceShare.web.pages import *
+from resourceShare.web.api import *
+from resourceShare.web.bulk import *
+from resourceShare.web.admin import *
+# [END imports]
+
+# [START app]
+application = webapp2.WSGIApplication([
+    ('/', MainPage),
+    ('/viewReservation', ViewReservation),
+    ('/addResource', AddResource),
+    ('/addReservation', AddReservation),
+    ('/viewResource', ViewResource),
+    ('/deleteReservation', DeleteReservation),
+    ('/tags', Tags),
+    ('/editResource', EditResource),
+    ('/rss', RSS),
+    ('/feed', Feed),
+    ('/searchResource',Search),
+    ('/searchResource/suggest', SuggestResource),
+    ('/admin/migrate', Migrate),
+    ('/admin/lookupStats', LookupStatsPage),
+    ('/tasks/sendConfirmations', SendConfirmations),
+    ('/tasks/pruneUpcoming', PruneUpcoming),
+    ('/tasks/pruneExports', PruneExports),
+    ('/tasks/buildAvailability', BuildAvailability),
+    ('/_ah/warmup', Warmup),
+    ('/api/v1/resources', ApiResources),
+    ('/api/v1/resources/batch', ApiResourcesBatch),
+    ('/api/v1/resources/batchDelete', ApiResourcesBatchDelete),
+    (r'/api/v1/resources/([^/]+)', ApiResource),
+    ('/api/v1/reservations', ApiReservations),
+    ('/api/v1/reservations/batch', ApiReservationsBatch),
+    ('/api/v1/reservations/batchDelete', ApiReservationsBatchDelete),
+    (r'/api/v1/reservations/([^/]+)', ApiReservation),
+    ('/api/v1/recurrences', ApiRecurrences),
+    (r'/api/v1/recurrences/([^/]+)', ApiRecurrence),
+    (r'/api/v1/recurrences/([^/]+)/occurrences', ApiRecurrenceOccurrences),
+    (r'/api/v1/resources/([^/]+)/occurrences', ApiResourceOccurrences),
+    ('/api/v1/search', ApiSearch),
+    ('/api/v1/tags', ApiTags),
+    (r'/api/v1/tags/([^/]+)', ApiTag),
+    ('/api/v1/import', ApiImport),
+    (r'/api/v1/import/(\d+)', ApiImportJob),
+    ('/api/v1/export', ApiExport),
+    (r'/api/v1/export/(\d+)', ApiExportJob),
+    (r'/api/v1/export/(\d+)/(\d+)', ApiExportPart)
+], debug=True)
+app = PerformanceMiddleware(application, RPC_BUDGETS, strict=os.environ.get('RPC_BUDGET_STRICT') == '1')
+# [END app]
+
+IMPORT_SECONDS = time.time() - IMPORT_STARTED
+logging.info('resourceShare imported in %.3fs', IMPORT_SECONDS)
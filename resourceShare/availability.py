@@ -0,0 +1,502 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''The in-memory availability engine time search answers from, its snapshots and the change log instances replay.'''
+
+import time
+import bisect
+import logging
+import datetime
+import threading
+
+from google.appengine.api import memcache
+from google.appengine.api import taskqueue
+from google.appengine.ext import deferred
+from google.appengine.ext import ndb
+
+import webapp2
+
+from resourceShare.settings import RESOURCE_WINDOW_FIELDS, RULE_KIND, localNow
+from resourceShare.model.lookup import getByPrimaryKey
+from resourceShare.model.reservations import reservationInterval, resourceWindow
+from resourceShare.model.schedule import ResourceSchedule, scheduleKey
+from resourceShare.model.resources import Resource
+from resourceShare.model.rules import ResourceRecurrences, recurrencesKey
+
+# [START availability]
+AVAILABILITY_VERSION_KEY = 'availability-version-3'
+AVAILABILITY_CHANGE_KEY = 'availability-change-3:%d'
+AVAILABILITY_MAX_REPLAY = 500
+# resources a time search returns at most
+TIME_SEARCH_LIMIT = 50
+# rows of each kind in one chunk of an availability snapshot, which keeps a chunk well under the entity size limit
+AVAILABILITY_SNAPSHOT_ROWS = 10000
+# an instance missing changes serves what it has and looks for a newer snapshot at most this often
+AVAILABILITY_RETRY_SECONDS = 30
+# invalidations within one window of this many seconds share one snapshot build, queued for the end of the window
+AVAILABILITY_BUILD_SECONDS = 30
+
+'''centered interval tree over half-open [start, end) intervals, answering stabbing queries in O(log n + k)'''
+class IntervalTree(object):
+    def __init__(self, intervals):
+        self.center = None
+        self.left = None
+        self.right = None
+        self.byStart = []
+        self.byEnd = []
+        if not intervals:
+            return
+        starts = sorted(interval[0] for interval in intervals)
+        self.center = starts[len(starts) // 2]
+        left = []
+        right = []
+        for interval in intervals:
+            if interval[1] <= self.center:
+                left.append(interval)
+            elif interval[0] > self.center:
+                right.append(interval)
+            else:
+                self.byStart.append(interval)
+        self.byEnd = sorted(self.byStart, key=lambda interval: interval[1], reverse=True)
+        self.byStart.sort(key=lambda interval: interval[0])
+        if left:
+            self.left = IntervalTree(left)
+        if right:
+            self.right = IntervalTree(right)
+
+    def stab(self, point):
+        found = []
+        node = self
+        while node is not None and node.center is not None:
+            if point < node.center:
+                for interval in node.byStart:
+                    if interval[0] > point:
+                        break
+                    found.append(interval)
+                node = node.left
+            else:
+                for interval in node.byEnd:
+                    if interval[1] <= point:
+                        break
+                    found.append(interval)
+                node = node.right if point > node.center else None
+        return found
+
+'''sorted booked intervals of one resource with prefix maxima of end times, giving O(log n) overlap checks'''
+class BookedIntervals(object):
+    def __init__(self):
+        self.bookings = {}
+        self.starts = []
+        self.maxEnds = []
+
+    def add(self, reservationKey, start, end):
+        self.bookings[reservationKey] = (start, end)
+        self._rebuild()
+
+    def addMany(self, bookings):
+        for reservationKey, start, end in bookings:
+            self.bookings[reservationKey] = (start, end)
+        self._rebuild()
+
+    def remove(self, reservationKey):
+        if self.bookings.pop(reservationKey, None) is not None:
+            self._rebuild()
+
+    def _rebuild(self):
+        ordered = sorted(self.bookings.values())
+        self.starts = [interval[0] for interval in ordered]
+        self.maxEnds = []
+        maxEnd = None
+        for interval in ordered:
+            maxEnd = interval[1] if maxEnd is None else max(maxEnd, interval[1])
+            self.maxEnds.append(maxEnd)
+
+    def overlaps(self, start, end):
+        count = bisect.bisect_left(self.starts, end)
+        return count > 0 and self.maxEnds[count - 1] > start
+
+'''the open windows and bookings of every resource on one day. Resources sharing a window are grouped, so the interval
+tree holds one interval per distinct window and is only rebuilt when a window appears or disappears; free() stops once
+it has found limit resources, so a lookup costs about limit overlap checks however many resources there are'''
+class AvailabilityState(object):
+    def __init__(self, day):
+        self.day = day
+        self.windows = {}
+        self.resourceKeys = {}
+        self.groups = {}
+        self.bookings = {}
+        self.tree = None
+
+    def free(self, start, end, limit):
+        if self.tree is None:
+            self.tree = IntervalTree(list(self.groups))
+        freeKeys = []
+        for window in sorted(self.tree.stab(start)):
+            if window[1] < end:
+                continue
+            for primaryKey in self.groups[window]:
+                booked = self.bookings.get(primaryKey)
+                if booked is None or not booked.overlaps(start, end):
+                    freeKeys.append(self.resourceKeys[primaryKey])
+                    if len(freeKeys) == limit:
+                        return freeKeys
+        return freeKeys
+
+    def apply(self, change):
+        if change[0] == 'window':
+            self.setWindow(*change[1:])
+        elif change[0] == 'book':
+            self.book(*change[1:])
+        elif change[0] == 'unbook':
+            self.unbook(*change[1:])
+        elif change[0] == 'resource':
+            self.resetResource(*change[1:])
+
+    def setWindow(self, primaryKey, resourceKey, window):
+        old = self.windows.pop(primaryKey, None)
+        if old is not None:
+            group = self.groups[old]
+            del group[bisect.bisect_left(group, primaryKey)]
+            if not group:
+                del self.groups[old]
+                self.tree = None
+        if window is None or window[1] <= window[0]:
+            self.resourceKeys.pop(primaryKey, None)
+            return
+        window = tuple(window)
+        self.windows[primaryKey] = window
+        self.resourceKeys[primaryKey] = resourceKey
+        if window not in self.groups:
+            self.groups[window] = []
+            self.tree = None
+        bisect.insort(self.groups[window], primaryKey)
+
+    def book(self, resourcePrimaryKey, reservationKey, interval, day):
+        if interval is not None and day == self.day:
+            self.bookings.setdefault(resourcePrimaryKey, BookedIntervals()).add(reservationKey, interval[0], interval[1])
+
+    def unbook(self, resourcePrimaryKey, reservationKey):
+        booked = self.bookings.get(resourcePrimaryKey)
+        if booked is not None:
+            booked.remove(reservationKey)
+
+    def resetResource(self, primaryKey, resourceKey, window, day, bookings):
+        if day != self.day:
+            return
+        self.setWindow(primaryKey, resourceKey, window)
+        self.bookings.pop(primaryKey, None)
+        if bookings:
+            self.bookings[primaryKey] = BookedIntervals()
+            self.bookings[primaryKey].addMany(bookings)
+
+    def rows(self):
+        windows = [[primaryKey, list(self.resourceKeys[primaryKey].flat()), window[0], window[1]]
+                   for primaryKey, window in self.windows.items()]
+        bookings = [[primaryKey, reservationKey, interval[0], interval[1]]
+                    for primaryKey, booked in self.bookings.items()
+                    for reservationKey, interval in booked.bookings.items()]
+        return windows, bookings
+
+    @classmethod
+    def fromRows(cls, day, windows, bookings):
+        state = cls(day)
+        for primaryKey, flat, start, end in windows:
+            state.windows[primaryKey] = (start, end)
+            state.resourceKeys[primaryKey] = ndb.Key(flat=[str(part) if isinstance(part, unicode) else part
+                                                           for part in flat])
+            state.groups.setdefault((start, end), []).append(primaryKey)
+        for group in state.groups.values():
+            group.sort()
+        byResource = {}
+        for primaryKey, reservationKey, start, end in bookings:
+            byResource.setdefault(primaryKey, []).append((reservationKey, start, end))
+        for primaryKey, resourceBookings in byResource.items():
+            state.bookings[primaryKey] = BookedIntervals()
+            state.bookings[primaryKey].addMany(resourceBookings)
+        return state
+
+'''helper function to read the bookings of one resource on a day from its schedule and its rules, as (booking key,
+start, end)'''
+def resourceDayBookings(schedule, recurrences, day):
+    bookings = []
+    if schedule is not None:
+        bookings.extend(zip(schedule.reservationKeys, schedule.starts, schedule.ends))
+    if recurrences is not None:
+        bookings.extend((bookingKey(RULE_KIND, spec['primaryKey']), spec['start'], spec['end'])
+                        for spec in recurrences.occurrencesOn(day))
+    return bookings
+
+'''helper function to build the availability of a day from the datastore, scanning the windows of every resource, the
+schedules of the day and every set of rules; snapshot builds run it off the request path. The windows are read with a
+projection on the indexed minute fields, so the scan never loads whole resources; a resource from before the minute
+fields is left out until the migration has saved it again'''
+def buildAvailabilityState(day):
+    state = AvailabilityState(day)
+    for resource in Resource.query().iter(batch_size=500, projection=RESOURCE_WINDOW_FIELDS):
+        window = None
+        if resource.resource_StartMinute is not None and resource.resource_EndMinute is not None:
+            window = (resource.resource_StartMinute, resource.resource_EndMinute)
+        state.setWindow(resource.primaryKey, resource.key, window)
+    byResource = {}
+    for schedule in ResourceSchedule.query(ResourceSchedule.day == day).iter(batch_size=500):
+        byResource.setdefault(schedule.resource_PrimaryKey, []).extend(resourceDayBookings(schedule, None, day))
+    for recurrences in ResourceRecurrences.query().iter(batch_size=500):
+        byResource.setdefault(recurrences.key.id(), []).extend(resourceDayBookings(None, recurrences, day))
+    for primaryKey, bookings in byResource.items():
+        if bookings:
+            state.bookings.setdefault(primaryKey, BookedIntervals()).addMany(bookings)
+    return state
+
+'''the availability of one day as a snapshot, keyed by the day, with the change log version it is current as of; its
+chunks are written under a new build id before the header points at them, so a reader never sees a half written one'''
+class AvailabilitySnapshot(ndb.Model):
+    version = ndb.IntegerProperty(indexed=False)
+    build = ndb.StringProperty(indexed=False)
+    chunkCount = ndb.IntegerProperty(indexed=False)
+    built = ndb.DateTimeProperty(auto_now=True, indexed=False)
+
+'''AVAILABILITY_SNAPSHOT_ROWS window and booking rows of a snapshot'''
+class AvailabilitySnapshotChunk(ndb.Model):
+    windows = ndb.JsonProperty(indexed=False, compressed=True)
+    bookings = ndb.JsonProperty(indexed=False, compressed=True)
+
+'''helper function to get the key of the availability snapshot of a day'''
+def availabilitySnapshotKey(day):
+    return ndb.Key(AvailabilitySnapshot, day.isoformat())
+
+'''helper function to get the key of a chunk of a snapshot build'''
+def availabilityChunkKey(build, chunkIndex):
+    return ndb.Key(AvailabilitySnapshotChunk, '%s:%d' % (build, chunkIndex))
+
+'''helper function to delete a snapshot build's chunks'''
+def deleteAvailabilityChunks(snapshot):
+    ndb.delete_multi([availabilityChunkKey(snapshot.build, index) for index in range(snapshot.chunkCount)])
+
+'''deferred task, and cron step, building the availability snapshot of a day, today unless an ordinal is given;
+instances pick up a snapshot of today through the change log, and the snapshot of the day before yesterday is dropped'''
+def buildAvailabilitySnapshot(dayOrdinal=None):
+    day = datetime.date.fromordinal(dayOrdinal) if dayOrdinal else localNow().date()
+    version = availabilityIndex.currentVersion()
+    windows, bookings = buildAvailabilityState(day).rows()
+    build = '%s:%d:%s' % (day.isoformat(), version, repr(time.time()))
+    chunkCount = max(1, (max(len(windows), len(bookings)) + AVAILABILITY_SNAPSHOT_ROWS - 1) // AVAILABILITY_SNAPSHOT_ROWS)
+    ndb.put_multi([AvailabilitySnapshotChunk(key=availabilityChunkKey(build, index),
+                                             windows=windows[index * AVAILABILITY_SNAPSHOT_ROWS:
+                                                             (index + 1) * AVAILABILITY_SNAPSHOT_ROWS],
+                                             bookings=bookings[index * AVAILABILITY_SNAPSHOT_ROWS:
+                                                               (index + 1) * AVAILABILITY_SNAPSHOT_ROWS])
+                   for index in range(chunkCount)])
+    previous, expired = ndb.get_multi([availabilitySnapshotKey(day),
+                                       availabilitySnapshotKey(day - datetime.timedelta(days=2))])
+    AvailabilitySnapshot(key=availabilitySnapshotKey(day), version=version, build=build, chunkCount=chunkCount).put()
+    for old in (previous, expired):
+        if old is not None:
+            deleteAvailabilityChunks(old)
+    if expired is not None:
+        expired.key.delete()
+    if day == localNow().date():
+        availabilityIndex.publish(('snapshot', day, version))
+
+'''helper function to read the snapshot of a day as its version and state, or None when there is none yet or a newer
+build removed its chunks meanwhile'''
+def readAvailabilitySnapshot(day):
+    snapshot = availabilitySnapshotKey(day).get()
+    if snapshot is None:
+        return None
+    chunks = ndb.get_multi([availabilityChunkKey(snapshot.build, index) for index in range(snapshot.chunkCount)])
+    if any(chunk is None for chunk in chunks):
+        return None
+    windows = [row for chunk in chunks for row in chunk.windows]
+    bookings = [row for chunk in chunks for row in chunk.bookings]
+    return snapshot.version, AvailabilityState.fromRows(day, windows, bookings)
+
+'''helper function to queue a snapshot build of a day at the end of the current AVAILABILITY_BUILD_SECONDS window;
+the task is named after the window, so every change in it is covered by one build'''
+def scheduleAvailabilitySnapshot(day):
+    now = time.time()
+    window = int(now // AVAILABILITY_BUILD_SECONDS) + 1
+    try:
+        deferred.defer(buildAvailabilitySnapshot, day.toordinal(), _name='availability-%s-%d' % (day.isoformat(), window),
+                       _countdown=window * AVAILABILITY_BUILD_SECONDS - now)
+    except taskqueue.TaskAlreadyExistsError:
+        pass
+    except taskqueue.TombstonedTaskError:
+        deferred.defer(buildAvailabilitySnapshot, day.toordinal())
+
+'''cron class building tomorrow's availability snapshot ahead of midnight, so instances start the day without a scan'''
+class BuildAvailability(webapp2.RequestHandler):
+    def get(self):
+        buildAvailabilitySnapshot((localNow().date() + datetime.timedelta(days=1)).toordinal())
+
+'''per-instance availability engine for the present day, kept in step with other instances through a memcache change
+log. An instance that falls behind the log, starts a new day or is told of a new snapshot loads the day's snapshot
+and replays the log from its version; only when the day has no snapshot yet does it scan the datastore itself, and it
+queues a build. loadSnapshot() takes the day's snapshot only if there is one, for warmup requests. Imports and
+migrations call invalidate(), which queues a build instead of logging every change.
+Requests publish their changes right after they commit; the transactional task of every write then publishes the
+resource and day as stored (see reconcileAvailability), so a change lost in between is only missing until it runs'''
+class AvailabilityIndex(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.state = None
+        self.baseVersion = None
+        self.missingUpTo = None
+        self.snapshotChecked = 0
+
+    def freeResources(self, start, end, limit=TIME_SEARCH_LIMIT):
+        with self.lock:
+            self._refresh()
+            return self.state.free(start, end, limit)
+
+    def loadSnapshot(self):
+        with self.lock:
+            today = localNow().date()
+            if self.state is not None and self.state.day == today:
+                return True
+            snapshot = readAvailabilitySnapshot(today)
+            if snapshot is None:
+                return False
+            self.snapshotChecked = time.time()
+            self._useSnapshot(snapshot, self.currentVersion())
+            return True
+
+    def publish(self, change):
+        version = memcache.incr(AVAILABILITY_VERSION_KEY, initial_value=0)
+        if version is None:
+            return
+        memcache.set(AVAILABILITY_CHANGE_KEY % version, change)
+        with self.lock:
+            if self.state is not None and version == self.version + 1:
+                self._apply(change)
+                self.version = version
+
+    def invalidate(self):
+        scheduleAvailabilitySnapshot(localNow().date())
+
+    def currentVersion(self):
+        current = memcache.get(AVAILABILITY_VERSION_KEY)
+        if current is None:
+            memcache.add(AVAILABILITY_VERSION_KEY, 0)
+            current = memcache.get(AVAILABILITY_VERSION_KEY) or 0
+        return current
+
+    def _refresh(self):
+        current = self.currentVersion()
+        today = localNow().date()
+        if self.state is not None and self.state.day == today and self._replay(current):
+            if self.missingUpTo is None or time.time() < self.snapshotChecked + AVAILABILITY_RETRY_SECONDS:
+                return
+        elif self.state is not None and self.state.day == today:
+            self.missingUpTo = current
+            self.version = current
+            if time.time() < self.snapshotChecked + AVAILABILITY_RETRY_SECONDS:
+                return
+        self._reload(today, current)
+
+    def _replay(self, current):
+        if current == self.version:
+            return True
+        if not self.version < current <= self.version + AVAILABILITY_MAX_REPLAY:
+            return False
+        changeKeys = [AVAILABILITY_CHANGE_KEY % version for version in range(self.version + 1, current + 1)]
+        changes = memcache.get_multi(changeKeys)
+        if len(changes) != len(changeKeys):
+            return False
+        for changeKey in changeKeys:
+            self._apply(changes[changeKey])
+        self.version = current
+        return True
+
+    def _reload(self, today, current):
+        self.snapshotChecked = time.time()
+        snapshot = readAvailabilitySnapshot(today)
+        sameDay = self.state is not None and self.state.day == today
+        if snapshot is not None and (not sameDay or self.missingUpTo is None or snapshot[0] >= self.missingUpTo):
+            if not self._useSnapshot(snapshot, current):
+                scheduleAvailabilitySnapshot(today)
+            return
+        if not sameDay:
+            logging.warning('No availability snapshot of %s yet, scanning the datastore', today)
+            self.state = buildAvailabilityState(today)
+            self.version = self.baseVersion = current
+            self.missingUpTo = None
+        scheduleAvailabilitySnapshot(today)
+
+    def _useSnapshot(self, snapshot, current):
+        self.version, self.state = snapshot
+        self.baseVersion = self.version
+        self.missingUpTo = None
+        if self.version > current or not self._replay(current):
+            self.missingUpTo = current
+            self.version = current
+            return False
+        return True
+
+    def _apply(self, change):
+        if change[0] == 'snapshot':
+            if change[1] == self.state.day and change[2] > self.baseVersion:
+                self.missingUpTo = max(self.missingUpTo or 0, change[2])
+                self.snapshotChecked = 0
+        else:
+            self.state.apply(change)
+
+availabilityIndex = AvailabilityIndex()
+
+'''helper function to get the key a booking is known by in the availability engine; rules are prefixed, so the
+occurrences of a rule never replace a reservation sharing its primaryKey'''
+def bookingKey(reservationKind, primaryKey):
+    return 'rule:' + primaryKey if reservationKind == RULE_KIND else primaryKey
+
+'''helper function to list the days the availability engine may hold in memory: today, and tomorrow, whose snapshot
+instances replay the change log onto after midnight'''
+def availabilityDays():
+    today = localNow().date()
+    return [today, today + datetime.timedelta(days=1)]
+
+'''helper function to queue, from inside the transaction that writes a resource, its schedule of a day or its rules, a
+check of its availability on those of the days the engine may hold; the task is transactional, so it runs exactly
+when the write commits, even if the request dies before publishing its own change'''
+def queueAvailabilityCheck(resourcePrimaryKey, days):
+    ordinals = sorted(set(day.toordinal() for day in days if day in availabilityDays()))
+    if ordinals:
+        deferred.defer(reconcileAvailability, resourcePrimaryKey, ordinals, _transactional=True)
+
+'''deferred task publishing the window and bookings of a resource on some days as the datastore holds them, read from
+the resource, its schedules and its rules; the change replaces what instances have for the resource on that day, so
+a change the request lost between commit and publish, or published out of order, is put right'''
+def reconcileAvailability(resourcePrimaryKey, ordinals):
+    days = [datetime.date.fromordinal(ordinal) for ordinal in ordinals]
+    resource = getByPrimaryKey(Resource, resourcePrimaryKey)
+    found = ndb.get_multi([recurrencesKey(resourcePrimaryKey)] + [scheduleKey(resourcePrimaryKey, day) for day in days])
+    for day, schedule in zip(days, found[1:]):
+        availabilityIndex.publish(('resource', resourcePrimaryKey, resource.key if resource else None,
+                                   resourceWindow(resource) if resource else None, day,
+                                   resourceDayBookings(schedule, found[0], day)))
+
+'''helper function to record a change of a resource's open window in the availability engine'''
+def publishResourceWindow(resource):
+    availabilityIndex.publish(('window', resource.primaryKey, resource.key, resourceWindow(resource)))
+
+'''helper function to record a new reservation in the availability engine'''
+def publishReservationBooked(reservation):
+    availabilityIndex.publish(('book', reservation.resource_PrimaryKey,
+                               bookingKey(reservation.reservationKind, reservation.primaryKey),
+                               reservationInterval(reservation), reservation.reservation_Date))
+
+'''helper function to record a deleted reservation in the availability engine'''
+def publishReservationCancelled(reservation):
+    availabilityIndex.publish(('unbook', reservation.resource_PrimaryKey,
+                               bookingKey(reservation.reservationKind, reservation.primaryKey)))
+# [END availability]
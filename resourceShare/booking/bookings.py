@@ -0,0 +1,180 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''Transactions booking and cancelling single reservations.'''
+
+import logging
+
+from google.appengine.api import datastore_errors
+from google.appengine.ext import ndb
+
+from resourceShare.settings import RESERVATION_BATCH_SIZE, localNow
+from resourceShare.model.lookup import allocatePrimaryKeys, entityKey
+from resourceShare.model.reservations import Reservation, fitsResourceWindow, reservationInterval
+from resourceShare.model.counter import changeReservationCount
+from resourceShare.model.schedule import getSchedule, scheduleKey
+from resourceShare.model.rules import getRecurrences
+from resourceShare.availability import queueAvailabilityCheck
+from resourceShare.booking.confirmations import enqueueConfirmations
+from resourceShare.booking.upcoming import addToUpcoming, removeFromUpcoming
+
+# [START booking]
+'''raised when a reservation falls outside its resource's window or overlaps another reservation'''
+class ReservationConflict(Exception):
+    pass
+
+'''helper function to insert reservations of one resource and day into its schedule, count them, list them as
+upcoming, queue the availability check of the day and, with confirm, their confirmation mails in one cross-group
+transaction; returns the inserted
+reservations, those whose key was already taken and those whose slot was taken by another reservation or an
+occurrence of a rule'''
+@ndb.transactional(xg=True)
+def insertReservations(resource, day, reservations, confirm=True):
+    existing = ndb.get_multi([reservation.key for reservation in reservations])
+    schedule = getSchedule(resource.primaryKey, day)
+    recurrences = getRecurrences(resource.primaryKey)
+    inserted = []
+    duplicates = []
+    conflicts = []
+    for reservation, found in zip(reservations, existing):
+        if found is not None:
+            duplicates.append(reservation)
+            continue
+        start, end = reservationInterval(reservation, computed=True)
+        if (not fitsResourceWindow(resource, start, end) or schedule.overlaps(start, end) or
+                recurrences.overlaps(day, start, end)):
+            conflicts.append(reservation)
+            continue
+        schedule.insert(reservation.primaryKey, start, end)
+        inserted.append(reservation)
+    if inserted:
+        ndb.put_multi(inserted + [schedule] + addToUpcoming(resource.primaryKey, inserted))
+        changeReservationCount(resource.primaryKey, len(inserted))
+        queueAvailabilityCheck(resource.primaryKey, [day])
+        if confirm:
+            enqueueConfirmations(inserted)
+    return inserted, duplicates, conflicts
+
+'''helper function to give reservations newly allocated primaryKeys'''
+def assignReservationKeys(reservations):
+    for reservation, primaryKey in zip(reservations, allocatePrimaryKeys(Reservation, len(reservations))):
+        reservation.key = entityKey(Reservation, primaryKey)
+        reservation.primaryKey = primaryKey
+
+'''helper function to split reservations into batches whose reservations and owners add up to at most
+RESERVATION_BATCH_SIZE entity groups'''
+def reservationBatches(reservations):
+    batch = []
+    owners = set()
+    for reservation in reservations:
+        if batch and len(batch) + len(owners | set([reservation.reservation_Owner])) >= RESERVATION_BATCH_SIZE:
+            yield batch
+            batch = []
+            owners = set()
+        batch.append(reservation)
+        owners.add(reservation.reservation_Owner)
+    if batch:
+        yield batch
+
+'''helper function to book reservations of one resource day by day, in batches small enough for one cross-group
+transaction each; returns the booked reservations and those that conflicted. With keepKeys the reservations keep
+the keys they were given and one already stored under its key counts as booked, so a replayed batch is harmless;
+with confirm their owners get confirmation mails'''
+def bookReservations(resource, reservations, keepKeys=False, confirm=True):
+    booked = []
+    conflicts = []
+    byDay = {}
+    for reservation in reservations:
+        byDay.setdefault(reservation.reservation_Date, []).append(reservation)
+    for day, dayReservations in byDay.items():
+        for batch in reservationBatches(dayReservations):
+            while batch:
+                if not keepKeys:
+                    assignReservationKeys(batch)
+                inserted, batch, rejected = insertReservations(resource, day, batch, confirm)
+                booked.extend(inserted)
+                conflicts.extend(rejected)
+                if keepKeys:
+                    booked.extend(batch)
+                    batch = []
+    return booked, conflicts
+
+'''helper function to book a single reservation, raises ReservationConflict when the slot is taken'''
+def bookReservation(resource, reservation):
+    booked, conflicts = bookReservations(resource, [reservation])
+    if conflicts:
+        raise ReservationConflict()
+    return reservation
+
+'''helper function to delete reservations of one resource and day, drop them from its schedule, uncount them, drop
+them from the upcoming views and queue the availability check of the day in one cross-group transaction; returns the
+reservations that still existed'''
+@ndb.transactional(xg=True)
+def deleteReservations(resourcePrimaryKey, day, reservations):
+    existing = [reservation for reservation, found in
+                zip(reservations, ndb.get_multi([reservation.key for reservation in reservations])) if found is not None]
+    if not existing:
+        return existing
+    ndb.delete_multi([reservation.key for reservation in existing])
+    if resourcePrimaryKey:
+        ndb.put_multi(removeFromUpcoming(resourcePrimaryKey, existing))
+    if resourcePrimaryKey and day:
+        schedule = scheduleKey(resourcePrimaryKey, day).get()
+        if schedule is not None:
+            for reservation in existing:
+                schedule.remove(reservation.primaryKey)
+            schedule.put()
+    if resourcePrimaryKey:
+        changeReservationCount(resourcePrimaryKey, -len(existing))
+    if resourcePrimaryKey and day:
+        queueAvailabilityCheck(resourcePrimaryKey, [day])
+    return existing
+
+'''helper function to cancel reservations grouped by resource and day, returns the ones actually deleted'''
+def cancelReservations(reservations):
+    cancelled = []
+    groups = {}
+    for reservation in reservations:
+        groups.setdefault((reservation.resource_PrimaryKey, reservation.reservation_Date), []).append(reservation)
+    for (resourcePrimaryKey, day), group in groups.items():
+        for batch in reservationBatches(group):
+            cancelled.extend(deleteReservations(resourcePrimaryKey, day, batch))
+    return cancelled
+
+'''helper function to cancel a single reservation'''
+def cancelReservation(reservation):
+    return cancelReservations([reservation])
+
+'''helper function to record the last reservation time on a resource: a get-modify-put of only date and justCreated in
+a transaction of its own, so an edit saved meanwhile is kept; the copy the caller holds is updated to match'''
+def touchResource(resource):
+    reservedAt = localNow().replace(tzinfo=None)
+    try:
+        markReserved(resource.key, reservedAt)
+    except (datastore_errors.Timeout, datastore_errors.TransactionFailedError):
+        logging.warning('Could not record the last reservation time of resource %s', resource.primaryKey)
+        return
+    resource.date = reservedAt
+    resource.justCreated = 0
+
+'''helper function to set date and justCreated of the stored resource; a later time already recorded is kept'''
+@ndb.transactional
+def markReserved(resourceKey, reservedAt):
+    stored = resourceKey.get()
+    if stored is None or (stored.justCreated == 0 and stored.date and stored.date >= reservedAt):
+        return
+    stored.date = reservedAt
+    stored.justCreated = 0
+    stored.put()
+# [END booking]
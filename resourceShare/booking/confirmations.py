@@ -0,0 +1,145 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''Confirmation mails of bookings, queued transactionally and sent as one digest per owner.'''
+
+import time
+import hashlib
+import logging
+import datetime
+
+from google.appengine.api import taskqueue
+from google.appengine.ext import deferred
+from google.appengine.ext import ndb
+
+import webapp2
+
+from resourceShare.settings import MAIL_DIGEST_SECONDS, MAIL_QUEUE, MAIL_SENDER, RULE_KIND
+from resourceShare.model.lookup import entityKey
+from resourceShare.model.reservations import Reservation
+from resourceShare.model.resources import attachResourceNames
+from resourceShare.model.rules import RecurringReservation
+
+# [START confirmation_mail]
+'''a confirmation waiting to be mailed, stored under the outbox of its owner'''
+class PendingConfirmation(ndb.Model):
+    resource_PrimaryKey = ndb.StringProperty(indexed=False)
+    # the name of the resource, looked up when the mail is sent
+    resource_Name = ndb.StringProperty(indexed=False)
+    reservation_StartTime = ndb.StringProperty(indexed=False)
+    reservation_Duration = ndb.IntegerProperty(indexed=False)
+    enqueuedAt = ndb.DateTimeProperty(auto_now_add=True, indexed=False)
+
+'''mail sink that sends through the App Engine mail API'''
+class AppEngineMailSink(object):
+    def send(self, sender, to, subject, body, enqueuedAt):
+        # imported here since only the mail task needs it; the warmup handler preloads it
+        from google.appengine.api import mail
+        mail.EmailMessage(sender=sender, to=to, subject=subject, body=body).send()
+        logging.info('Sent confirmation to %s %.1fs after it was queued', to,
+                     (datetime.datetime.now() - enqueuedAt).total_seconds())
+
+'''mail sink that keeps messages in memory with their enqueue-to-send latency, for offline runs'''
+class LocalMailSink(object):
+    def __init__(self):
+        self.sent = []
+
+    def send(self, sender, to, subject, body, enqueuedAt):
+        self.sent.append({
+            'sender': sender,
+            'to': to,
+            'subject': subject,
+            'body': body,
+            'latency': (datetime.datetime.now() - enqueuedAt).total_seconds(),
+        })
+
+mailSink = AppEngineMailSink()
+
+'''helper function to get the key of the outbox holding the pending confirmations of a user'''
+def outboxKey(email):
+    return ndb.Key('ConfirmationOutbox', email)
+
+'''helper function to queue the confirmations of some bookings, reservations or rules, from inside the transaction
+that stores them: one transactional task, added only if the transaction commits, carries them all to
+queueConfirmations'''
+def enqueueConfirmations(reservations):
+    bookings = [(reservation.reservationKind, reservation.primaryKey, reservation.reservation_Owner,
+                 reservation.resource_PrimaryKey, reservation.reservation_StartTime, reservation.reservation_Duration)
+                for reservation in reservations]
+    deferred.defer(queueConfirmations, bookings, _queue=MAIL_QUEUE, _transactional=True)
+
+'''deferred task storing the pending confirmations of the bookings a transaction stored, with one put_multi, and
+queueing the mail task of each owner; every booking of a user within one digest window goes out in a single mail.
+A booking already taken back, such as a rule found to meet a reservation right after it was stored, is left out'''
+def queueConfirmations(bookings):
+    stored = ndb.get_multi([entityKey(RecurringReservation if reservationKind == RULE_KIND else Reservation, primaryKey)
+                            for reservationKind, primaryKey, owner, resourcePrimaryKey, startTime, duration in bookings])
+    owners = []
+    pending = []
+    for booking, entity in zip(bookings, stored):
+        reservationKind, primaryKey, owner, resourcePrimaryKey, startTime, duration = booking
+        if entity is None:
+            continue
+        if owner not in owners:
+            owners.append(owner)
+        pending.append(PendingConfirmation(id='%s:%s' % (reservationKind, primaryKey), parent=outboxKey(owner),
+                                           resource_PrimaryKey=resourcePrimaryKey,
+                                           reservation_StartTime=startTime, reservation_Duration=duration))
+    ndb.put_multi(pending)
+    for email in owners:
+        addConfirmationTask(email)
+
+'''helper function to queue the mail task of a user for the current digest window, named so the window gets only one'''
+def addConfirmationTask(email):
+    now = time.time()
+    window = int(now // MAIL_DIGEST_SECONDS) + 1
+    params = {'owner': email}
+    digest = hashlib.md5(email.encode('utf-8') if isinstance(email, unicode) else email).hexdigest()
+    try:
+        taskqueue.add(url='/tasks/sendConfirmations', params=params, queue_name=MAIL_QUEUE,
+                      name='confirm-%s-%d' % (digest, window), countdown=window * MAIL_DIGEST_SECONDS - now)
+    except taskqueue.TaskAlreadyExistsError:
+        pass
+    except taskqueue.TombstonedTaskError:
+        taskqueue.add(url='/tasks/sendConfirmations', params=params, queue_name=MAIL_QUEUE)
+
+'''helper function to write the subject and body of the confirmation mail for some pending confirmations; a resource
+deleted since is named as such'''
+def confirmationMessage(pending):
+    for confirmation in pending:
+        confirmation.resource_Name = confirmation.resource_Name or 'a deleted resource'
+    if len(pending) == 1:
+        confirmation = pending[0]
+        return ("ResourceShare: We have reserved " + confirmation.resource_Name + " for you.",
+                "Greetings! As per your request we have reserved " + confirmation.resource_Name +
+                " for you. The reservation starts at " + confirmation.reservation_StartTime +
+                " for " + str(confirmation.reservation_Duration) + " minutes.")
+    lines = ["Greetings! As per your request we have made the following reservations for you:", ""]
+    for confirmation in pending:
+        lines.append("- " + confirmation.resource_Name + " starting at " + confirmation.reservation_StartTime +
+                     " for " + str(confirmation.reservation_Duration) + " minutes")
+    return ("ResourceShare: We have made " + str(len(pending)) + " reservations for you.", "\n".join(lines))
+
+'''task class to mail the pending confirmations of one user; a failure makes the queue retry with backoff'''
+class SendConfirmations(webapp2.RequestHandler):
+    def post(self):
+        owner = self.request.get('owner')
+        pending = PendingConfirmation.query(ancestor=outboxKey(owner)).fetch()
+        if not pending:
+            return
+        pending.sort(key=lambda confirmation: confirmation.enqueuedAt)
+        subject, body = confirmationMessage(attachResourceNames(pending))
+        mailSink.send(MAIL_SENDER, owner, subject, body, pending[0].enqueuedAt)
+        ndb.delete_multi([confirmation.key for confirmation in pending])
+# [END confirmation_mail]
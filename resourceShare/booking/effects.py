@@ -0,0 +1,97 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''What a request does after its write commits: publish to the availability engine and invalidate cached pages,
+fragments and feeds.'''
+
+from resourceShare.settings import localNow
+from resourceShare.rendering import bumpFragmentVersion
+from resourceShare.model.rules import expandRecurrences
+from resourceShare.availability import publishReservationBooked, publishReservationCancelled, publishResourceWindow
+from resourceShare.model.tags import addResourcesToTagSummaries, updateTagSummaries
+from resourceShare.feed import bumpFeedVersion
+from resourceShare.booking.bookings import touchResource
+from resourceShare import availability
+
+# [START write_effects]
+'''helper function to propagate a resource saved with saveResource to the availability engine, its feed and the cached
+fragments'''
+def resourceSaved(resource):
+    publishResourceWindow(resource)
+    bumpFeedVersion(resource.primaryKey)
+    bumpFragmentVersion('allResourcesTable.html')
+
+'''helper function to propagate reservations booked on one resource'''
+def reservationsBooked(resource, reservations):
+    if not reservations:
+        return
+    touchResource(resource)
+    for reservation in reservations:
+        publishReservationBooked(reservation)
+    bumpFeedVersion(resource.primaryKey)
+    bumpFragmentVersion('allResourcesTable.html')
+
+'''helper function to drop deleted resources from the availability engine, their feeds, the tag summaries and the
+cached fragments'''
+def resourcesDeleted(resources):
+    for resource in resources:
+        availability.availabilityIndex.publish(('window', resource.primaryKey, resource.key, None))
+        bumpFeedVersion(resource.primaryKey)
+        updateTagSummaries(resource.primaryKey, resource.resource_tag, [])
+    if resources:
+        bumpFragmentVersion('allResourcesTable.html')
+
+'''helper function to propagate a batch of imported resources; instances reload availability instead of replaying
+one change per resource'''
+def resourcesImported(resources):
+    if not resources:
+        return
+    addResourcesToTagSummaries(resources)
+    availability.availabilityIndex.invalidate()
+    bumpFragmentVersion('allResourcesTable.html')
+
+'''helper function to propagate reservations imported on one resource, without confirmation mails'''
+def reservationsImported(resource, reservations):
+    if not reservations:
+        return
+    touchResource(resource)
+    bumpFeedVersion(resource.primaryKey)
+    bumpFragmentVersion('allResourcesTable.html')
+
+'''helper function to propagate cancelled reservations'''
+def reservationsCancelled(reservations):
+    for reservation in reservations:
+        publishReservationCancelled(reservation)
+    for primaryKey in set(reservation.resource_PrimaryKey for reservation in reservations):
+        bumpFeedVersion(primaryKey)
+    if reservations:
+        bumpFragmentVersion('allResourcesTable.html')
+
+'''helper function to propagate a booked rule; its owner gets one confirmation mail for the whole series'''
+def recurrenceBooked(resource, rule):
+    touchResource(resource)
+    today = localNow().date()
+    for occurrence in expandRecurrences([rule], today, today):
+        publishReservationBooked(occurrence)
+    bumpFeedVersion(resource.primaryKey)
+    bumpFragmentVersion('allResourcesTable.html')
+
+'''helper function to propagate a cancelled rule, or a cancelled occurrence of it on day'''
+def recurrenceCancelled(rule, day=None):
+    if day is None or day == localNow().date():
+        publishReservationCancelled(rule)
+    bumpFeedVersion(rule.resource_PrimaryKey)
+    if day is None:
+        bumpFragmentVersion('allResourcesTable.html')
+# [END write_effects]
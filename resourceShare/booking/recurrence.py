@@ -0,0 +1,105 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''Transactions booking, skipping and cancelling recurring reservation rules.'''
+
+import datetime
+
+from google.appengine.ext import ndb
+
+from resourceShare.model.lookup import allocatePrimaryKeys, entityKey
+from resourceShare.model.reservations import Reservation, fitsResourceWindow
+from resourceShare.model.counter import changeReservationCount
+from resourceShare.model.schedule import scheduleKey
+from resourceShare.model.rules import (RecurringReservation, checkRecurrence, getRecurrences, occurrenceCount,
+                                       occurrenceOrdinals, occursOn, recurrenceSpec, recurrencesKey)
+from resourceShare.availability import availabilityDays, queueAvailabilityCheck
+from resourceShare.booking.confirmations import enqueueConfirmations
+
+# [START recurrence]
+'''helper function to store a rule among the rules of its resource, count its occurrences and queue its confirmation
+mail in one cross-group transaction; returns the day ordinals on which it meets another rule, in which case nothing
+is written'''
+@ndb.transactional(xg=True)
+def insertRecurrence(rule):
+    recurrences = getRecurrences(rule.resource_PrimaryKey)
+    spec = recurrenceSpec(rule)
+    clashes = recurrences.conflicts(spec)
+    if clashes:
+        return clashes
+    recurrences.replace(spec)
+    rule.countedOccurrences = occurrenceCount(spec)
+    ndb.put_multi([rule, recurrences])
+    changeReservationCount(rule.resource_PrimaryKey, rule.countedOccurrences)
+    queueAvailabilityCheck(rule.resource_PrimaryKey, availabilityDays())
+    enqueueConfirmations([rule])
+    return clashes
+
+'''helper function to delete a rule, drop it from the rules of its resource and uncount the occurrences it still
+counts in one cross-group transaction; returns whether it still existed'''
+@ndb.transactional(xg=True)
+def deleteRecurrence(rule):
+    stored = rule.key.get()
+    if stored is None:
+        return False
+    rule.key.delete()
+    recurrences = recurrencesKey(stored.resource_PrimaryKey).get()
+    if recurrences is not None:
+        recurrences.remove(stored.primaryKey)
+        recurrences.put()
+    changeReservationCount(stored.resource_PrimaryKey,
+                           -(stored.countedOccurrences if stored.countedOccurrences is not None else 1))
+    queueAvailabilityCheck(stored.resource_PrimaryKey, availabilityDays())
+    return True
+
+'''helper function to cancel one occurrence of a rule and uncount it in one cross-group transaction; returns the
+updated rule, or None when it no longer exists. A day the rule does not occur on, or skips already, changes nothing'''
+@ndb.transactional(xg=True)
+def skipOccurrence(rule, day):
+    rule = rule.key.get()
+    if rule is None or not occursOn(recurrenceSpec(rule), day.toordinal()):
+        return rule
+    rule.skippedDates.append(day)
+    recurrences = getRecurrences(rule.resource_PrimaryKey)
+    recurrences.replace(recurrenceSpec(rule))
+    if rule.countedOccurrences is not None:
+        rule.countedOccurrences -= 1
+        changeReservationCount(rule.resource_PrimaryKey, -1)
+    ndb.put_multi([rule, recurrences])
+    queueAvailabilityCheck(rule.resource_PrimaryKey, [day])
+    return rule
+
+'''helper function to book a rule of a resource; returns the days it conflicts on, or an empty list once booked. The
+rule is checked against the other rules when it is stored and its occurrences against the single reservations
+right after; a single reservation booked meanwhile read the rules in its own transaction, so it either failed on
+contention or is already in the schedules checked here, and the rule is taken back'''
+def bookRecurrence(resource, rule):
+    checkRecurrence(rule)
+    rule.resource_PrimaryKey = resource.primaryKey
+    rule.primaryKey = allocatePrimaryKeys(Reservation, 1)[0]
+    rule.key = entityKey(RecurringReservation, rule.primaryKey)
+    spec = recurrenceSpec(rule)
+    days = [datetime.date.fromordinal(ordinal) for ordinal in occurrenceOrdinals(spec, spec['first'], spec['last'])]
+    if not days or not fitsResourceWindow(resource, spec['start'], spec['end']):
+        return days or [rule.startDate]
+    clashes = insertRecurrence(rule)
+    if clashes:
+        return [datetime.date.fromordinal(ordinal) for ordinal in clashes]
+    schedules = ndb.get_multi([scheduleKey(resource.primaryKey, day) for day in days])
+    clashes = [day for day, schedule in zip(days, schedules)
+               if schedule is not None and schedule.overlaps(spec['start'], spec['end'])]
+    if clashes:
+        deleteRecurrence(rule)
+    return clashes
+# [END recurrence]
@@ -0,0 +1,184 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''The upcoming reservations views of each user and resource, kept up to date in the booking transactions.'''
+
+import time
+import calendar
+import datetime
+
+from google.appengine.ext import ndb
+
+import webapp2
+
+from resourceShare.settings import MIGRATION_BATCH_SIZE, SITE_TIMEZONE, UPCOMING_DAYS, UPCOMING_MAX_ENTRIES, localNow
+from resourceShare.model.reservations import reservationInterval
+from resourceShare.model.resources import attachEntryResourceNames
+from resourceShare.model.rules import ResourceRecurrences, expandRecurrences, pruneRecurrences
+
+# [START upcoming]
+'''the upcoming reservations of one user or one resource on one day, soonest first, keyed by "user:<email>:<date>" or
+"resource:<primaryKey>:<date>"; entries carry the reservation fields the pages show, except the resource name, which
+readUpcoming looks up, plus startsAt and endsAt in epoch seconds. Keying by day keeps a booking to the view of its own day, like the schedule, and bounds the size of a view'''
+class UpcomingReservations(ndb.Model):
+    entries = ndb.JsonProperty(indexed=False, compressed=True)
+    nextExpiry = ndb.DateTimeProperty(indexed=True)
+
+    def add(self, entries):
+        added = set(entry['primaryKey'] for entry in entries)
+        self.entries = sorted([entry for entry in self.entries or [] if entry['primaryKey'] not in added] + entries,
+                              key=lambda entry: (entry['startsAt'], entry['primaryKey']))[:UPCOMING_MAX_ENTRIES]
+
+    def remove(self, primaryKeys):
+        self.entries = [entry for entry in self.entries or [] if entry['primaryKey'] not in primaryKeys]
+
+    def upcoming(self, now):
+        return [entry for entry in self.entries or [] if entry['endsAt'] > now]
+
+    def _pre_put_hook(self):
+        ends = [entry['endsAt'] for entry in self.entries or []]
+        self.nextExpiry = datetime.datetime.utcfromtimestamp(min(ends)) if ends else None
+
+'''helper function to get the key of the upcoming reservations of a user on a day'''
+def userUpcomingKey(email, day):
+    return ndb.Key(UpcomingReservations, 'user:%s:%s' % (email, day.isoformat()))
+
+'''helper function to get the key of the upcoming reservations of a resource on a day'''
+def resourceUpcomingKey(primaryKey, day):
+    return ndb.Key(UpcomingReservations, 'resource:%s:%s' % (primaryKey, day.isoformat()))
+
+'''helper function to list the days the upcoming reservations lists cover, today first'''
+def upcomingDays():
+    today = localNow().date()
+    return [today + datetime.timedelta(days=offset) for offset in range(UPCOMING_DAYS + 1)]
+
+'''helper function to get the day of a reservation, today for reservations from before dates were kept'''
+def reservationDay(reservation):
+    return reservation.reservation_Date or localNow().date()
+
+'''helper function to get when a reservation starts and ends in epoch seconds; its start time is a wall clock time in
+the site timezone on its day'''
+def reservationPeriod(reservation):
+    interval = reservationInterval(reservation)
+    if interval is None:
+        return None
+    day = reservationDay(reservation)
+    start = SITE_TIMEZONE.localize(datetime.datetime.combine(day, datetime.time(interval[0] // 60, interval[0] % 60)))
+    startsAt = calendar.timegm(start.utctimetuple())
+    return startsAt, startsAt + (interval[1] - interval[0]) * 60
+
+'''helper function to describe a reservation as an entry of the upcoming reservations, or None once it has ended'''
+def upcomingEntry(reservation):
+    period = reservationPeriod(reservation)
+    if period is None or period[1] <= time.time():
+        return None
+    return {
+        'primaryKey': reservation.primaryKey,
+        'reservationKind': reservation.reservationKind,
+        'resource_PrimaryKey': reservation.resource_PrimaryKey,
+        'reservation_Owner': reservation.reservation_Owner,
+        'reservation_StartTime': reservation.reservation_StartTime,
+        'reservation_Duration': reservation.reservation_Duration,
+        'reservation_Date': reservation.reservation_Date.isoformat() if reservation.reservation_Date else None,
+        'startsAt': period[0],
+        'endsAt': period[1],
+    }
+
+'''helper function to add reservations of one resource to the upcoming reservations of the resource and their owners
+on the days of the reservations, joining the caller's transaction; returns the changed views for the caller to put'''
+def addToUpcoming(resourcePrimaryKey, reservations):
+    byView = {}
+    for reservation in reservations:
+        entry = upcomingEntry(reservation)
+        if entry is not None:
+            day = reservationDay(reservation)
+            byView.setdefault(resourceUpcomingKey(resourcePrimaryKey, day), []).append(entry)
+            byView.setdefault(userUpcomingKey(entry['reservation_Owner'], day), []).append(entry)
+    viewKeys = byView.keys()
+    views = []
+    for key, view in zip(viewKeys, ndb.get_multi(viewKeys)):
+        view = view or UpcomingReservations(key=key)
+        view.add(byView[key])
+        views.append(view)
+    return views
+
+'''helper function to drop reservations of one resource from the upcoming reservations of the resource and their
+owners, joining the caller's transaction; returns the changed views for the caller to put'''
+def removeFromUpcoming(resourcePrimaryKey, reservations):
+    primaryKeys = set(reservation.primaryKey for reservation in reservations)
+    viewKeys = set()
+    for reservation in reservations:
+        viewKeys.add(resourceUpcomingKey(resourcePrimaryKey, reservationDay(reservation)))
+        viewKeys.add(userUpcomingKey(reservation.reservation_Owner, reservationDay(reservation)))
+    viewKeys = list(viewKeys)
+    views = []
+    for view in ndb.get_multi(viewKeys):
+        if view is not None:
+            view.remove(primaryKeys)
+            views.append(view)
+    return views
+
+'''helper function to read the upcoming reservations behind the view keys of some days with one get_multi, soonest
+first, together with the coming occurrences of the rules a query finds, and show the current names of their
+resources; the query runs while the views are read'''
+def readUpcoming(viewKeys, rulesQuery=None):
+    rulesFuture = rulesQuery.fetch_async() if rulesQuery is not None else None
+    now = time.time()
+    entries = []
+    for view in ndb.get_multi(viewKeys):
+        if view is not None:
+            entries.extend(view.upcoming(now))
+    if rulesFuture is not None:
+        entries.extend(upcomingOccurrences(rulesFuture.get_result()))
+    return attachEntryResourceNames(sorted(entries, key=lambda entry: (entry['startsAt'], entry['primaryKey'])))
+
+'''helper function to drop the ended entries of one view inside a transaction'''
+@ndb.transactional
+def pruneUpcomingView(viewKey):
+    view = viewKey.get()
+    if view is None:
+        return
+    upcoming = view.upcoming(time.time())
+    if not upcoming:
+        view.key.delete()
+    elif len(upcoming) < len(view.entries):
+        view.entries = upcoming
+        view.put()
+
+'''helper function to run prune on the keys of every entity a query finds, a page at a time'''
+def pruneMatching(query, prune):
+    startCursor = None
+    while True:
+        keys, nextCursor, more = query.fetch_page(MIGRATION_BATCH_SIZE, start_cursor=startCursor, keys_only=True)
+        for key in keys:
+            prune(key)
+        if not more or not nextCursor:
+            break
+        startCursor = nextCursor
+
+'''cron class pruning the views holding reservations that have ended and the rules of resources holding rules whose
+last day has passed'''
+class PruneUpcoming(webapp2.RequestHandler):
+    def get(self):
+        pruneMatching(UpcomingReservations.query(UpcomingReservations.nextExpiry <= datetime.datetime.utcnow()),
+                      pruneUpcomingView)
+        pruneMatching(ResourceRecurrences.query(ResourceRecurrences.nextExpiry <= localNow().date()),
+                      pruneRecurrences)
+
+'''helper function to describe the occurrences of rules on the days the upcoming lists cover as upcoming entries'''
+def upcomingOccurrences(rules):
+    days = upcomingDays()
+    occurrences = expandRecurrences(rules, days[0], days[-1])
+    return [entry for entry in (upcomingEntry(occurrence) for occurrence in occurrences) if entry is not None]
+# [END upcoming]
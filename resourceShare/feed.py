@@ -0,0 +1,76 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''The iCalendar feed of a resource, cached in memcache under a version bumped on every change.'''
+
+import time
+import datetime
+from email.utils import formatdate
+from xml.sax.saxutils import escape
+
+from google.appengine.api import memcache
+
+from resourceShare.settings import FEED_MAX_ITEMS, FEED_VERSION_PREFIX, RECURRENCE_MAX_DAYS, localNow
+from resourceShare.model.reservations import Reservation, reservationInterval
+from resourceShare.model.rules import RecurringReservation, expandRecurrences
+
+# [START feed]
+'''helper function to mark the feed of a resource as changed, so conditional GETs and cached copies go stale'''
+def bumpFeedVersion(primaryKey):
+    if primaryKey:
+        memcache.set(FEED_VERSION_PREFIX + primaryKey, repr(time.time()))
+
+'''helper function to read the feed version of a resource, starting a new one when memcache has none'''
+def getFeedVersion(primaryKey):
+    version = memcache.get(FEED_VERSION_PREFIX + primaryKey)
+    if version is None:
+        memcache.add(FEED_VERSION_PREFIX + primaryKey, repr(time.time()))
+        version = memcache.get(FEED_VERSION_PREFIX + primaryKey) or repr(time.time())
+    return version
+
+'''helper function to list the soonest FEED_MAX_ITEMS reservations of a resource from today on, single ones and
+occurrences of its rules together, ordered by day and start time'''
+def feedReservations(resource):
+    today = localNow().date()
+    rulesFuture = RecurringReservation.query(RecurringReservation.resource_PrimaryKey == resource.primaryKey,
+                                             RecurringReservation.untilDate >= today).fetch_async()
+    reservations = Reservation.query(Reservation.resource_PrimaryKey == resource.primaryKey,
+                                     Reservation.reservation_Date >= today).order(
+        Reservation.reservation_Date, Reservation.reservation_StartMinute).fetch(FEED_MAX_ITEMS)
+    lastDay = (reservations[-1].reservation_Date if len(reservations) == FEED_MAX_ITEMS else
+               today + datetime.timedelta(days=RECURRENCE_MAX_DAYS))
+    occurrences = expandRecurrences(rulesFuture.get_result(), today, lastDay)
+    merged = sorted(reservations + occurrences,
+                    key=lambda reservation: (reservation.reservation_Date, reservationInterval(reservation)))
+    return merged[:FEED_MAX_ITEMS]
+
+'''helper function to produce the RSS document of a resource piece by piece from feedReservations; the feed is public,
+so items only tell when the resource is taken, never who holds it, their notes or the reservation ids'''
+def generateFeed(resource, hostUrl, version):
+    resourceUrl = '%s/viewResource?keyVal=%s' % (hostUrl, resource.primaryKey)
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n<rss version="2.0">\n<channel>\n'
+    yield '<title>%s</title>\n' % escape('Reservations for ' + (resource.resource_Name or ''))
+    yield '<link>%s</link>\n' % escape(resourceUrl)
+    yield '<description>%s</description>\n' % escape('Upcoming reservations of ' + (resource.resource_Name or ''))
+    yield '<lastBuildDate>%s</lastBuildDate>\n' % formatdate(float(version), usegmt=True)
+    for reservation in feedReservations(resource):
+        day = reservation.reservation_Date.isoformat()
+        title = 'Reserved on %s at %s for %s minutes' % (day, reservation.reservation_StartTime,
+                                                         reservation.reservation_Duration)
+        yield '<item>\n<title>%s</title>\n<link>%s</link>\n<guid isPermaLink="false">%s</guid>\n</item>\n' % (
+            escape(title),
+            escape(resourceUrl),
+            escape('%s:%s:%s' % (resource.primaryKey, day, reservation.reservation_StartTime)))
+    yield '</channel>\n</rss>\n'
+# [END feed]
@@ -0,0 +1,70 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''Sharded counters of the reservations of each resource.'''
+
+import random
+
+from google.appengine.api import memcache
+from google.appengine.ext import ndb
+
+from resourceShare.settings import RESERVATION_COUNTER_SHARDS, RESERVATION_COUNT_CACHE_SECONDS, RESERVATION_COUNT_PREFIX
+
+# [START reservation_counter]
+'''one shard of the reservation count of a resource, keyed by "<primaryKey>:<shard>"'''
+class ReservationCounterShard(ndb.Model):
+    count = ndb.IntegerProperty(indexed=False, default=0)
+
+'''helper function to list the keys of every reservation counter shard of a resource'''
+def reservationShardKeys(primaryKey):
+    return [ndb.Key(ReservationCounterShard, '%s:%d' % (primaryKey, shard)) for shard in range(RESERVATION_COUNTER_SHARDS)]
+
+'''helper function to change the reservation count of a resource on a random shard, joining the caller's transaction'''
+@ndb.transactional
+def changeReservationCount(primaryKey, delta):
+    shardKey = ndb.Key(ReservationCounterShard, '%s:%d' % (primaryKey, random.randint(0, RESERVATION_COUNTER_SHARDS - 1)))
+    shard = shardKey.get()
+    if shard is None:
+        shard = ReservationCounterShard(key=shardKey)
+    shard.count += delta
+    shard.put()
+    if delta >= 0:
+        ndb.get_context().call_on_commit(lambda: memcache.incr(RESERVATION_COUNT_PREFIX + primaryKey, delta))
+    else:
+        ndb.get_context().call_on_commit(lambda: memcache.decr(RESERVATION_COUNT_PREFIX + primaryKey, -delta))
+
+'''helper function to set reservationCount on each resource: the count kept on the resource before sharding plus the
+sum of its shards, cached in memcache for a short while. A single reservation counts once from booking to
+cancellation; a rule counts once for each of its occurrences, past ones included, less the ones skipped'''
+def attachReservationCounts(resources):
+    baseCounts = {}
+    for resource in resources:
+        if resource.primaryKey:
+            baseCounts[resource.primaryKey] = resource.totalReservations or 0
+    counts = memcache.get_multi(baseCounts.keys(), key_prefix=RESERVATION_COUNT_PREFIX)
+    missing = [primaryKey for primaryKey in baseCounts if primaryKey not in counts]
+    if missing:
+        shardKeys = []
+        for primaryKey in missing:
+            shardKeys.extend(reservationShardKeys(primaryKey))
+        computed = dict((primaryKey, baseCounts[primaryKey]) for primaryKey in missing)
+        for shard in ndb.get_multi(shardKeys):
+            if shard is not None:
+                computed[shard.key.id().rsplit(':', 1)[0]] += shard.count
+        memcache.set_multi(computed, key_prefix=RESERVATION_COUNT_PREFIX, time=RESERVATION_COUNT_CACHE_SECONDS)
+        counts.update(computed)
+    for resource in resources:
+        resource.reservationCount = counts.get(resource.primaryKey, resource.totalReservations or 0)
+    return resources
+# [END reservation_counter]
@@ -0,0 +1,168 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''Entity keys and primaryKey lookups: allocated integer ids, legacy string ids and their aliases, and counters of how
+each lookup was resolved.'''
+
+import re
+import threading
+
+from google.appengine.ext import ndb
+
+from resourceShare.settings import KEY_ALLOCATION_BATCH, LEGACY_KEY_MAX, QUERY_IN_LIMIT
+
+# [START lookup]
+'''thread-safe counters of primary key lookups per model kind. byKey, alias, legacyQuery and missing count which path
+resolved each primaryKey; contextCache, memcache and datastore count where NDB found each key the lookup asked for,
+hits in the two caches and misses that went on to a datastore Get'''
+class LookupStats(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {}
+
+    def record(self, kind, outcome, count=1):
+        if count <= 0:
+            return
+        with self.lock:
+            key = kind + '.' + outcome
+            self.counts[key] = self.counts.get(key, 0) + count
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.counts)
+
+lookupStats = LookupStats()
+
+# the number of keys each thread has asked the datastore for in Get RPCs, counted by countDatastoreGet
+datastoreGets = threading.local()
+
+'''apiproxy pre-call hook counting the keys of a datastore Get of the current thread'''
+def countDatastoreGet(service, call, request, response):
+    if service == 'datastore_v3' and call == 'Get':
+        datastoreGets.keys = getattr(datastoreGets, 'keys', 0) + request.key_size()
+
+'''helper function to get_multi keys and count where NDB found them: the keys in the context cache before the call are
+context cache hits, the keys sent to the datastore during it misses and the rest memcache hits'''
+def countedGetMulti(kind, keys):
+    cache = ndb.get_context()._cache
+    contextHits = sum(1 for key in keys if key in cache)
+    keysBefore = getattr(datastoreGets, 'keys', 0)
+    entities = ndb.get_multi(keys)
+    fromDatastore = getattr(datastoreGets, 'keys', 0) - keysBefore
+    lookupStats.record(kind, 'contextCache', contextHits)
+    lookupStats.record(kind, 'memcache', len(keys) - contextHits - fromDatastore)
+    lookupStats.record(kind, 'datastore', fromDatastore)
+    return entities
+
+'''maps the primaryKey an entity had before keys were allocated to the one it was moved to, keyed by
+"<kind>:<old primaryKey>"'''
+class LegacyKeyAlias(ndb.Model):
+    primaryKey = ndb.StringProperty(indexed=False)
+
+'''helper function to get the key of the alias of an old primaryKey'''
+def aliasKey(modelClass, primaryKey):
+    return ndb.Key(LegacyKeyAlias, '%s:%s' % (modelClass._get_kind(), primaryKey))
+
+'''helper function to tell an allocated primaryKey from an older one, which was a random number up to LEGACY_KEY_MAX'''
+def isAllocatedPrimaryKey(primaryKey):
+    return re.match(r'^[0-9]+$', str(primaryKey)) is not None and int(primaryKey) > LEGACY_KEY_MAX
+
+'''helper function to get the datastore key of the entity with a primaryKey: allocated primaryKeys are integer ids,
+older ones string ids'''
+def entityKey(modelClass, primaryKey):
+    if isAllocatedPrimaryKey(primaryKey):
+        return ndb.Key(modelClass, int(primaryKey))
+    return ndb.Key(modelClass, str(primaryKey))
+
+'''helper function to tell whether an entity already lives under the integer key of its allocated primaryKey'''
+def hasAllocatedKey(entity):
+    return isAllocatedPrimaryKey(entity.primaryKey) and entity.key.id() == int(entity.primaryKey)
+
+'''per-instance pools of ids reserved with allocate_ids, refilled KEY_ALLOCATION_BATCH at a time'''
+class KeyAllocator(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pools = {}
+
+    def allocate(self, modelClass, count):
+        kind = modelClass._get_kind()
+        ids = []
+        with self.lock:
+            if kind not in self.pools:
+                # keeps allocated ids clear of the random primaryKeys handed out before
+                modelClass.allocate_ids(max=LEGACY_KEY_MAX)
+                self.pools[kind] = [1, 0]
+            pool = self.pools[kind]
+            while len(ids) < count:
+                if pool[0] > pool[1]:
+                    pool[0], pool[1] = modelClass.allocate_ids(size=max(KEY_ALLOCATION_BATCH, count - len(ids)))
+                taken = min(count - len(ids), pool[1] - pool[0] + 1)
+                ids.extend(range(pool[0], pool[0] + taken))
+                pool[0] += taken
+        return [str(id) for id in ids]
+
+keyAllocator = KeyAllocator()
+
+'''helper function to get count new primaryKeys of a kind that no other entity has or will get'''
+def allocatePrimaryKeys(modelClass, count):
+    return keyAllocator.allocate(modelClass, count)
+
+'''helper function to load an entity by its primaryKey string; see getMultiByPrimaryKey'''
+def getByPrimaryKey(modelClass, primaryKey):
+    if not primaryKey:
+        return None
+    return getMultiByPrimaryKey(modelClass, [primaryKey])[0]
+
+'''helper function to load many entities by primaryKey with one get_multi, which NDB serves from the context cache and
+memcache; an old primaryKey is followed through its LegacyKeyAlias, and entities from before keyed ids fall back to
+one query. Returns the entities in the order of primaryKeys with None for the missing ones'''
+def getMultiByPrimaryKey(modelClass, primaryKeys):
+    kind = modelClass._get_kind()
+    primaryKeys = [str(primaryKey) for primaryKey in primaryKeys]
+    legacyKeys = list(set(primaryKey for primaryKey in primaryKeys if not isAllocatedPrimaryKey(primaryKey)))
+    found = countedGetMulti(kind, [entityKey(modelClass, primaryKey) for primaryKey in primaryKeys] +
+                            [aliasKey(modelClass, primaryKey) for primaryKey in legacyKeys])
+    entities = found[:len(primaryKeys)]
+    aliases = dict((primaryKey, alias.primaryKey) for primaryKey, alias in zip(legacyKeys, found[len(primaryKeys):])
+                   if alias is not None)
+    targets = list(set(aliases.values()))
+    aliased = dict((primaryKey, entity) for primaryKey, entity in
+                   zip(targets, countedGetMulti(kind, [entityKey(modelClass, primaryKey) for primaryKey in targets]))
+                   if entity is not None)
+    missing = [primaryKey for primaryKey, entity in zip(primaryKeys, entities) if entity is None and
+               aliases.get(primaryKey) not in aliased and not isAllocatedPrimaryKey(primaryKey)]
+    queried = {}
+    for index in range(0, len(missing), QUERY_IN_LIMIT):
+        for entity in modelClass.query(modelClass.primaryKey.IN(missing[index:index + QUERY_IN_LIMIT])).fetch():
+            queried[entity.primaryKey] = entity
+    for index, primaryKey in enumerate(primaryKeys):
+        if entities[index] is not None:
+            lookupStats.record(kind, 'byKey')
+        elif aliases.get(primaryKey) in aliased:
+            entities[index] = aliased[aliases[primaryKey]]
+            lookupStats.record(kind, 'alias')
+        elif primaryKey in queried:
+            entities[index] = queried[primaryKey]
+            lookupStats.record(kind, 'legacyQuery')
+        else:
+            lookupStats.record(kind, 'missing')
+    return entities
+
+'''helper function to get the current primaryKey of an entity that may be known by an old one'''
+def canonicalPrimaryKey(modelClass, primaryKey):
+    if isAllocatedPrimaryKey(primaryKey):
+        return str(primaryKey)
+    entity = getByPrimaryKey(modelClass, primaryKey)
+    return entity.primaryKey if entity is not None else str(primaryKey)
+# [END lookup]
@@ -0,0 +1,81 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''The Reservation model and the minute arithmetic of reservations and resource windows.'''
+
+from google.appengine.ext import ndb
+
+from resourceShare.settings import RESERVATION_KIND
+
+# [START reservation]
+class Reservation(ndb.Model):
+    reservationKind = RESERVATION_KIND
+    resource_Name = ndb.StringProperty(indexed=True)
+    resource_PrimaryKey = ndb.StringProperty(indexed=True)
+    reservation_Owner = ndb.StringProperty(indexed=True)
+    reservation_StartTime = ndb.StringProperty(indexed=True)
+    reservation_EndTime = ndb.StringProperty(indexed=True)
+    reservation_Notes = ndb.StringProperty(indexed=True)
+    date = ndb.DateTimeProperty(auto_now_add=False)
+    primaryKey = ndb.StringProperty(indexed=True)
+    reservation_Duration = ndb.IntegerProperty(indexed=True)
+    reservation_StartMinute = ndb.IntegerProperty(indexed=True)
+    reservation_EndMinute = ndb.IntegerProperty(indexed=True)
+    reservation_Date = ndb.DateProperty(indexed=True)
+
+    def _pre_put_hook(self):
+        interval = reservationInterval(self, computed=True)
+        self.reservation_StartMinute = interval[0] if interval else None
+        self.reservation_EndMinute = interval[1] if interval else None
+# [END reservation]
+
+'''helper function to convert an "HH:MM" string into minutes since midnight'''
+def toMinutes(timeString):
+    hours, minutes = timeString.split(':')[:2]
+    return int(hours) * 60 + int(minutes)
+
+'''helper function to convert minutes since midnight back into an "HH:MM" string, wrapping past midnight'''
+def toTimeString(minutes):
+    return '%02d:%02d' % ((minutes // 60) % 24, minutes % 60)
+
+'''helper function to get the open window of a resource in minutes since midnight, or None when it has none'''
+def resourceWindow(resource):
+    if resource.resource_StartMinute is not None and resource.resource_EndMinute is not None:
+        return (resource.resource_StartMinute, resource.resource_EndMinute)
+    if not resource.resource_StartTime or not resource.resource_EndTime:
+        return None
+    return (toMinutes(resource.resource_StartTime), toMinutes(resource.resource_EndTime))
+
+'''helper function to get the interval of a reservation in minutes since midnight; one that runs past midnight ends after 1440'''
+def reservationInterval(reservation, computed=False):
+    if not computed and reservation.reservation_StartMinute is not None and reservation.reservation_EndMinute is not None:
+        return (reservation.reservation_StartMinute, reservation.reservation_EndMinute)
+    if not reservation.reservation_StartTime:
+        return None
+    start = toMinutes(reservation.reservation_StartTime)
+    if reservation.reservation_Duration is not None:
+        return (start, start + reservation.reservation_Duration)
+    if not reservation.reservation_EndTime:
+        return None
+    end = toMinutes(reservation.reservation_EndTime)
+    if end <= start:
+        end += 24 * 60
+    return (start, end)
+
+'''helper function to check a reservation against the open window of its resource'''
+def fitsResourceWindow(resource, start, end):
+    window = resourceWindow(resource)
+    if window is None:
+        return True
+    return window[0] <= start and end <= window[1]
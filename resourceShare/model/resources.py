@@ -0,0 +1,219 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''The Resource model, its name and tag tokens, name search and paged resource listings.'''
+
+import re
+import datetime
+
+from google.appengine.api import datastore_errors
+from google.appengine.datastore.datastore_query import Cursor
+from google.appengine.ext import ndb
+
+from resourceShare.settings import (ALL_RESOURCES_PAGE_SIZE, MAX_TAGS, MAX_TAG_LENGTH, NAME_SEARCH_FETCH_LIMIT,
+                                    NAME_SEARCH_MAX_TRIGRAMS, RESOURCE_SCHEMA_VERSION, TAG_PAGE_SIZE,
+                                    USER_RESOURCES_PAGE_SIZE, localNow)
+from resourceShare.model.lookup import allocatePrimaryKeys, entityKey, getMultiByPrimaryKey
+from resourceShare.model.reservations import toMinutes
+
+'''helper function to split a comma or semi-colon separated tag string into its non-empty tags'''
+def splitTags(tagString):
+    filteredTagList = []
+    for tag in tagString.replace(';', ',').split(','):
+        t = tag.strip()
+        if len(t) > 0:
+            filteredTagList.append(t)
+    return filteredTagList
+
+'''helper function to keep the first MAX_TAGS distinct tags of a form, each cut to MAX_TAG_LENGTH characters, as the
+JSON API requires'''
+def capTags(tagList):
+    capped = []
+    seen = set()
+    for tag in tagList:
+        tag = tag[:MAX_TAG_LENGTH].strip()
+        if normalizeTag(tag) and normalizeTag(tag) not in seen and len(capped) < MAX_TAGS:
+            seen.add(normalizeTag(tag))
+            capped.append(tag)
+    return capped
+
+'''helper function to normalize a tag for case-insensitive matching'''
+def normalizeTag(tag):
+    return ' '.join(tag.lower().split())
+
+'''helper function to normalize a list of tags, dropping empty and duplicate ones'''
+def normalizeTags(tagList):
+    returnList = []
+    for tag in tagList:
+        t = normalizeTag(tag)
+        if len(t) > 0 and t not in returnList:
+            returnList.append(t)
+    return returnList
+
+'''helper function to split a resource name into lowercased words'''
+def nameWords(name):
+    return [word for word in re.split(r'\W+', (name or '').lower(), flags=re.UNICODE) if word]
+
+'''helper function to build the search tokens of a resource name: the first letter of every word plus every bigram and
+trigram, so one letter searches match word starts and longer ones match anywhere in a word'''
+def nameTokens(name):
+    tokens = set()
+    for word in nameWords(name):
+        tokens.add(word[:1])
+        for i in range(len(word) - 1):
+            tokens.add(word[i:i + 2])
+            tokens.add(word[i:i + 3])
+    return sorted(tokens)
+
+'''helper function to pick the tokens a search string must match; one letter words match as word prefixes, two letter
+words as bigrams and longer ones by a spread of their trigrams'''
+def searchTokens(searchString):
+    tokens = []
+    for word in nameWords(searchString):
+        if len(word) < 3:
+            candidates = [word]
+        else:
+            trigrams = [word[i:i + 3] for i in range(len(word) - 2)]
+            step = max(1, len(trigrams) // NAME_SEARCH_MAX_TRIGRAMS)
+            candidates = trigrams[::step][:NAME_SEARCH_MAX_TRIGRAMS - 1] + [trigrams[-1]]
+        for token in candidates:
+            if token not in tokens:
+                tokens.append(token)
+    return tokens
+
+'''helper function to rank a resource name against a search string; lower is better, and names of one rank sort
+alphabetically, the order the prefix query reads them in'''
+def nameRank(name, searchString):
+    lowered = name.lower()
+    query = searchString.lower().strip()
+    if lowered == query:
+        return (0, lowered)
+    if lowered.startswith(query):
+        return (1, lowered)
+    for word in nameWords(name):
+        if word.startswith(query):
+            return (2, lowered)
+    return (3, lowered)
+
+'''helper function to search resource names, returning at most limit ranked resources. The exact and prefix matches,
+which rank first, are read in order from resource_NameLower; only when they do not fill the limit are the other
+matches read through the token index, at most NAME_SEARCH_FETCH_LIMIT of them, and ranked'''
+def searchResourcesByName(searchString, limit):
+    tokens = searchTokens(searchString)
+    if not tokens:
+        return Resource.query().order(Resource.resource_Name).fetch(limit)
+    lowered = searchString.lower().strip()
+    prefixed = Resource.query(Resource.resource_NameLower >= lowered,
+                              Resource.resource_NameLower < lowered + u'\ufffd').order(
+                                  Resource.resource_NameLower).fetch(limit)
+    if len(prefixed) == limit:
+        return prefixed
+    query = Resource.query()
+    for token in tokens:
+        query = query.filter(Resource.resource_NameTokens == token)
+    found = set(resource.key for resource in prefixed)
+    matches = [resource for resource in query.fetch(NAME_SEARCH_FETCH_LIMIT)
+               if resource.key not in found and resource.resource_Name and lowered in resource.resource_Name.lower()]
+    matches.sort(key=lambda resource: nameRank(resource.resource_Name, searchString))
+    return (prefixed + matches)[:limit]
+
+'''helper function to fetch one page of the resources a query finds using a keys-only query and a cursor; returns the
+resources and the cursor of the next page, or None on the last one. A cursor that does not parse starts over'''
+def fetchResourceKeysPage(query, pageSize, urlsafeCursor):
+    startCursor = None
+    if urlsafeCursor:
+        try:
+            startCursor = Cursor(urlsafe=urlsafeCursor)
+        except datastore_errors.BadValueError:
+            startCursor = None
+    keys, nextCursor, more = query.fetch_page(pageSize, start_cursor=startCursor, keys_only=True)
+    resources = [resource for resource in ndb.get_multi(keys) if resource is not None]
+    if more and nextCursor:
+        return resources, nextCursor.urlsafe()
+    return resources, None
+
+'''helper function to fetch one page of all resources, newest first'''
+def fetchResourcePage(urlsafeCursor):
+    return fetchResourceKeysPage(Resource.query().order(-Resource.date), ALL_RESOURCES_PAGE_SIZE, urlsafeCursor)
+
+'''helper function to fetch one page of the resources of an owner, newest first'''
+def fetchUserResourcePage(email, urlsafeCursor):
+    return fetchResourceKeysPage(Resource.query(Resource.resource_Owner == email).order(-Resource.date),
+                                 USER_RESOURCES_PAGE_SIZE, urlsafeCursor)
+
+'''helper function to fetch one page of the resources of a tag in primaryKey order'''
+def fetchTagPage(normalizedTag, urlsafeCursor):
+    return fetchResourceKeysPage(Resource.query(Resource.resource_tagNormalized == normalizedTag).order(
+        Resource.primaryKey), TAG_PAGE_SIZE, urlsafeCursor)
+# [START resources]
+class Resource(ndb.Model):
+    resource_Name = ndb.StringProperty(indexed=True)
+    resource_Owner = ndb.StringProperty(indexed=True)
+    resource_StartTime = ndb.StringProperty(indexed=False)
+    resource_EndTime = ndb.StringProperty(indexed=False)
+    resource_tag = ndb.StringProperty(repeated=True)
+    date = ndb.DateTimeProperty(auto_now_add=True)
+    primaryKey = ndb.StringProperty(indexed=True)
+    resource_Duration = ndb.IntegerProperty(indexed=True)
+    totalReservations = ndb.IntegerProperty(indexed=False)
+    justCreated = ndb.IntegerProperty(indexed=False)
+    resource_tagNormalized = ndb.ComputedProperty(lambda self: normalizeTags(self.resource_tag), repeated=True)
+    resource_NameTokens = ndb.ComputedProperty(lambda self: nameTokens(self.resource_Name), repeated=True)
+    resource_NameLower = ndb.ComputedProperty(lambda self: (self.resource_Name or u'').lower())
+    schemaVersion = ndb.IntegerProperty(indexed=False)
+    resource_StartMinute = ndb.IntegerProperty(indexed=True)
+    resource_EndMinute = ndb.IntegerProperty(indexed=True)
+
+    def _pre_put_hook(self):
+        self.resource_StartMinute = toMinutes(self.resource_StartTime) if self.resource_StartTime else None
+        self.resource_EndMinute = toMinutes(self.resource_EndTime) if self.resource_EndTime else None
+
+'''helper function to start an unsaved resource of an owner, under a newly allocated primaryKey unless one is given'''
+def newResource(owner, primaryKey=None):
+    primaryKey = primaryKey or allocatePrimaryKeys(Resource, 1)[0]
+    resource = Resource(key=entityKey(Resource, primaryKey))
+    resource.primaryKey = primaryKey
+    resource.resource_Owner = owner
+    resource.resource_tag = []
+    resource.totalReservations = 0
+    resource.justCreated = 1
+    resource.date = datetime.datetime.combine(localNow().date(), datetime.time())
+    resource.schemaVersion = RESOURCE_SCHEMA_VERSION
+    return resource
+
+'''helper function to get the current names of resources by primaryKey, loading them all with one get_multi; names are
+never copied onto reservations, rules or the views listing them, so every page reads them through here'''
+def resourceNames(primaryKeys):
+    primaryKeys = list(set(primaryKey for primaryKey in primaryKeys if primaryKey))
+    names = {}
+    for primaryKey, resource in zip(primaryKeys, getMultiByPrimaryKey(Resource, primaryKeys)):
+        if resource is not None:
+            names[primaryKey] = resource.resource_Name
+    return names
+
+'''helper function to show the current resource name on each reservation'''
+def attachResourceNames(reservations):
+    names = resourceNames([reservation.resource_PrimaryKey for reservation in reservations])
+    for reservation in reservations:
+        if reservation.resource_PrimaryKey in names:
+            reservation.resource_Name = names[reservation.resource_PrimaryKey]
+    return reservations
+
+'''helper function to show the current resource name on each upcoming reservations entry'''
+def attachEntryResourceNames(entries):
+    names = resourceNames([entry['resource_PrimaryKey'] for entry in entries])
+    for entry in entries:
+        entry['resource_Name'] = names.get(entry['resource_PrimaryKey'])
+    return entries
+# [END resources]
@@ -0,0 +1,211 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''Recurring reservation rules, the occurrences they expand to and the per resource sets of rules bookings are checked
+against.'''
+
+import bisect
+import datetime
+
+from google.appengine.ext import ndb
+
+from resourceShare.settings import (RECURRENCE_FREQUENCIES, RECURRENCE_MAX_DAYS, RECURRENCE_MAX_INTERVAL, RULE_KIND,
+                                    localNow)
+from resourceShare.model.lookup import getByPrimaryKey
+from resourceShare.model.reservations import Reservation, reservationInterval
+
+# [START recurrence]
+'''a reservation repeating DAILY or WEEKLY every `interval` days or weeks, on `weekdays` (0 is Monday) of the weekly
+ones, from startDate until untilDate; occurrences are expanded when asked for and never stored, and skippedDates holds
+the occurrences cancelled one by one. Rules take their primaryKeys from the Reservation pool, so a primaryKey names
+one or the other, but pages still say which kind they link to, as rules booked before may share one'''
+class RecurringReservation(ndb.Model):
+    reservationKind = RULE_KIND
+    resource_Name = ndb.StringProperty(indexed=True)
+    resource_PrimaryKey = ndb.StringProperty(indexed=True)
+    reservation_Owner = ndb.StringProperty(indexed=True)
+    reservation_StartTime = ndb.StringProperty(indexed=True)
+    reservation_EndTime = ndb.StringProperty(indexed=True)
+    reservation_Duration = ndb.IntegerProperty(indexed=True)
+    reservation_Notes = ndb.StringProperty(indexed=True)
+    primaryKey = ndb.StringProperty(indexed=True)
+    frequency = ndb.StringProperty(indexed=False, choices=RECURRENCE_FREQUENCIES)
+    interval = ndb.IntegerProperty(indexed=False, default=1)
+    weekdays = ndb.IntegerProperty(repeated=True, indexed=False)
+    startDate = ndb.DateProperty(indexed=True)
+    untilDate = ndb.DateProperty(indexed=True)
+    skippedDates = ndb.DateProperty(repeated=True, indexed=False)
+    date = ndb.DateTimeProperty(auto_now_add=True)
+    # the occurrences the rule adds to the reservation count of its resource; None for a rule stored before rules were
+    # counted by occurrence, which counts once until it is deleted
+    countedOccurrences = ndb.IntegerProperty(indexed=False)
+
+'''helper function to check a rule before it is booked, filling in the weekday of startDate for a weekly rule without
+weekdays; raises ValueError with the reason it cannot be booked'''
+def checkRecurrence(rule):
+    if rule.frequency not in RECURRENCE_FREQUENCIES:
+        raise ValueError('frequency must be one of ' + ', '.join(RECURRENCE_FREQUENCIES) + '.')
+    if not 1 <= (rule.interval or 1) <= RECURRENCE_MAX_INTERVAL:
+        raise ValueError('interval must be between 1 and %d.' % RECURRENCE_MAX_INTERVAL)
+    if rule.startDate is None or rule.untilDate is None:
+        raise ValueError('startDate and untilDate are required.')
+    if rule.startDate < localNow().date():
+        raise ValueError('startDate cannot be in the past.')
+    if not 0 <= (rule.untilDate - rule.startDate).days <= RECURRENCE_MAX_DAYS:
+        raise ValueError('untilDate must be on or after startDate and at most %d days later.' % RECURRENCE_MAX_DAYS)
+    if rule.frequency == 'WEEKLY':
+        if not rule.weekdays:
+            rule.weekdays = [rule.startDate.weekday()]
+        if any(weekday not in range(7) for weekday in rule.weekdays):
+            raise ValueError('weekdays must be numbers from 0 (Monday) to 6 (Sunday).')
+        rule.weekdays = sorted(set(rule.weekdays))
+    if reservationInterval(rule, computed=True) is None:
+        raise ValueError('reservation_StartTime and reservation_Duration are required.')
+    return rule
+
+'''helper function to describe a rule compactly, with days as ordinals and times as minutes since midnight'''
+def recurrenceSpec(rule):
+    start, end = reservationInterval(rule, computed=True)
+    return {
+        'primaryKey': rule.primaryKey,
+        'frequency': rule.frequency,
+        'interval': rule.interval or 1,
+        'weekdays': sorted(set(rule.weekdays)),
+        'first': rule.startDate.toordinal(),
+        'last': rule.untilDate.toordinal(),
+        'start': start,
+        'end': end,
+        'skipped': sorted(day.toordinal() for day in rule.skippedDates),
+    }
+
+'''helper function to get the ordinal of the Monday starting the week of a day ordinal; ordinal 1 is a Monday'''
+def weekOrdinal(ordinal):
+    return ordinal - (ordinal - 1) % 7
+
+'''helper function to tell whether a rule has an occurrence on the day with the given ordinal, in constant time'''
+def occursOn(spec, ordinal):
+    if ordinal < spec['first'] or ordinal > spec['last']:
+        return False
+    if spec['frequency'] == 'DAILY':
+        if (ordinal - spec['first']) % spec['interval']:
+            return False
+    elif ((ordinal - 1) % 7 not in spec['weekdays'] or
+          (weekOrdinal(ordinal) - weekOrdinal(spec['first'])) // 7 % spec['interval']):
+        return False
+    index = bisect.bisect_left(spec['skipped'], ordinal)
+    return index == len(spec['skipped']) or spec['skipped'][index] != ordinal
+
+'''generator of the day ordinals on which a rule occurs between fromOrdinal and toOrdinal, both included; it jumps
+straight to the first occurrence in the window and steps from one occurrence to the next'''
+def occurrenceOrdinals(spec, fromOrdinal, toOrdinal):
+    first = max(spec['first'], fromOrdinal)
+    last = min(spec['last'], toOrdinal)
+    if spec['frequency'] == 'DAILY':
+        candidates = xrange(first + (spec['first'] - first) % spec['interval'], last + 1, spec['interval'])
+    else:
+        period = 7 * spec['interval']
+        monday = weekOrdinal(first)
+        monday += (weekOrdinal(spec['first']) - monday) % period
+        candidates = (week + weekday for week in xrange(monday, last + 1, period) for weekday in spec['weekdays'])
+    for ordinal in candidates:
+        if first <= ordinal <= last and occursOn(spec, ordinal):
+            yield ordinal
+
+'''helper function to count the occurrences of a rule, less the ones skipped'''
+def occurrenceCount(spec):
+    return sum(1 for ordinal in occurrenceOrdinals(spec, spec['first'], spec['last']))
+
+'''helper function to get one occurrence of a rule as an unsaved reservation carrying the rule's primaryKey'''
+def occurrenceOf(rule, day):
+    occurrence = Reservation(resource_PrimaryKey=rule.resource_PrimaryKey,
+                             reservation_Owner=rule.reservation_Owner,
+                             reservation_StartTime=rule.reservation_StartTime,
+                             reservation_EndTime=rule.reservation_EndTime,
+                             reservation_Duration=rule.reservation_Duration,
+                             reservation_Notes=rule.reservation_Notes,
+                             primaryKey=rule.primaryKey,
+                             reservation_Date=day)
+    occurrence.reservationKind = RULE_KIND
+    return occurrence
+
+'''helper function to expand rules into their occurrences between two days, both included, soonest first'''
+def expandRecurrences(rules, fromDay, toDay):
+    occurrences = []
+    for rule in rules:
+        for ordinal in occurrenceOrdinals(recurrenceSpec(rule), fromDay.toordinal(), toDay.toordinal()):
+            occurrences.append(occurrenceOf(rule, datetime.date.fromordinal(ordinal)))
+    occurrences.sort(key=lambda occurrence: (occurrence.reservation_Date, occurrence.reservation_StartTime))
+    return occurrences
+
+'''the rules of one resource in compact form, keyed by its primaryKey; every booking on the resource reads it in its
+transaction, so a rule and a single reservation can never be booked into the same slot. Rules whose last day has
+passed are dropped on every write, and nextExpiry lets the prune cron find the ones holding such rules'''
+class ResourceRecurrences(ndb.Model):
+    rules = ndb.JsonProperty(indexed=False, compressed=True)
+    nextExpiry = ndb.DateProperty(indexed=True)
+
+    def overlaps(self, day, start, end):
+        ordinal = day.toordinal()
+        return any(spec['start'] < end and start < spec['end'] and occursOn(spec, ordinal) for spec in self.rules)
+
+    def occurrencesOn(self, day):
+        ordinal = day.toordinal()
+        return [spec for spec in self.rules if occursOn(spec, ordinal)]
+
+    def conflicts(self, newSpec):
+        ordinals = set()
+        for spec in self.rules:
+            if spec['start'] < newSpec['end'] and newSpec['start'] < spec['end']:
+                ordinals.update(ordinal for ordinal in occurrenceOrdinals(newSpec, spec['first'], spec['last'])
+                                if occursOn(spec, ordinal))
+        return sorted(ordinals)
+
+    def replace(self, spec):
+        self.rules = [rule for rule in self.rules if rule['primaryKey'] != spec['primaryKey']] + [spec]
+
+    def remove(self, primaryKey):
+        self.rules = [rule for rule in self.rules if rule['primaryKey'] != primaryKey]
+
+    def dropEnded(self):
+        today = localNow().date().toordinal()
+        self.rules = [rule for rule in self.rules or [] if rule['last'] >= today]
+
+    def _pre_put_hook(self):
+        self.dropEnded()
+        self.nextExpiry = datetime.date.fromordinal(min(rule['last'] for rule in self.rules) + 1) if self.rules else None
+
+'''helper function to get the key of the rules of a resource'''
+def recurrencesKey(primaryKey):
+    return ndb.Key(ResourceRecurrences, primaryKey)
+
+'''helper function to load the rules of a resource, or an empty set of them'''
+def getRecurrences(primaryKey):
+    return recurrencesKey(primaryKey).get() or ResourceRecurrences(key=recurrencesKey(primaryKey), rules=[])
+
+'''helper function to drop the rules of a resource that have ended inside a transaction'''
+@ndb.transactional
+def pruneRecurrences(key):
+    recurrences = key.get()
+    if recurrences is None:
+        return
+    recurrences.dropEnded()
+    if recurrences.rules:
+        recurrences.put()
+    else:
+        key.delete()
+
+'''helper function to load a single reservation, or a rule when reservationKind is RULE_KIND, by its primaryKey'''
+def getReservationOfKind(reservationKind, primaryKey):
+    return getByPrimaryKey(RecurringReservation if reservationKind == RULE_KIND else Reservation, primaryKey)
+# [END recurrence]
@@ -0,0 +1,58 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''Per resource and day schedules, the entity group every booking of a day is checked against.'''
+
+import bisect
+
+from google.appengine.ext import ndb
+
+# [START schedule]
+'''the reservations of one resource on one day as sorted, non-overlapping intervals, keyed by "<primaryKey>:<date>"'''
+class ResourceSchedule(ndb.Model):
+    resource_PrimaryKey = ndb.StringProperty(indexed=True)
+    day = ndb.DateProperty(indexed=True)
+    starts = ndb.IntegerProperty(repeated=True, indexed=False)
+    ends = ndb.IntegerProperty(repeated=True, indexed=False)
+    reservationKeys = ndb.StringProperty(repeated=True, indexed=False)
+
+    def overlaps(self, start, end):
+        index = bisect.bisect_left(self.starts, end)
+        return index > 0 and self.ends[index - 1] > start
+
+    def insert(self, reservationKey, start, end):
+        index = bisect.bisect_left(self.starts, start)
+        self.starts.insert(index, start)
+        self.ends.insert(index, end)
+        self.reservationKeys.insert(index, reservationKey)
+
+    def remove(self, reservationKey):
+        if reservationKey in self.reservationKeys:
+            index = self.reservationKeys.index(reservationKey)
+            del self.starts[index]
+            del self.ends[index]
+            del self.reservationKeys[index]
+
+'''helper function to get the key of the schedule of a resource on a day'''
+def scheduleKey(primaryKey, day):
+    return ndb.Key(ResourceSchedule, '%s:%s' % (primaryKey, day.isoformat()))
+
+'''helper function to load the schedule of a resource on a day, or an empty one'''
+def getSchedule(primaryKey, day):
+    key = scheduleKey(primaryKey, day)
+    schedule = key.get()
+    if schedule is None:
+        schedule = ResourceSchedule(key=key, resource_PrimaryKey=primaryKey, day=day)
+    return schedule
+# [END schedule]
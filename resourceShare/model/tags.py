@@ -0,0 +1,117 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''Tag summaries behind the tag cloud and the transactions that save a resource together with them.'''
+
+from google.appengine.ext import ndb
+
+from resourceShare.settings import TAG_RECENT_LIMIT, TRANSACTION_MAX_GROUPS, localNow
+from resourceShare.rendering import bumpFragmentVersion
+from resourceShare.model.resources import normalizeTag, normalizeTags
+from resourceShare.availability import queueAvailabilityCheck
+
+# [START tag_summary]
+'''aggregate for one normalized tag, keyed by the tag itself'''
+class TagSummary(ndb.Model):
+    tagName = ndb.StringProperty(indexed=False)
+    count = ndb.IntegerProperty(indexed=True)
+    recentResources = ndb.StringProperty(repeated=True, indexed=False)
+
+'''helper function to add resources, newest last, to the summary of a tag inside a transaction'''
+@ndb.transactional
+def addToTagSummary(normalizedTag, tagName, primaryKeys):
+    summary = TagSummary.get_by_id(normalizedTag)
+    if summary is None:
+        summary = TagSummary(id=normalizedTag, count=0, recentResources=[])
+    summary.tagName = tagName
+    summary.count += len(primaryKeys)
+    newest = list(reversed(primaryKeys))
+    recent = [key for key in summary.recentResources if key not in newest]
+    summary.recentResources = (newest + recent)[:TAG_RECENT_LIMIT]
+    summary.put()
+
+'''helper function to remove a resource from the summary of a tag inside a transaction'''
+@ndb.transactional
+def removeFromTagSummary(normalizedTag, primaryKey):
+    summary = TagSummary.get_by_id(normalizedTag)
+    if summary is None:
+        return
+    summary.count = max(summary.count - 1, 0)
+    summary.recentResources = [key for key in summary.recentResources if key != primaryKey]
+    if summary.count == 0:
+        summary.key.delete()
+    else:
+        summary.put()
+
+'''helper function to list the tags a resource gains, as (normalized tag, tag name) pairs, and the normalized tags it
+loses when its tags change from oldTags to newTags'''
+def tagChanges(oldTags, newTags):
+    oldNormalized = normalizeTags(oldTags)
+    newNormalized = normalizeTags(newTags)
+    added = []
+    for tag in newTags:
+        t = normalizeTag(tag)
+        if t in newNormalized and t not in oldNormalized:
+            added.append((t, tag.strip()))
+            oldNormalized.append(t)
+    removed = [old for old in oldNormalized if old not in newNormalized]
+    return added, removed
+
+'''helper function to apply tag changes of a resource to the tag summaries, joining the caller's transaction; the tag
+cloud is invalidated once it commits'''
+def applyTagChanges(primaryKey, added, removed):
+    for t, tagName in added:
+        addToTagSummary(t, tagName, [primaryKey])
+    for t in removed:
+        removeFromTagSummary(t, primaryKey)
+    if added or removed:
+        ndb.get_context().call_on_commit(lambda: bumpFragmentVersion('tagCloud.html'))
+
+'''helper function to bring the tag summaries in line with a resource whose tags changed from oldTags to newTags'''
+def updateTagSummaries(primaryKey, oldTags, newTags):
+    added, removed = tagChanges(oldTags, newTags)
+    applyTagChanges(primaryKey, added, removed)
+
+'''helper function to write a resource and the summaries of its tag changes in one cross-group transaction, which also
+queues the check of its window in the availability engine'''
+@ndb.transactional(xg=True)
+def writeResourceAndTags(resource, added, removed):
+    resource.put()
+    applyTagChanges(resource.primaryKey, added, removed)
+    queueAvailabilityCheck(resource.primaryKey, [localNow().date()])
+
+'''helper function to save a resource whose tags were oldTags together with its tag summaries, so a failure cannot
+leave the counts out of step with the resources; a resource holding more tags than MAX_TAGS from before the limit
+drops the summaries that do not fit in the transaction right after it'''
+def saveResource(resource, oldTags):
+    added, removed = tagChanges(oldTags, resource.resource_tag)
+    fitting = max(TRANSACTION_MAX_GROUPS - 1 - len(added), 0)
+    writeResourceAndTags(resource, added, removed[:fitting])
+    applyTagChanges(resource.primaryKey, [], removed[fitting:])
+
+'''helper function to add many new resources to the tag summaries with one transaction per tag'''
+def addResourcesToTagSummaries(resources):
+    byTag = {}
+    for resource in resources:
+        for tag in resource.resource_tag:
+            t = normalizeTag(tag)
+            if t:
+                tagName, primaryKeys = byTag.setdefault(t, (tag.strip(), []))
+                if resource.primaryKey not in primaryKeys:
+                    primaryKeys.append(resource.primaryKey)
+    for t, (tagName, primaryKeys) in byTag.items():
+        addToTagSummary(t, tagName, primaryKeys)
+    if byTag:
+        bumpFragmentVersion('tagCloud.html')
+# [END tag_summary]
@@ -0,0 +1,172 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''Per-request RPC profiling and the datastore RPC budgets PerformanceMiddleware checks every route against.'''
+
+import time
+import json
+import logging
+import threading
+
+from google.appengine.api import apiproxy_stub_map
+from google.appengine.api import users
+
+import webapp2
+import yaml
+
+from resourceShare.settings import RPC_BUDGETS_FILE
+from resourceShare.model.lookup import countDatastoreGet
+
+# [START performance]
+'''performance figures of the request being served: RPC counts and latency per service, datastore RPC counts per call
+and the entities datastore gets and queries returned, filled in by the apiproxy hooks, and template render time, filled in by renderTemplate and
+renderFragment'''
+class RequestProfile(object):
+    def __init__(self, route, method, path):
+        self.route = route
+        self.method = method
+        self.path = path
+        self.started = time.time()
+        self.rpcCounts = {}
+        self.rpcSeconds = {}
+        self.datastoreCalls = {}
+        self.slowestRpc = (0.0, None)
+        self.pending = {}
+        self.entitiesRead = 0
+        self.templateSeconds = 0.0
+
+    def rpcStarted(self, service, call, request):
+        self.pending[id(request)] = time.time()
+
+    def rpcFinished(self, service, call, request, response):
+        started = self.pending.pop(id(request), None)
+        seconds = time.time() - started if started is not None else 0.0
+        self.rpcCounts[service] = self.rpcCounts.get(service, 0) + 1
+        self.rpcSeconds[service] = self.rpcSeconds.get(service, 0.0) + seconds
+        if seconds > self.slowestRpc[0]:
+            self.slowestRpc = (seconds, '%s.%s' % (service, call))
+        if service == 'datastore_v3':
+            self.datastoreCalls[call] = self.datastoreCalls.get(call, 0) + 1
+        if service == 'datastore_v3' and call == 'Get':
+            self.entitiesRead += sum(1 for found in response.entity_list() if found.has_entity())
+        elif service == 'datastore_v3' and call in ('RunQuery', 'Next'):
+            self.entitiesRead += response.result_size()
+
+    def summary(self, status, budget):
+        datastoreRpcs = self.rpcCounts.get('datastore_v3', 0)
+        return {
+            'route': self.route,
+            'method': self.method,
+            'path': self.path,
+            'status': status,
+            'wallMs': round((time.time() - self.started) * 1000, 1),
+            'datastoreRpcs': datastoreRpcs,
+            'datastoreCalls': dict(self.datastoreCalls),
+            'datastoreMs': round(self.rpcSeconds.get('datastore_v3', 0.0) * 1000, 1),
+            'entitiesRead': self.entitiesRead,
+            'memcacheRpcs': self.rpcCounts.get('memcache', 0),
+            'mailCalls': self.rpcCounts.get('mail', 0),
+            'taskqueueCalls': self.rpcCounts.get('taskqueue', 0),
+            'slowestRpc': self.slowestRpc[1],
+            'slowestRpcMs': round(self.slowestRpc[0] * 1000, 1),
+            'templateMs': round(self.templateSeconds * 1000, 1),
+            'rpcBudget': budget,
+            'overBudget': budget is not None and datastoreRpcs > budget,
+        }
+
+requestProfiles = threading.local()
+
+'''helper function to get the profile of the request this thread is serving, or None outside a request'''
+def currentProfile():
+    return getattr(requestProfiles, 'profile', None)
+
+'''apiproxy pre-call hook noting when an RPC of the current request starts'''
+def profileRpcStarted(service, call, request, response):
+    profile = currentProfile()
+    if profile is not None:
+        profile.rpcStarted(service, call, request)
+
+'''apiproxy post-call hook counting a finished RPC of the current request, failed ones included'''
+def profileRpcFinished(service, call, request, response, rpc=None, error=None):
+    profile = currentProfile()
+    if profile is not None:
+        profile.rpcFinished(service, call, request, response)
+
+'''helper function to hook the profiler and the lookup counters into the API proxy; call it again after a test bed
+replaces the proxy'''
+def installRpcHooks():
+    apiproxy_stub_map.apiproxy.GetPreCallHooks().Append('requestProfile', profileRpcStarted)
+    apiproxy_stub_map.apiproxy.GetPostCallHooks().Append('requestProfile', profileRpcFinished)
+    apiproxy_stub_map.apiproxy.GetPreCallHooks().Append('lookupStats', countDatastoreGet)
+
+'''helper function to read the datastore RPC budget of each route from a YAML file mapping handler class names to
+numbers of RPCs'''
+def loadRpcBudgets(path=RPC_BUDGETS_FILE):
+    with open(path) as budgetFile:
+        budgets = yaml.safe_load(budgetFile) or {}
+    return dict((str(route), int(budget)) for route, budget in budgets.items())
+
+RPC_BUDGETS = loadRpcBudgets()
+
+'''raised in strict mode when a request makes more datastore RPCs than the budget of its route'''
+class RpcBudgetExceeded(AssertionError):
+    pass
+
+'''WSGI middleware profiling every request: it logs one structured line per request, checks the datastore RPC count
+against the budget of the route and, for admins or on the development server, answers an X-Perf-Debug request header
+with an X-Perf response header. In strict mode a request over budget raises RpcBudgetExceeded, which fails a test'''
+class PerformanceMiddleware(object):
+    def __init__(self, application, budgets, strict=False):
+        self.application = application
+        self.budgets = budgets
+        self.strict = strict
+        self.lastSummary = None
+
+    def routeName(self, environ):
+        try:
+            route = self.application.router.match(webapp2.Request(environ))[0]
+        except Exception:
+            return 'unmatched'
+        return getattr(route.handler, '__name__', str(route.handler))
+
+    def __call__(self, environ, start_response):
+        route = self.routeName(environ)
+        budget = self.budgets.get(route)
+        profile = RequestProfile(route, environ.get('REQUEST_METHOD'), environ.get('PATH_INFO'))
+        requestProfiles.profile = profile
+        state = {}
+
+        def profiledStartResponse(status, headers, excInfo=None):
+            state['summary'] = profile.summary(int(status.split(' ', 1)[0]), budget)
+            if environ.get('HTTP_X_PERF_DEBUG') and (
+                    environ.get('SERVER_SOFTWARE', '').startswith('Development') or users.is_current_user_admin()):
+                headers = list(headers) + [('X-Perf', json.dumps(state['summary'], sort_keys=True))]
+            return start_response(status, headers, excInfo) if excInfo else start_response(status, headers)
+
+        try:
+            body = self.application(environ, profiledStartResponse)
+        finally:
+            requestProfiles.profile = None
+        summary = state.get('summary') or profile.summary(None, budget)
+        self.lastSummary = summary
+        logging.info('perf %s', json.dumps(summary, sort_keys=True))
+        if summary['overBudget']:
+            logging.warning('%s made %d datastore RPCs, over its budget of %d', route, summary['datastoreRpcs'], budget)
+            if self.strict:
+                raise RpcBudgetExceeded('%s made %d datastore RPCs, over its budget of %d' %
+                                        (route, summary['datastoreRpcs'], budget))
+        return body
+
+installRpcHooks()
+# [END performance]
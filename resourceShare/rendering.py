@@ -0,0 +1,115 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''Jinja2 templates, precompiled when compile_templates.py has run, and the versioned memcache cache of rendered
+fragments.'''
+
+import time
+import os
+import hashlib
+import json
+
+from google.appengine.api import memcache
+
+import jinja2
+
+from resourceShare.settings import APP_DIR, FRAGMENT_CACHE_PREFIX, FRAGMENT_VERSION_PREFIX
+from resourceShare.profiling import currentProfile
+
+'''helper function to get the modification time of a file, or None when it cannot be read'''
+def modifiedTime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+'''template loader serving a precompiled template only when the manifest compile_templates.py wrote lists it under the
+running jinja2 version and its module is no older than its source; any other template falls through to the next
+loader. Freshness is a stat of each file, done once per template and instance'''
+class FreshModuleLoader(jinja2.ModuleLoader):
+    def __init__(self, path, sourceDir):
+        jinja2.ModuleLoader.__init__(self, path)
+        self.path = path
+        self.sourceDir = sourceDir
+        try:
+            with open(os.path.join(path, 'manifest.json')) as manifestFile:
+                manifest = json.load(manifestFile)
+        except (IOError, ValueError):
+            manifest = {}
+        self.compiled = set(manifest.get('templates', [])) if manifest.get('jinja2') == jinja2.__version__ else set()
+        self.fresh = {}
+
+    def load(self, environment, name, globals=None):
+        if name not in self.fresh:
+            compiledTime = modifiedTime(os.path.join(self.path, jinja2.ModuleLoader.get_module_filename(name)))
+            sourceTime = modifiedTime(os.path.join(self.sourceDir, name))
+            self.fresh[name] = (name in self.compiled and compiledTime is not None and sourceTime is not None and
+                                compiledTime >= sourceTime)
+        if not self.fresh[name]:
+            raise jinja2.TemplateNotFound(name)
+        return jinja2.ModuleLoader.load(self, environment, name, globals)
+
+# templates precompiled at deploy time by compile_templates.py are loaded first in production, so cold instances skip
+# parsing; the development server always reads the sources, so template edits show up there
+COMPILED_TEMPLATES_DIR = os.path.join(APP_DIR, 'compiled_templates')
+TEMPLATE_LOADERS = [jinja2.FileSystemLoader(APP_DIR)]
+if os.path.isdir(COMPILED_TEMPLATES_DIR) and not os.environ.get('SERVER_SOFTWARE', '').startswith('Development'):
+    TEMPLATE_LOADERS.insert(0, FreshModuleLoader(COMPILED_TEMPLATES_DIR, APP_DIR))
+
+JINJA_ENVIRONMENT = jinja2.Environment(
+    loader=jinja2.ChoiceLoader(TEMPLATE_LOADERS),
+    extensions=['jinja2.ext.autoescape'],
+    autoescape=True)
+
+'''helper function to render a template into the response'''
+def renderTemplate(response, templateName, templateValues):
+    started = time.time()
+    response.write(JINJA_ENVIRONMENT.get_template(templateName).render(templateValues))
+    profile = currentProfile()
+    if profile is not None:
+        profile.templateSeconds += time.time() - started
+
+'''helper function to read the version of a cached fragment, starting a new one when memcache has none; versions are
+timestamps, so one started after an eviction never names a copy cached before it'''
+def getFragmentVersion(name):
+    version = memcache.get(FRAGMENT_VERSION_PREFIX + name)
+    if version is None:
+        memcache.add(FRAGMENT_VERSION_PREFIX + name, repr(time.time()))
+        version = memcache.get(FRAGMENT_VERSION_PREFIX + name) or repr(time.time())
+    return version
+
+'''helper function to invalidate every cached copy of a fragment'''
+def bumpFragmentVersion(name):
+    memcache.set(FRAGMENT_VERSION_PREFIX + name, repr(time.time()))
+
+# fragments are cached unless this is switched off, as benchmarks measuring the queries behind them do
+fragmentCache = True
+
+'''helper function to render a viewer-independent fragment template once per version and variant, calling
+valuesFunction only on a cache miss'''
+def renderFragment(templateName, variant, valuesFunction):
+    if not fragmentCache:
+        return jinja2.Markup(JINJA_ENVIRONMENT.get_template(templateName).render(valuesFunction()))
+    version = getFragmentVersion(templateName)
+    cacheKey = '%s%s:%s:%s' % (FRAGMENT_CACHE_PREFIX, templateName, version, hashlib.md5(variant.encode('utf-8')).hexdigest())
+    html = memcache.get(cacheKey)
+    if html is None:
+        values = valuesFunction()
+        started = time.time()
+        html = JINJA_ENVIRONMENT.get_template(templateName).render(values)
+        profile = currentProfile()
+        if profile is not None:
+            profile.templateSeconds += time.time() - started
+        memcache.set(cacheKey, html)
+    return jinja2.Markup(html)
@@ -0,0 +1,125 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''Settings shared by every part of the app: page and batch sizes, cache key prefixes, API field lists and the site
+timezone.'''
+
+import os
+import datetime
+
+import pytz
+
+# the directory of app.yaml, which holds the templates and the config files next to the resourceShare package
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_GUESTBOOK_NAME = 'default_guestbook'
+DEFAULT_RESOURCE_NAME = 'default_resource'
+ALL_RESOURCES_PAGE_SIZE = 20
+USER_RESOURCES_PAGE_SIZE = 20
+TAG_PAGE_SIZE = 20
+TAG_RECENT_LIMIT = 10
+TAG_CLOUD_SIZE = 50
+MIGRATION_BATCH_SIZE = 100
+# primaryKeys used to be random numbers up to LEGACY_KEY_MAX; allocated ones start above it
+LEGACY_KEY_MAX = 1000000
+KEY_ALLOCATION_BATCH = 100
+NAME_SEARCH_LIMIT = 50
+NAME_SUGGEST_LIMIT = 10
+NAME_SEARCH_FETCH_LIMIT = 200
+NAME_SEARCH_MAX_TRIGRAMS = 4
+RESOURCE_SCHEMA_VERSION = 4
+RESERVATION_COUNTER_SHARDS = 10
+RESERVATION_COUNT_PREFIX = 'reservation-count:'
+RESERVATION_COUNT_CACHE_SECONDS = 60
+# a cross-group transaction may touch 25 entity groups: the reservations and their owners' upcoming views of the day,
+# at most RESERVATION_BATCH_SIZE together, plus the schedule, the recurring rules, a counter shard and the resource's
+# upcoming view of the day
+RESERVATION_BATCH_SIZE = 20
+RECURRENCE_FREQUENCIES = ('DAILY', 'WEEKLY')
+RECURRENCE_MAX_INTERVAL = 52
+# what a link to /viewReservation or /deleteReservation names with its kind parameter
+RESERVATION_KIND = 'reservation'
+RULE_KIND = 'rule'
+# rules are booked at most a year ahead, which keeps the schedules checked for one rule within a single get_multi
+RECURRENCE_MAX_DAYS = 366
+# the upcoming reservations lists cover today and the next UPCOMING_DAYS days
+UPCOMING_DAYS = 7
+# an upcoming reservations view of one day keeps at most this many entries, the soonest
+UPCOMING_MAX_ENTRIES = 200
+SITE_TIMEZONE = pytz.timezone('America/New_York')
+FEED_VERSION_PREFIX = 'feed-version:'
+# feeds cached before items left out the owners and notes are under the old prefix and never served
+FEED_CACHE_PREFIX = 'feed-2:'
+FEED_CACHE_MAX_BYTES = 900000
+# a feed lists the soonest FEED_MAX_ITEMS reservations and occurrences from today on, which keeps it well under
+# FEED_CACHE_MAX_BYTES
+FEED_MAX_ITEMS = 200
+MAIL_SENDER = 'ak5345@nyu.edu'
+MAIL_QUEUE = 'mail'
+MAIL_DIGEST_SECONDS = 60
+FRAGMENT_VERSION_PREFIX = 'fragment-version:'
+FRAGMENT_CACHE_PREFIX = 'fragment:'
+API_PAGE_SIZE = 20
+API_MAX_PAGE_SIZE = 100
+API_BATCH_LIMIT = 100
+# API requests that change state without a JSON body, like uploads and deletes, must carry this header
+API_CSRF_HEADER = 'X-Requested-With'
+# the datastore runs an IN filter as one subquery per value and allows at most 30 of them
+QUERY_IN_LIMIT = 30
+# fields served by the JSON API; the summary fields are indexed, so pages asking only for them use projection queries
+RESOURCE_API_FIELDS = ('primaryKey', 'resource_Name', 'resource_Owner', 'resource_StartTime', 'resource_EndTime',
+                       'resource_Duration', 'resource_tag', 'date', 'justCreated', 'reservationCount')
+RESOURCE_SUMMARY_FIELDS = ('primaryKey', 'resource_Name', 'resource_Owner', 'resource_Duration', 'date')
+RESOURCE_WRITABLE_FIELDS = ('resource_Name', 'resource_StartTime', 'resource_EndTime', 'resource_tag')
+# the availability engine reads the windows of all resources with a projection on these
+RESOURCE_WINDOW_FIELDS = ('primaryKey', 'resource_StartMinute', 'resource_EndMinute')
+RESERVATION_API_FIELDS = ('primaryKey', 'resource_PrimaryKey', 'resource_Name', 'reservation_Owner',
+                          'reservation_StartTime', 'reservation_EndTime', 'reservation_Duration', 'reservation_Notes',
+                          'reservation_Date')
+RESERVATION_SUMMARY_FIELDS = ('primaryKey', 'resource_PrimaryKey', 'reservation_Owner', 'reservation_StartTime',
+                              'reservation_EndTime', 'reservation_Duration')
+RESERVATION_WRITABLE_FIELDS = ('reservation_StartTime', 'reservation_Duration', 'reservation_Notes', 'reservation_Date')
+# the fields a recurring reservation shares with a single one
+RESERVATION_RULE_FIELDS = ('resource_PrimaryKey', 'reservation_Owner', 'reservation_StartTime', 'reservation_EndTime',
+                           'reservation_Duration', 'reservation_Notes')
+RECURRENCE_API_FIELDS = ('primaryKey', 'resource_PrimaryKey', 'resource_Name', 'reservation_Owner',
+                         'reservation_StartTime', 'reservation_EndTime', 'reservation_Duration', 'reservation_Notes',
+                         'frequency', 'interval', 'weekdays', 'startDate', 'untilDate', 'skippedDates')
+RECURRENCE_WRITABLE_FIELDS = ('reservation_StartTime', 'reservation_Duration', 'reservation_Notes', 'frequency',
+                              'interval', 'weekdays', 'startDate', 'untilDate')
+# a resource is saved with the summaries of the tags it gains and loses in one cross-group transaction, which may
+# touch TRANSACTION_MAX_GROUPS entity groups: the resource, MAX_TAGS new tags and MAX_TAGS old ones
+TRANSACTION_MAX_GROUPS = 25
+MAX_TAGS = 12
+MAX_TAG_LENGTH = 100
+# bulk files may carry any API field; read-only ones, as written by an export, are dropped on import
+BULK_FIELDS = {
+    'resources': tuple(field for field in RESOURCE_API_FIELDS if field != 'reservationCount'),
+    'reservations': RESERVATION_API_FIELDS,
+}
+IMPORT_CHUNK_BYTES = 512 * 1024
+IMPORT_BATCH_SIZE = 200
+IMPORT_TASK_SECONDS = 480
+IMPORT_MAX_ERRORS = 100
+# a page of an export is written as one ExportChunk, which has to stay under the entity size limit
+EXPORT_PAGE_SIZE = 200
+EXPORT_TASK_SECONDS = 480
+EXPORT_KEEP_HOURS = 24
+# the most datastore RPCs a request to each route may make, by handler class name
+RPC_BUDGETS_FILE = os.path.join(APP_DIR, 'rpc_budgets.yaml')
+WARMUP_TEMPLATES = ['index.html', 'allResourcesTable.html', 'tagCloud.html', 'tag.html', 'search.html',
+                    'viewResource.html', 'viewReservation.html', 'newResource.html', 'newReservation.html', 'rss.html']
+
+'''helper function to get the present date and time in the site timezone, daylight saving included'''
+def localNow():
+    return datetime.datetime.now(pytz.utc).astimezone(SITE_TIMEZONE)
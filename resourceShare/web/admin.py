@@ -0,0 +1,243 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''Admin and instance handlers: schema migrations, lookup stats and warmup.'''
+
+import time
+import json
+import logging
+
+from google.appengine.datastore.datastore_query import Cursor
+from google.appengine.ext import deferred
+from google.appengine.ext import ndb
+
+import webapp2
+
+from resourceShare.settings import MIGRATION_BATCH_SIZE, RESOURCE_SCHEMA_VERSION, TAG_CLOUD_SIZE, WARMUP_TEMPLATES
+from resourceShare.model.lookup import LegacyKeyAlias, aliasKey, allocatePrimaryKeys, entityKey, hasAllocatedKey
+from resourceShare.rendering import JINJA_ENVIRONMENT, bumpFragmentVersion, renderFragment
+from resourceShare.model.reservations import Reservation
+from resourceShare.model.counter import reservationShardKeys
+from resourceShare.model.schedule import ResourceSchedule, scheduleKey
+from resourceShare.model.resources import Resource, normalizeTags
+from resourceShare.model.rules import RecurringReservation, ResourceRecurrences, recurrencesKey
+from resourceShare.model.tags import TagSummary, updateTagSummaries
+from resourceShare.booking.upcoming import UpcomingReservations, addToUpcoming, reservationDay
+from resourceShare.booking.bookings import reservationBatches
+from resourceShare.web.pages import allResourcesValues
+import resourceShare
+from resourceShare import availability
+from resourceShare.model import lookup
+
+# [START migration]
+'''helper function to bring one resource up to the current schema version, returns True when it changed'''
+def upgradeResource(resource):
+    version = resource.schemaVersion or 0
+    if version >= RESOURCE_SCHEMA_VERSION:
+        return False
+    if version < 1:
+        updateTagSummaries(resource.primaryKey, [], resource.resource_tag)
+    # version 2 added resource_NameTokens, version 3 the minute fields and version 4 resource_NameLower and the bigram
+    # tokens, which the put fills in
+    resource.schemaVersion = RESOURCE_SCHEMA_VERSION
+    return True
+
+'''helper function to get the primaryKey an entity moves to, allocating it and recording the alias on the first try'''
+def movedPrimaryKey(modelClass, primaryKey):
+    alias = aliasKey(modelClass, primaryKey).get()
+    if alias is None:
+        alias = LegacyKeyAlias(key=aliasKey(modelClass, primaryKey), primaryKey=allocatePrimaryKeys(modelClass, 1)[0])
+        alias.put()
+    return alias.primaryKey
+
+'''helper function to swap an old primaryKey for the new one in the recent resources of a tag'''
+@ndb.transactional
+def renameInTagSummary(normalizedTag, oldPrimaryKey, newPrimaryKey):
+    summary = TagSummary.get_by_id(normalizedTag)
+    if summary is not None and oldPrimaryKey in summary.recentResources:
+        summary.recentResources = [newPrimaryKey if key == oldPrimaryKey else key for key in summary.recentResources]
+        summary.put()
+
+'''helper function to move a resource to an allocated key; its reservations, rules, schedules and tag summaries
+follow and its counter shards are folded into totalReservations. Every step can run again, so a failed batch is
+simply retried'''
+def rekeyResource(resource):
+    oldPrimaryKey = resource.primaryKey
+    newPrimaryKey = movedPrimaryKey(Resource, oldPrimaryKey)
+    moved = entityKey(Resource, newPrimaryKey).get()
+    shardKeys = reservationShardKeys(oldPrimaryKey)
+    if moved is None:
+        moved = Resource(key=entityKey(Resource, newPrimaryKey),
+                         **resource.to_dict(exclude=['resource_tagNormalized', 'resource_NameTokens', 'resource_NameLower']))
+        moved.primaryKey = newPrimaryKey
+        moved.totalReservations = (resource.totalReservations or 0) + sum(
+            shard.count for shard in ndb.get_multi(shardKeys) if shard is not None)
+    reservations = Reservation.query(Reservation.resource_PrimaryKey == oldPrimaryKey).fetch()
+    for reservation in reservations:
+        reservation.resource_PrimaryKey = newPrimaryKey
+    schedules = ResourceSchedule.query(ResourceSchedule.resource_PrimaryKey == oldPrimaryKey).fetch()
+    movedSchedules = [ResourceSchedule(key=scheduleKey(newPrimaryKey, schedule.day), resource_PrimaryKey=newPrimaryKey,
+                                       day=schedule.day, starts=schedule.starts, ends=schedule.ends,
+                                       reservationKeys=schedule.reservationKeys) for schedule in schedules]
+    rules = RecurringReservation.query(RecurringReservation.resource_PrimaryKey == oldPrimaryKey).fetch()
+    for rule in rules:
+        rule.resource_PrimaryKey = newPrimaryKey
+    recurrences = recurrencesKey(oldPrimaryKey).get()
+    if recurrences is not None:
+        movedSchedules.append(ResourceRecurrences(key=recurrencesKey(newPrimaryKey), rules=recurrences.rules))
+    ndb.put_multi([moved] + reservations + rules + movedSchedules)
+    for normalizedTag in normalizeTags(resource.resource_tag):
+        renameInTagSummary(normalizedTag, oldPrimaryKey, newPrimaryKey)
+    ndb.delete_multi([schedule.key for schedule in schedules] + shardKeys + [recurrencesKey(oldPrimaryKey), resource.key])
+
+'''helper function to move a reservation to an allocated key, renaming it in the schedule of its day'''
+def rekeyReservation(reservation):
+    oldPrimaryKey = reservation.primaryKey
+    newPrimaryKey = movedPrimaryKey(Reservation, oldPrimaryKey)
+    moved = Reservation(key=entityKey(Reservation, newPrimaryKey), **reservation.to_dict())
+    moved.primaryKey = newPrimaryKey
+    changed = [moved]
+    if reservation.resource_PrimaryKey and reservation.reservation_Date:
+        schedule = scheduleKey(reservation.resource_PrimaryKey, reservation.reservation_Date).get()
+        if schedule is not None and oldPrimaryKey in schedule.reservationKeys:
+            schedule.reservationKeys[schedule.reservationKeys.index(oldPrimaryKey)] = newPrimaryKey
+            changed.append(schedule)
+    ndb.put_multi(changed)
+    reservation.key.delete()
+
+'''deferred task upgrading all resources in batches, re-queueing itself with a cursor until done'''
+def migrateResources(urlsafeCursor=None):
+    startCursor = Cursor(urlsafe=urlsafeCursor) if urlsafeCursor else None
+    resources, nextCursor, more = Resource.query().fetch_page(MIGRATION_BATCH_SIZE, start_cursor=startCursor)
+    changed = [resource for resource in resources if upgradeResource(resource)]
+    if changed:
+        ndb.put_multi(changed)
+    if more and nextCursor:
+        deferred.defer(migrateResources, nextCursor.urlsafe())
+    else:
+        deferred.defer(migrateReservations)
+
+'''deferred task filling the minute fields of older reservations in batches, re-queueing itself with a cursor until done'''
+def migrateReservations(urlsafeCursor=None):
+    startCursor = Cursor(urlsafe=urlsafeCursor) if urlsafeCursor else None
+    reservations, nextCursor, more = Reservation.query().fetch_page(MIGRATION_BATCH_SIZE, start_cursor=startCursor)
+    changed = [reservation for reservation in reservations if reservation.reservation_EndMinute is None]
+    if changed:
+        ndb.put_multi(changed)
+    if more and nextCursor:
+        deferred.defer(migrateReservations, nextCursor.urlsafe())
+    else:
+        deferred.defer(migrateResourceKeys)
+
+'''deferred task moving resources with random primaryKeys to allocated keys in batches, then the reservations'''
+def migrateResourceKeys(urlsafeCursor=None):
+    startCursor = Cursor(urlsafe=urlsafeCursor) if urlsafeCursor else None
+    resources, nextCursor, more = Resource.query().fetch_page(MIGRATION_BATCH_SIZE, start_cursor=startCursor)
+    legacy = [resource for resource in resources if resource.primaryKey and not hasAllocatedKey(resource)]
+    for resource in legacy:
+        rekeyResource(resource)
+    if legacy:
+        availability.availabilityIndex.invalidate()
+        bumpFragmentVersion('allResourcesTable.html')
+    if more and nextCursor:
+        deferred.defer(migrateResourceKeys, nextCursor.urlsafe())
+    else:
+        deferred.defer(migrateReservationKeys)
+
+'''deferred task moving reservations with random primaryKeys to allocated keys in batches'''
+def migrateReservationKeys(urlsafeCursor=None):
+    startCursor = Cursor(urlsafe=urlsafeCursor) if urlsafeCursor else None
+    reservations, nextCursor, more = Reservation.query().fetch_page(MIGRATION_BATCH_SIZE, start_cursor=startCursor)
+    legacy = [reservation for reservation in reservations if reservation.primaryKey and not hasAllocatedKey(reservation)]
+    for reservation in legacy:
+        rekeyReservation(reservation)
+    if legacy:
+        availability.availabilityIndex.invalidate()
+    if more and nextCursor:
+        deferred.defer(migrateReservationKeys, nextCursor.urlsafe())
+    else:
+        deferred.defer(clearUpcomingViews)
+
+'''deferred task deleting the upcoming reservations views in batches, which may still list keys moved above, then
+rebuilding them'''
+def clearUpcomingViews(urlsafeCursor=None):
+    startCursor = Cursor(urlsafe=urlsafeCursor) if urlsafeCursor else None
+    keys, nextCursor, more = UpcomingReservations.query().fetch_page(MIGRATION_BATCH_SIZE, start_cursor=startCursor,
+                                                                     keys_only=True)
+    ndb.delete_multi(keys)
+    if more and nextCursor:
+        deferred.defer(clearUpcomingViews, nextCursor.urlsafe())
+    else:
+        deferred.defer(rebuildUpcomingViews)
+
+'''helper function to list reservations of one resource and day in the upcoming reservations views inside a transaction'''
+@ndb.transactional(xg=True)
+def listAsUpcoming(resourcePrimaryKey, reservations):
+    ndb.put_multi(addToUpcoming(resourcePrimaryKey, reservations))
+
+'''deferred task listing every reservation that has not ended in the upcoming reservations views, in batches; a
+reservation already listed is replaced, so bookings made meanwhile are kept'''
+def rebuildUpcomingViews(urlsafeCursor=None):
+    startCursor = Cursor(urlsafe=urlsafeCursor) if urlsafeCursor else None
+    reservations, nextCursor, more = Reservation.query().fetch_page(MIGRATION_BATCH_SIZE, start_cursor=startCursor)
+    byResourceDay = {}
+    for reservation in reservations:
+        if reservation.resource_PrimaryKey:
+            byResourceDay.setdefault((reservation.resource_PrimaryKey, reservationDay(reservation)), []).append(reservation)
+    for (resourcePrimaryKey, day), group in byResourceDay.items():
+        for batch in reservationBatches(group):
+            listAsUpcoming(resourcePrimaryKey, batch)
+    if more and nextCursor:
+        deferred.defer(rebuildUpcomingViews, nextCursor.urlsafe())
+
+'''admin class to start the background migration: schema upgrades first, then the move to allocated keys and the
+rebuild of the upcoming reservations views; each step queues the next once it has gone through every entity'''
+class Migrate(webapp2.RequestHandler):
+    def get(self):
+        deferred.defer(migrateResources)
+        self.response.write('Migration started.')
+# [END migration]
+
+'''admin class to report how the primary key lookups of this instance were resolved'''
+class LookupStatsPage(webapp2.RequestHandler):
+    def get(self):
+        self.response.headers['Content-Type'] = 'application/json'
+        self.response.write(json.dumps(lookup.lookupStats.snapshot()))
+# [START warmup]
+'''class to warm up a new instance before it takes user traffic: preloads deferred imports and templates, primes the
+caches behind the landing and tag pages and loads today's availability snapshot when one has been built, then logs
+how long each step took. It never scans the datastore for availability; without a snapshot the first time search
+does'''
+class Warmup(webapp2.RequestHandler):
+    def get(self):
+        profile = {'importSeconds': resourceShare.IMPORT_SECONDS}
+        started = time.time()
+        from google.appengine.api import mail
+        profile['deferredImportSeconds'] = time.time() - started
+        started = time.time()
+        for templateName in WARMUP_TEMPLATES:
+            JINJA_ENVIRONMENT.get_template(templateName)
+        profile['templateSeconds'] = time.time() - started
+        started = time.time()
+        renderFragment('allResourcesTable.html', u'', lambda: allResourcesValues(u''))
+        renderFragment('tagCloud.html', u'', lambda: {
+            'tagCloud': TagSummary.query().order(-TagSummary.count).fetch(TAG_CLOUD_SIZE)})
+        profile['cacheSeconds'] = time.time() - started
+        started = time.time()
+        profile['availabilitySnapshot'] = availability.availabilityIndex.loadSnapshot()
+        profile['availabilitySeconds'] = time.time() - started
+        logging.info('Warmup profile: %s', json.dumps(profile))
+        self.response.headers['Content-Type'] = 'application/json'
+        self.response.write(json.dumps(profile))
+# [END warmup]
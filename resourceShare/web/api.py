@@ -0,0 +1,607 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''The JSON API.'''
+
+import re
+import hashlib
+import json
+import datetime
+
+from google.appengine.api import users
+from google.appengine.api import datastore_errors
+from google.appengine.datastore.datastore_query import Cursor
+from google.appengine.ext import ndb
+
+import webapp2
+
+from resourceShare.settings import (API_BATCH_LIMIT, API_CSRF_HEADER, API_MAX_PAGE_SIZE, API_PAGE_SIZE, MAX_TAGS,
+                                    MAX_TAG_LENGTH, NAME_SEARCH_LIMIT, QUERY_IN_LIMIT, RECURRENCE_API_FIELDS,
+                                    RECURRENCE_FREQUENCIES, RECURRENCE_MAX_DAYS, RECURRENCE_WRITABLE_FIELDS,
+                                    RESERVATION_API_FIELDS, RESERVATION_RULE_FIELDS, RESERVATION_SUMMARY_FIELDS,
+                                    RESERVATION_WRITABLE_FIELDS, RESOURCE_API_FIELDS, RESOURCE_SUMMARY_FIELDS,
+                                    RESOURCE_WRITABLE_FIELDS, TAG_CLOUD_SIZE, UPCOMING_DAYS, localNow)
+from resourceShare.model.lookup import allocatePrimaryKeys, canonicalPrimaryKey, getByPrimaryKey, getMultiByPrimaryKey
+from resourceShare.model.reservations import Reservation, toMinutes, toTimeString
+from resourceShare.model.counter import attachReservationCounts, reservationShardKeys
+from resourceShare.model.resources import (Resource, attachResourceNames, newResource, normalizeTag,
+                                           searchResourcesByName, splitTags)
+from resourceShare.model.rules import RecurringReservation, expandRecurrences, occursOn, recurrenceSpec, recurrencesKey
+from resourceShare.model.tags import TagSummary, addResourcesToTagSummaries, saveResource
+from resourceShare.feed import bumpFeedVersion
+from resourceShare.booking.bookings import (ReservationConflict, bookReservation, bookReservations, cancelReservation,
+                                            cancelReservations)
+from resourceShare.booking.recurrence import bookRecurrence, deleteRecurrence, skipOccurrence
+from resourceShare.booking.effects import (recurrenceBooked, recurrenceCancelled, reservationsBooked,
+                                           reservationsCancelled, resourceSaved, resourcesDeleted)
+from resourceShare import availability
+
+# [START api]
+'''error raised inside API handlers, answered as a JSON body with the given HTTP status'''
+class ApiError(Exception):
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+        self.message = message
+
+'''helper function to turn a property value into something json can encode'''
+def jsonValue(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+'''helper function to compute the strong ETag of a JSON document'''
+def jsonEtag(data):
+    return '"%s"' % hashlib.md5(json.dumps(data, sort_keys=True)).hexdigest()
+
+'''helper function to turn an entity, or a projection of it, into a dict of the requested fields; known holds the values
+a projection query filtered on and so could not return'''
+def apiEntity(entity, fields, known=None):
+    item = {}
+    for field in fields:
+        if known and field in known:
+            item[field] = known[field]
+        else:
+            item[field] = jsonValue(getattr(entity, field, None))
+    return item
+
+'''helper function to turn full resources into dicts, loading reservation counts only when they were asked for'''
+def apiResources(resources, fields):
+    if 'reservationCount' in fields:
+        attachReservationCounts(resources)
+    return [apiEntity(resource, fields) for resource in resources]
+
+'''helper function to read an "HH:MM" field from a JSON document'''
+def apiTime(data, field):
+    value = data.get(field)
+    if not isinstance(value, basestring) or not re.match(r'^\d{1,2}:\d{2}$', value):
+        raise ApiError(400, field + ' must be a time formatted as HH:MM.')
+    if toMinutes(value) >= 24 * 60 or int(value.split(':')[1]) >= 60:
+        raise ApiError(400, field + ' is not a valid time of day.')
+    return value
+
+'''helper function to apply the writable fields of a JSON document to a resource; fields left out keep their value'''
+def applyResourceJson(resource, data):
+    unknown = [field for field in data if field not in RESOURCE_WRITABLE_FIELDS]
+    if unknown:
+        raise ApiError(400, 'Fields cannot be written: ' + ', '.join(sorted(unknown)))
+    if 'resource_Name' in data or resource.resource_Name is None:
+        name = data.get('resource_Name')
+        if not isinstance(name, basestring) or not name.strip():
+            raise ApiError(400, 'resource_Name is required.')
+        resource.resource_Name = name.strip()
+    if 'resource_StartTime' in data or resource.resource_StartTime is None:
+        resource.resource_StartTime = apiTime(data, 'resource_StartTime')
+    if 'resource_EndTime' in data or resource.resource_EndTime is None:
+        resource.resource_EndTime = apiTime(data, 'resource_EndTime')
+    resource.resource_Duration = toMinutes(resource.resource_EndTime) - toMinutes(resource.resource_StartTime)
+    if resource.resource_Duration < 0:
+        raise ApiError(400, 'resource_EndTime cannot be before resource_StartTime.')
+    if 'resource_tag' in data:
+        tags = data['resource_tag']
+        if isinstance(tags, basestring):
+            tags = splitTags(tags)
+        elif not isinstance(tags, list) or not all(isinstance(tag, basestring) for tag in tags):
+            raise ApiError(400, 'resource_tag must be a list of strings.')
+        tags = [tag.strip() for tag in tags if tag.strip()]
+        if len(tags) > MAX_TAGS or any(len(tag) > MAX_TAG_LENGTH for tag in tags):
+            raise ApiError(400, 'At most %d tags of up to %d characters each.' % (MAX_TAGS, MAX_TAG_LENGTH))
+        resource.resource_tag = tags
+    return resource
+
+'''helper function to build an unsaved reservation of a resource from a JSON document'''
+def reservationFromJson(data, resource, owner):
+    unknown = [field for field in data if field not in RESERVATION_WRITABLE_FIELDS]
+    if unknown:
+        raise ApiError(400, 'Fields cannot be written: ' + ', '.join(sorted(unknown)))
+    duration = data.get('reservation_Duration')
+    if not isinstance(duration, (int, long)) or isinstance(duration, bool) or duration <= 0:
+        raise ApiError(400, 'reservation_Duration must be a positive number of minutes.')
+    notes = data.get('reservation_Notes', '')
+    if not isinstance(notes, basestring):
+        raise ApiError(400, 'reservation_Notes must be a string.')
+    reservation = Reservation()
+    reservation.resource_PrimaryKey = resource.primaryKey
+    reservation.reservation_StartTime = apiTime(data, 'reservation_StartTime')
+    reservation.reservation_Notes = notes
+    reservation.reservation_Owner = owner
+    reservation.reservation_Duration = duration
+    reservation.reservation_EndTime = toTimeString(toMinutes(reservation.reservation_StartTime) + duration)
+    reservation.reservation_Date = localNow().date()
+    if data.get('reservation_Date'):
+        try:
+            reservation.reservation_Date = datetime.datetime.strptime(str(data['reservation_Date']), '%Y-%m-%d').date()
+        except ValueError:
+            raise ApiError(400, 'reservation_Date must be a date formatted as YYYY-MM-DD.')
+        if reservation.reservation_Date < localNow().date():
+            raise ApiError(400, 'reservation_Date cannot be in the past.')
+    return reservation
+
+'''helper function to read a "YYYY-MM-DD" field from a JSON document or a query string'''
+def apiDate(data, field):
+    try:
+        return datetime.datetime.strptime(str(data.get(field)), '%Y-%m-%d').date()
+    except ValueError:
+        raise ApiError(400, field + ' must be a date formatted as YYYY-MM-DD.')
+
+'''helper function to build an unsaved recurring reservation of a resource from a JSON document; startDate defaults to
+today and a weekly rule without weekdays repeats on the weekday of startDate'''
+def recurrenceFromJson(data, resource, owner):
+    unknown = [field for field in data if field not in RECURRENCE_WRITABLE_FIELDS]
+    if unknown:
+        raise ApiError(400, 'Fields cannot be written: ' + ', '.join(sorted(unknown)))
+    if data.get('frequency') not in RECURRENCE_FREQUENCIES:
+        raise ApiError(400, 'frequency must be one of ' + ', '.join(RECURRENCE_FREQUENCIES) + '.')
+    interval = data.get('interval', 1)
+    if not isinstance(interval, (int, long)) or isinstance(interval, bool):
+        raise ApiError(400, 'interval must be a number.')
+    weekdays = data.get('weekdays', [])
+    if not isinstance(weekdays, list) or not all(isinstance(weekday, (int, long)) for weekday in weekdays):
+        raise ApiError(400, 'weekdays must be a list of numbers.')
+    reservation = reservationFromJson(dict((field, data[field]) for field in RESERVATION_WRITABLE_FIELDS if field in data),
+                                      resource, owner)
+    rule = RecurringReservation(**reservation.to_dict(include=RESERVATION_RULE_FIELDS))
+    rule.frequency = data['frequency']
+    rule.interval = interval
+    rule.weekdays = weekdays
+    rule.startDate = apiDate(data, 'startDate') if data.get('startDate') else reservation.reservation_Date
+    rule.untilDate = apiDate(data, 'untilDate')
+    return rule
+
+'''helper function to delete resources together with their reservations, recurring rules and counter shards'''
+def deleteResources(resources):
+    if not resources:
+        return
+    primaryKeys = [resource.primaryKey for resource in resources]
+    reservations = []
+    ruleKeys = []
+    for index in range(0, len(primaryKeys), QUERY_IN_LIMIT):
+        reservations.extend(Reservation.query(
+            Reservation.resource_PrimaryKey.IN(primaryKeys[index:index + QUERY_IN_LIMIT])).fetch())
+        ruleKeys.extend(RecurringReservation.query(
+            RecurringReservation.resource_PrimaryKey.IN(primaryKeys[index:index + QUERY_IN_LIMIT])).fetch(keys_only=True))
+    reservationsCancelled(cancelReservations(reservations))
+    shardKeys = []
+    for primaryKey in primaryKeys:
+        shardKeys.extend(reservationShardKeys(primaryKey))
+        shardKeys.append(recurrencesKey(primaryKey))
+    ndb.delete_multi([resource.key for resource in resources] + ruleKeys + shardKeys)
+    resourcesDeleted(resources)
+
+'''base class of the JSON API: answers with strong ETags and 304s, and turns ApiError into a JSON error. Requests that
+change state must be JSON or carry API_CSRF_HEADER; a cross-site form can send neither, and a cross-site script needs
+a CORS preflight the API never grants'''
+class ApiHandler(webapp2.RequestHandler):
+    def dispatch(self):
+        try:
+            self.user = users.get_current_user()
+            if self.user is None:
+                raise ApiError(401, 'Login required.')
+            if (self.request.method not in ('GET', 'HEAD', 'OPTIONS') and self.request.content_type != 'application/json'
+                    and not self.request.headers.get(API_CSRF_HEADER)):
+                raise ApiError(403, 'Send Content-Type: application/json or an %s header.' % API_CSRF_HEADER)
+            self.email = str(self.user.email())
+            webapp2.RequestHandler.dispatch(self)
+        except ApiError as error:
+            self.response.clear()
+            self.response.status_int = error.status
+            self.response.headers['Content-Type'] = 'application/json'
+            self.response.write(json.dumps({'error': error.message}))
+
+    def writeJson(self, data, status=200):
+        etag = jsonEtag(data)
+        self.response.headers['ETag'] = etag
+        self.response.headers['Cache-Control'] = 'private, no-cache'
+        ifNoneMatch = self.request.headers.get('If-None-Match')
+        if status == 200 and self.request.method == 'GET' and ifNoneMatch and (
+                etag in [tag.strip() for tag in ifNoneMatch.split(',')] or ifNoneMatch.strip() == '*'):
+            self.response.status_int = 304
+            return
+        self.response.status_int = status
+        self.response.headers['Content-Type'] = 'application/json'
+        self.response.write(json.dumps(data, sort_keys=True))
+
+    def checkIfMatch(self, item):
+        ifMatch = self.request.headers.get('If-Match')
+        if ifMatch and ifMatch.strip() != '*' and jsonEtag(item) not in [tag.strip() for tag in ifMatch.split(',')]:
+            raise ApiError(412, 'The entity changed since it was read.')
+
+    def readJson(self):
+        try:
+            data = json.loads(self.request.body)
+        except ValueError:
+            raise ApiError(400, 'Request body is not valid JSON.')
+        if not isinstance(data, dict):
+            raise ApiError(400, 'Request body must be a JSON object.')
+        return data
+
+    def readBatch(self, field):
+        values = self.readJson().get(field)
+        if not isinstance(values, list) or not values:
+            raise ApiError(400, field + ' must be a non-empty list.')
+        if len(values) > API_BATCH_LIMIT:
+            raise ApiError(400, 'At most %d %s per request.' % (API_BATCH_LIMIT, field))
+        return values
+
+    def requestedFields(self, allowed):
+        fields = self.request.get('fields')
+        if not fields:
+            return list(allowed)
+        requested = [field.strip() for field in fields.split(',') if field.strip()]
+        unknown = [field for field in requested if field not in allowed]
+        if unknown:
+            raise ApiError(400, 'Unknown fields: ' + ', '.join(unknown))
+        return requested
+
+    def fetchPage(self, query, fields, summaryFields, known):
+        try:
+            limit = int(self.request.get('limit') or API_PAGE_SIZE)
+        except ValueError:
+            raise ApiError(400, 'limit must be a number.')
+        limit = max(1, min(limit, API_MAX_PAGE_SIZE))
+        try:
+            startCursor = Cursor(urlsafe=self.request.get('cursor')) if self.request.get('cursor') else None
+        except datastore_errors.BadValueError:
+            raise ApiError(400, 'cursor is not valid.')
+        projection = [field for field in summaryFields if field not in known]
+        if projection and all(field in summaryFields for field in fields):
+            entities, nextCursor, more = query.fetch_page(limit, start_cursor=startCursor, projection=projection)
+            items = [apiEntity(entity, fields, known) for entity in entities]
+        else:
+            entities, nextCursor, more = query.fetch_page(limit, start_cursor=startCursor)
+            if query.kind != 'Resource' and 'resource_Name' in fields:
+                attachResourceNames(entities)
+            items = apiResources(entities, fields) if query.kind == 'Resource' else [apiEntity(entity, fields) for entity in entities]
+        return {'items': items, 'cursor': nextCursor.urlsafe() if more and nextCursor else None}
+
+    def ownedResource(self, primaryKey):
+        resource = getByPrimaryKey(Resource, primaryKey)
+        if resource is None:
+            raise ApiError(404, 'Resource not found.')
+        if resource.resource_Owner != self.email:
+            raise ApiError(403, 'Only the owner can change this resource.')
+        return resource
+
+    def ownedReservation(self, primaryKey, modelClass=Reservation):
+        reservation = getByPrimaryKey(modelClass, primaryKey)
+        if reservation is None:
+            raise ApiError(404, 'Reservation not found.')
+        if reservation.reservation_Owner != self.email:
+            raise ApiError(403, 'Only the owner can change this reservation.')
+        return reservation
+
+'''API class listing resources in primaryKey order, optionally of one owner, and creating them'''
+class ApiResources(ApiHandler):
+    def get(self):
+        fields = self.requestedFields(RESOURCE_API_FIELDS)
+        query = Resource.query()
+        known = {}
+        owner = self.request.get('owner')
+        if owner:
+            query = query.filter(Resource.resource_Owner == owner)
+            known['resource_Owner'] = owner
+        self.writeJson(self.fetchPage(query.order(Resource.primaryKey), fields, RESOURCE_SUMMARY_FIELDS, known))
+
+    def post(self):
+        resource = applyResourceJson(newResource(self.email), self.readJson())
+        saveResource(resource, [])
+        resourceSaved(resource)
+        self.writeJson(apiResources([resource], RESOURCE_API_FIELDS)[0], status=201)
+
+'''API class creating many resources with one put_multi'''
+class ApiResourcesBatch(ApiHandler):
+    def post(self):
+        items = self.readBatch('items')
+        resources = []
+        for index, (data, primaryKey) in enumerate(zip(items, allocatePrimaryKeys(Resource, len(items)))):
+            if not isinstance(data, dict):
+                raise ApiError(400, 'items[%d] must be a JSON object.' % index)
+            try:
+                resources.append(applyResourceJson(newResource(self.email, primaryKey), data))
+            except ApiError as error:
+                raise ApiError(400, 'items[%d]: %s' % (index, error.message))
+        ndb.put_multi(resources)
+        addResourcesToTagSummaries(resources)
+        for resource in resources:
+            resourceSaved(resource)
+        self.writeJson({'items': apiResources(resources, RESOURCE_API_FIELDS)}, status=201)
+
+'''API class deleting many resources of the caller, with their reservations, using delete_multi'''
+class ApiResourcesBatchDelete(ApiHandler):
+    def post(self):
+        primaryKeys = [str(primaryKey) for primaryKey in self.readBatch('keys')]
+        resources = getMultiByPrimaryKey(Resource, primaryKeys)
+        found = [resource for resource in resources if resource is not None]
+        if any(resource.resource_Owner != self.email for resource in found):
+            raise ApiError(403, 'Only the owner can delete a resource.')
+        deleteResources(found)
+        self.writeJson({'deleted': [resource.primaryKey for resource in found],
+                        'notFound': [primaryKey for primaryKey, resource in zip(primaryKeys, resources) if resource is None]})
+
+'''API class reading, updating and deleting one resource'''
+class ApiResource(ApiHandler):
+    def get(self, primaryKey):
+        resource = getByPrimaryKey(Resource, primaryKey)
+        if resource is None:
+            raise ApiError(404, 'Resource not found.')
+        self.writeJson(apiResources([resource], self.requestedFields(RESOURCE_API_FIELDS))[0])
+
+    def put(self, primaryKey):
+        resource = self.ownedResource(primaryKey)
+        self.checkIfMatch(apiResources([resource], RESOURCE_API_FIELDS)[0])
+        oldTags = list(resource.resource_tag)
+        applyResourceJson(resource, self.readJson())
+        saveResource(resource, oldTags)
+        resourceSaved(resource)
+        self.writeJson(apiResources([resource], RESOURCE_API_FIELDS)[0])
+
+    def delete(self, primaryKey):
+        resource = self.ownedResource(primaryKey)
+        self.checkIfMatch(apiResources([resource], RESOURCE_API_FIELDS)[0])
+        deleteResources([resource])
+        self.response.status_int = 204
+
+'''API class listing the reservations of a resource, or of an owner (the caller by default), and booking one'''
+class ApiReservations(ApiHandler):
+    def get(self):
+        fields = self.requestedFields(RESERVATION_API_FIELDS)
+        resourceKey = self.request.get('resource')
+        if resourceKey:
+            resourceKey = canonicalPrimaryKey(Resource, resourceKey)
+            query = Reservation.query(Reservation.resource_PrimaryKey == resourceKey)
+            known = {'resource_PrimaryKey': resourceKey}
+        else:
+            owner = self.request.get('owner') or self.email
+            query = Reservation.query(Reservation.reservation_Owner == owner)
+            known = {'reservation_Owner': owner}
+        self.writeJson(self.fetchPage(query.order(Reservation.primaryKey), fields, RESERVATION_SUMMARY_FIELDS, known))
+
+    def post(self):
+        data = self.readJson()
+        resource = getByPrimaryKey(Resource, data.pop('resource_PrimaryKey', None))
+        if resource is None:
+            raise ApiError(404, 'Resource not found.')
+        reservation = reservationFromJson(data, resource, self.email)
+        try:
+            bookReservation(resource, reservation)
+        except ReservationConflict:
+            raise ApiError(409, 'The slot is outside the resource availability or already reserved.')
+        reservationsBooked(resource, [reservation])
+        reservation.resource_Name = resource.resource_Name
+        self.writeJson(apiEntity(reservation, RESERVATION_API_FIELDS), status=201)
+
+'''API class booking many reservations, one batched transaction per resource and day; each item reports its outcome'''
+class ApiReservationsBatch(ApiHandler):
+    def post(self):
+        items = self.readBatch('items')
+        for index, data in enumerate(items):
+            if not isinstance(data, dict):
+                raise ApiError(400, 'items[%d] must be a JSON object.' % index)
+        primaryKeys = [str(data.get('resource_PrimaryKey')) for data in items]
+        resources = dict((resource.primaryKey, resource) for resource in
+                         getMultiByPrimaryKey(Resource, list(set(primaryKeys))) if resource is not None)
+        missing = sorted(set(primaryKey for primaryKey in primaryKeys if primaryKey not in resources))
+        if missing:
+            raise ApiError(404, 'Resources not found: ' + ', '.join(missing))
+        byResource = {}
+        reservations = []
+        for index, data in enumerate(items):
+            data = dict(data)
+            resource = resources[str(data.pop('resource_PrimaryKey'))]
+            try:
+                reservation = reservationFromJson(data, resource, self.email)
+            except ApiError as error:
+                raise ApiError(400, 'items[%d]: %s' % (index, error.message))
+            reservations.append(reservation)
+            byResource.setdefault(resource.primaryKey, []).append(reservation)
+        booked = set()
+        for primaryKey, resourceReservations in byResource.items():
+            inserted, conflicts = bookReservations(resources[primaryKey], resourceReservations)
+            reservationsBooked(resources[primaryKey], inserted)
+            booked.update(id(reservation) for reservation in inserted)
+        results = []
+        for reservation in reservations:
+            if id(reservation) in booked:
+                reservation.resource_Name = resources[reservation.resource_PrimaryKey].resource_Name
+                results.append({'status': 'created', 'reservation': apiEntity(reservation, RESERVATION_API_FIELDS)})
+            else:
+                results.append({'status': 'conflict', 'reservation': None})
+        self.writeJson({'items': results})
+
+'''API class cancelling many reservations of the caller using delete_multi'''
+class ApiReservationsBatchDelete(ApiHandler):
+    def post(self):
+        primaryKeys = [str(primaryKey) for primaryKey in self.readBatch('keys')]
+        reservations = getMultiByPrimaryKey(Reservation, primaryKeys)
+        found = [reservation for reservation in reservations if reservation is not None]
+        if any(reservation.reservation_Owner != self.email for reservation in found):
+            raise ApiError(403, 'Only the owner can delete a reservation.')
+        cancelled = cancelReservations(found)
+        reservationsCancelled(cancelled)
+        self.writeJson({'deleted': [reservation.primaryKey for reservation in cancelled],
+                        'notFound': [primaryKey for primaryKey, reservation in zip(primaryKeys, reservations) if reservation is None]})
+
+'''API class reading, updating the notes of, and cancelling one reservation'''
+class ApiReservation(ApiHandler):
+    def get(self, primaryKey):
+        reservation = getByPrimaryKey(Reservation, primaryKey)
+        if reservation is None:
+            raise ApiError(404, 'Reservation not found.')
+        attachResourceNames([reservation])
+        self.writeJson(apiEntity(reservation, self.requestedFields(RESERVATION_API_FIELDS)))
+
+    def put(self, primaryKey):
+        reservation = self.ownedReservation(primaryKey)
+        attachResourceNames([reservation])
+        self.checkIfMatch(apiEntity(reservation, RESERVATION_API_FIELDS))
+        data = self.readJson()
+        if set(data) - set(['reservation_Notes']) or not isinstance(data.get('reservation_Notes'), basestring):
+            raise ApiError(400, 'Only reservation_Notes can be changed; cancel and book again to move a reservation.')
+        reservation.reservation_Notes = data['reservation_Notes']
+        # the name was looked up for the response; it is not stored with the reservation
+        resourceName, reservation.resource_Name = reservation.resource_Name, None
+        reservation.put()
+        reservation.resource_Name = resourceName
+        bumpFeedVersion(reservation.resource_PrimaryKey)
+        self.writeJson(apiEntity(reservation, RESERVATION_API_FIELDS))
+
+    def delete(self, primaryKey):
+        reservation = self.ownedReservation(primaryKey)
+        attachResourceNames([reservation])
+        self.checkIfMatch(apiEntity(reservation, RESERVATION_API_FIELDS))
+        reservationsCancelled(cancelReservation(reservation))
+        self.response.status_int = 204
+
+'''API class listing the recurring reservations of a resource, or of an owner (the caller by default), and booking
+one; a rule that meets another reservation answers 409 with the conflicting days'''
+class ApiRecurrences(ApiHandler):
+    def get(self):
+        fields = self.requestedFields(RECURRENCE_API_FIELDS)
+        resourceKey = self.request.get('resource')
+        if resourceKey:
+            resourceKey = canonicalPrimaryKey(Resource, resourceKey)
+            query = RecurringReservation.query(RecurringReservation.resource_PrimaryKey == resourceKey)
+        else:
+            owner = self.request.get('owner') or self.email
+            query = RecurringReservation.query(RecurringReservation.reservation_Owner == owner)
+        self.writeJson(self.fetchPage(query.order(RecurringReservation.primaryKey), fields, (), {}))
+
+    def post(self):
+        data = self.readJson()
+        resource = getByPrimaryKey(Resource, data.pop('resource_PrimaryKey', None))
+        if resource is None:
+            raise ApiError(404, 'Resource not found.')
+        rule = recurrenceFromJson(data, resource, self.email)
+        try:
+            conflicts = bookRecurrence(resource, rule)
+        except ValueError as error:
+            raise ApiError(400, str(error))
+        if conflicts:
+            self.writeJson({'error': 'The rule is outside the resource availability or meets another reservation.',
+                            'conflicts': [day.isoformat() for day in conflicts]}, status=409)
+            return
+        recurrenceBooked(resource, rule)
+        rule.resource_Name = resource.resource_Name
+        self.writeJson(apiEntity(rule, RECURRENCE_API_FIELDS), status=201)
+
+'''API class reading and cancelling one recurring reservation; with date only that occurrence is cancelled'''
+class ApiRecurrence(ApiHandler):
+    def get(self, primaryKey):
+        rule = getByPrimaryKey(RecurringReservation, primaryKey)
+        if rule is None:
+            raise ApiError(404, 'Reservation not found.')
+        attachResourceNames([rule])
+        self.writeJson(apiEntity(rule, self.requestedFields(RECURRENCE_API_FIELDS)))
+
+    def delete(self, primaryKey):
+        rule = self.ownedReservation(primaryKey, RecurringReservation)
+        attachResourceNames([rule])
+        self.checkIfMatch(apiEntity(rule, RECURRENCE_API_FIELDS))
+        if self.request.get('date'):
+            day = apiDate(self.request.GET, 'date')
+            if not occursOn(recurrenceSpec(rule), day.toordinal()):
+                raise ApiError(404, 'The reservation does not occur on ' + day.isoformat() + '.')
+            if skipOccurrence(rule, day) is not None:
+                recurrenceCancelled(rule, day)
+        elif deleteRecurrence(rule):
+            recurrenceCancelled(rule)
+        self.response.status_int = 204
+
+'''API class expanding the occurrences of a recurring reservation between the days from and to, both included; from
+defaults to today and to to UPCOMING_DAYS later'''
+class ApiRecurrenceOccurrences(ApiHandler):
+    def get(self, primaryKey):
+        fromDay = apiDate(self.request.GET, 'from') if self.request.get('from') else localNow().date()
+        toDay = (apiDate(self.request.GET, 'to') if self.request.get('to') else
+                 fromDay + datetime.timedelta(days=UPCOMING_DAYS))
+        if not 0 <= (toDay - fromDay).days <= RECURRENCE_MAX_DAYS:
+            raise ApiError(400, 'to must be on or after from and at most %d days later.' % RECURRENCE_MAX_DAYS)
+        rules = attachResourceNames(self.rules(primaryKey, fromDay, toDay))
+        self.writeJson({'items': [apiEntity(occurrence, RESERVATION_API_FIELDS)
+                                  for occurrence in expandRecurrences(rules, fromDay, toDay)]})
+
+    def rules(self, primaryKey, fromDay, toDay):
+        rule = getByPrimaryKey(RecurringReservation, primaryKey)
+        if rule is None:
+            raise ApiError(404, 'Reservation not found.')
+        return [rule]
+
+'''API class expanding the occurrences of every recurring reservation of a resource between two days'''
+class ApiResourceOccurrences(ApiRecurrenceOccurrences):
+    def rules(self, primaryKey, fromDay, toDay):
+        primaryKey = canonicalPrimaryKey(Resource, primaryKey)
+        rules = RecurringReservation.query(RecurringReservation.resource_PrimaryKey == primaryKey,
+                                           RecurringReservation.untilDate >= fromDay).fetch()
+        return [rule for rule in rules if rule.startDate <= toDay]
+
+'''API class searching resources by name, or by a free slot given as startTime and duration'''
+class ApiSearch(ApiHandler):
+    def get(self):
+        fields = self.requestedFields(RESOURCE_API_FIELDS)
+        if self.request.get('name'):
+            resources = searchResourcesByName(self.request.get('name'), NAME_SEARCH_LIMIT)
+        elif self.request.get('startTime'):
+            start = toMinutes(apiTime({'startTime': self.request.get('startTime')}, 'startTime'))
+            try:
+                end = start + int(self.request.get('duration'))
+            except ValueError:
+                raise ApiError(400, 'duration must be a number of minutes.')
+            freeKeys = availability.availabilityIndex.freeResources(start, end)
+            resources = [resource for resource in ndb.get_multi(freeKeys) if resource is not None]
+        else:
+            raise ApiError(400, 'Give either name, or startTime and duration.')
+        self.writeJson({'items': apiResources(resources, fields)})
+
+'''API class listing the most used tags'''
+class ApiTags(ApiHandler):
+    def get(self):
+        summaries = TagSummary.query().order(-TagSummary.count).fetch(TAG_CLOUD_SIZE)
+        self.writeJson({'items': [{'tag': summary.key.id(), 'tagName': summary.tagName, 'count': summary.count}
+                                  for summary in summaries]})
+
+'''API class listing the resources of one tag in primaryKey order'''
+class ApiTag(ApiHandler):
+    def get(self, tag):
+        normalizedTag = normalizeTag(tag)
+        if not normalizedTag:
+            raise ApiError(404, 'Tag not found.')
+        fields = self.requestedFields(RESOURCE_API_FIELDS)
+        query = Resource.query(Resource.resource_tagNormalized == normalizedTag).order(Resource.primaryKey)
+        page = self.fetchPage(query, fields, RESOURCE_SUMMARY_FIELDS, {})
+        summary = TagSummary.get_by_id(normalizedTag)
+        page['tag'] = normalizedTag
+        page['tagName'] = summary.tagName if summary else tag
+        page['count'] = summary.count if summary else 0
+        self.writeJson(page)
+# [END api]
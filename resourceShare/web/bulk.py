@@ -0,0 +1,451 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''Bulk import and export jobs of the JSON API, run in task queue tasks.'''
+
+import time
+import json
+import csv
+import datetime
+
+from google.appengine.api import users
+from google.appengine.datastore.datastore_query import Cursor
+from google.appengine.ext import deferred
+from google.appengine.ext import ndb
+
+import webapp2
+
+from resourceShare.settings import (BULK_FIELDS, EXPORT_KEEP_HOURS, EXPORT_PAGE_SIZE, EXPORT_TASK_SECONDS,
+                                    IMPORT_BATCH_SIZE, IMPORT_CHUNK_BYTES, IMPORT_MAX_ERRORS, IMPORT_TASK_SECONDS,
+                                    RESERVATION_WRITABLE_FIELDS, RESOURCE_WRITABLE_FIELDS)
+from resourceShare.model.lookup import allocatePrimaryKeys, entityKey, getMultiByPrimaryKey
+from resourceShare.model.reservations import Reservation
+from resourceShare.model.resources import Resource, attachResourceNames, newResource
+from resourceShare.booking.upcoming import pruneMatching
+from resourceShare.booking.bookings import bookReservations
+from resourceShare.booking.effects import reservationsImported, resourcesImported
+from resourceShare.web.api import ApiError, ApiHandler, apiEntity, applyResourceJson, reservationFromJson
+from resourceShare import availability
+
+# [START bulk]
+'''a bulk import of resources or reservations; the uploaded file is kept in ImportChunk children and the job
+records how far the import got, so a task that stops or fails resumes from the last written batch'''
+class ImportJob(ndb.Model):
+    owner = ndb.StringProperty(indexed=True)
+    kind = ndb.StringProperty(indexed=False)
+    format = ndb.StringProperty(indexed=False)
+    fieldNames = ndb.StringProperty(repeated=True, indexed=False)
+    chunkCount = ndb.IntegerProperty(indexed=False, default=0)
+    chunkIndex = ndb.IntegerProperty(indexed=False, default=0)
+    chunkOffset = ndb.IntegerProperty(indexed=False, default=0)
+    rowNumber = ndb.IntegerProperty(indexed=False, default=0)
+    pendingKeys = ndb.StringProperty(repeated=True, indexed=False)
+    imported = ndb.IntegerProperty(indexed=False, default=0)
+    failed = ndb.IntegerProperty(indexed=False, default=0)
+    errors = ndb.JsonProperty(indexed=False, default=[])
+    status = ndb.StringProperty(indexed=False, default='queued')
+    created = ndb.DateTimeProperty(auto_now_add=True)
+    updated = ndb.DateTimeProperty(auto_now=True)
+
+'''one piece of an uploaded import file, keyed by its position under the job'''
+class ImportChunk(ndb.Model):
+    data = ndb.BlobProperty(compressed=True)
+
+'''helper function to get the key of a chunk of an import job'''
+def importChunkKey(jobKey, chunkIndex):
+    return ndb.Key(ImportChunk, chunkIndex + 1, parent=jobKey)
+
+'''helper function to store an uploaded file as a new import job, reading it IMPORT_CHUNK_BYTES at a time; the header
+of a CSV file is checked here so a bad file fails before any row is written'''
+def createImportJob(owner, kind, fileFormat, stream):
+    if kind not in BULK_FIELDS:
+        raise ApiError(400, 'kind must be resources or reservations.')
+    if fileFormat not in ('csv', 'jsonl'):
+        raise ApiError(400, 'format must be csv or jsonl.')
+    job = ImportJob(owner=owner, kind=kind, format=fileFormat)
+    job.put()
+    chunkCount = 0
+    data = stream.read(IMPORT_CHUNK_BYTES)
+    if data.startswith('\xef\xbb\xbf'):
+        data = data[3:]
+    if fileFormat == 'csv':
+        headerEnd = data.find('\n') + 1 or len(data)
+        job.fieldNames = [name.strip() for name in next(csv.reader([data[:headerEnd]]), [])]
+        job.chunkOffset = headerEnd
+        unknown = [name for name in job.fieldNames if name not in BULK_FIELDS[kind]]
+        if unknown or not job.fieldNames:
+            job.key.delete()
+            raise ApiError(400, 'Unknown columns: ' + ', '.join(unknown) if unknown else 'The CSV file has no header row.')
+    while data:
+        ImportChunk(key=importChunkKey(job.key, chunkCount), data=data).put()
+        chunkCount += 1
+        data = stream.read(IMPORT_CHUNK_BYTES)
+    job.chunkCount = chunkCount
+    job.put()
+    deferred.defer(runImport, job.key.id())
+    return job
+
+'''reads the records of an import job from its checkpoint on, one chunk in memory at a time; position and rowNumber
+always describe the end of the last record handed out'''
+class ImportReader(object):
+    def __init__(self, job):
+        self.job = job
+        self.position = (job.chunkIndex, job.chunkOffset)
+        self.rowNumber = job.rowNumber
+
+    def lines(self):
+        chunkIndex, offset = self.position
+        carry = ''
+        while chunkIndex < self.job.chunkCount:
+            data = importChunkKey(self.job.key, chunkIndex).get().data
+            while True:
+                lineEnd = data.find('\n', offset)
+                if lineEnd < 0:
+                    carry += data[offset:]
+                    break
+                self.position = (chunkIndex, lineEnd + 1)
+                yield carry + data[offset:lineEnd + 1]
+                carry = ''
+                offset = lineEnd + 1
+            chunkIndex += 1
+            offset = 0
+        if carry:
+            self.position = (chunkIndex, 0)
+            yield carry
+
+    def records(self):
+        if self.job.format == 'csv':
+            rows = (row for row in csv.reader(self.lines()) if any(cell.strip() for cell in row))
+        else:
+            rows = (line for line in self.lines() if line.strip())
+        for row in rows:
+            self.rowNumber += 1
+            try:
+                if self.job.format == 'csv':
+                    if len(row) > len(self.job.fieldNames):
+                        raise ValueError('the row has more cells than the header')
+                    record = dict(zip(self.job.fieldNames, [cell.decode('utf-8') for cell in row]))
+                else:
+                    record = json.loads(row)
+                    if not isinstance(record, dict):
+                        raise ValueError('each line must hold a JSON object')
+                yield self.rowNumber, importRecord(self.job.kind, record), None
+            except (ValueError, UnicodeDecodeError) as error:
+                yield self.rowNumber, None, str(error)
+
+'''helper function to keep the writable fields of an import record, dropping the read-only ones an export carries'''
+def importRecord(kind, record):
+    unknown = [field for field in record if field not in BULK_FIELDS[kind]]
+    if unknown:
+        raise ValueError('unknown fields: ' + ', '.join(sorted(unknown)))
+    if kind == 'resources':
+        return dict((field, value) for field, value in record.items() if field in RESOURCE_WRITABLE_FIELDS)
+    record = dict((field, value) for field, value in record.items()
+                  if field in RESERVATION_WRITABLE_FIELDS or field == 'resource_PrimaryKey')
+    if isinstance(record.get('reservation_Duration'), basestring):
+        record['reservation_Duration'] = int(record['reservation_Duration'])
+    if 'resource_PrimaryKey' in record:
+        record['resource_PrimaryKey'] = unicode(record['resource_PrimaryKey'])
+    return record
+
+'''helper function to count a failed row, keeping the first IMPORT_MAX_ERRORS messages'''
+def recordImportError(job, rowNumber, message):
+    job.failed += 1
+    if len(job.errors) < IMPORT_MAX_ERRORS:
+        job.errors = job.errors + [[rowNumber, message]]
+
+'''helper function to write the valid resources of a batch with one put_multi; the resources a replayed batch already
+wrote are overwritten but not counted in the tag summaries again'''
+def importResources(job, rows):
+    resources = []
+    for (rowNumber, record, error), primaryKey in zip(rows, job.pendingKeys):
+        if error is None:
+            try:
+                resources.append(applyResourceJson(newResource(job.owner, primaryKey), record))
+            except ApiError as apiError:
+                error = apiError.message
+        if error is not None:
+            recordImportError(job, rowNumber, error)
+    existing = ndb.get_multi([resource.key for resource in resources])
+    ndb.put_multi(resources)
+    resourcesImported([resource for resource, found in zip(resources, existing) if found is None])
+    job.imported += len(resources)
+
+'''helper function to book the valid reservations of a batch, batched per resource and day'''
+def importReservations(job, rows):
+    primaryKeys = list(set(record['resource_PrimaryKey'] for rowNumber, record, error in rows
+                           if error is None and record.get('resource_PrimaryKey')))
+    resources = dict((resource.primaryKey, resource) for resource in
+                     getMultiByPrimaryKey(Resource, primaryKeys) if resource is not None)
+    byResource = {}
+    rowNumbers = {}
+    for (rowNumber, record, error), primaryKey in zip(rows, job.pendingKeys):
+        if error is None:
+            resource = resources.get(record.pop('resource_PrimaryKey', None))
+            if resource is None:
+                error = 'Resource not found.'
+            else:
+                try:
+                    reservation = reservationFromJson(record, resource, job.owner)
+                    reservation.key = entityKey(Reservation, primaryKey)
+                    reservation.primaryKey = primaryKey
+                    byResource.setdefault(resource.primaryKey, []).append(reservation)
+                    rowNumbers[primaryKey] = rowNumber
+                except ApiError as apiError:
+                    error = apiError.message
+        if error is not None:
+            recordImportError(job, rowNumber, error)
+    for resourcePrimaryKey, reservations in byResource.items():
+        booked, conflicts = bookReservations(resources[resourcePrimaryKey], reservations, keepKeys=True,
+                                              confirm=False)
+        reservationsImported(resources[resourcePrimaryKey], booked)
+        job.imported += len(booked)
+        for reservation in conflicts:
+            recordImportError(job, rowNumbers[reservation.primaryKey],
+                              'The slot is outside the resource availability or already reserved.')
+    if byResource:
+        availability.availabilityIndex.invalidate()
+
+'''helper function to write one batch of rows and move the checkpoint past it; the keys of the batch are saved
+before writing, so a replay after a failure overwrites the same entities instead of adding new ones'''
+def writeImportBatch(job, rows, position, rowNumber):
+    if len(job.pendingKeys) != len(rows):
+        job.pendingKeys = allocatePrimaryKeys(Resource if job.kind == 'resources' else Reservation, len(rows))
+        job.put()
+    if job.kind == 'resources':
+        importResources(job, rows)
+    else:
+        importReservations(job, rows)
+    job.chunkIndex, job.chunkOffset = position
+    job.rowNumber = rowNumber
+    job.pendingKeys = []
+    job.put()
+
+'''deferred task importing the rows of a job in batches from its checkpoint, re-queueing itself before the task
+deadline; the chunks are deleted once every row is in'''
+def runImport(jobId):
+    job = ImportJob.get_by_id(jobId)
+    if job is None or job.status == 'done':
+        return
+    job.status = 'running'
+    deadline = time.time() + IMPORT_TASK_SECONDS
+    reader = ImportReader(job)
+    rows = []
+    try:
+        for row in reader.records():
+            rows.append(row)
+            if len(rows) == IMPORT_BATCH_SIZE:
+                writeImportBatch(job, rows, reader.position, reader.rowNumber)
+                rows = []
+                if time.time() > deadline:
+                    deferred.defer(runImport, jobId)
+                    return
+    except csv.Error as error:
+        job.status = 'failed'
+        recordImportError(job, reader.rowNumber + 1, 'The CSV file cannot be parsed: %s' % error)
+        job.put()
+        return
+    if rows:
+        writeImportBatch(job, rows, reader.position, reader.rowNumber)
+    job.status = 'done'
+    job.put()
+    ndb.delete_multi([importChunkKey(job.key, chunkIndex) for chunkIndex in range(job.chunkCount)])
+
+'''a bulk export of resources or reservations, written by a task a page at a time into ExportChunk children; the job
+keeps the cursor of the next page, so a task that stops or fails resumes after the last written page'''
+class ExportJob(ndb.Model):
+    owner = ndb.StringProperty(indexed=True)
+    kind = ndb.StringProperty(indexed=False)
+    format = ndb.StringProperty(indexed=False)
+    allOwners = ndb.BooleanProperty(indexed=False, default=False)
+    cursor = ndb.StringProperty(indexed=False)
+    chunkCount = ndb.IntegerProperty(indexed=False, default=0)
+    rowCount = ndb.IntegerProperty(indexed=False, default=0)
+    status = ndb.StringProperty(indexed=False, default='queued')
+    created = ndb.DateTimeProperty(auto_now_add=True)
+    updated = ndb.DateTimeProperty(auto_now=True)
+
+'''one page of an export file, keyed by its position under the job; the file is its chunks in order'''
+class ExportChunk(ndb.Model):
+    data = ndb.BlobProperty(compressed=True)
+
+'''helper function to get the key of a chunk of an export job'''
+def exportChunkKey(jobKey, chunkIndex):
+    return ndb.Key(ExportChunk, chunkIndex + 1, parent=jobKey)
+
+'''helper function to start an export job of the resources or reservations of an owner, or of every resource'''
+def createExportJob(owner, kind, fileFormat, allOwners=False):
+    if kind not in BULK_FIELDS:
+        raise ApiError(400, 'kind must be resources or reservations.')
+    if fileFormat not in ('csv', 'jsonl'):
+        raise ApiError(400, 'format must be csv or jsonl.')
+    job = ExportJob(owner=owner, kind=kind, format=fileFormat, allOwners=allOwners and kind == 'resources')
+    job.put()
+    deferred.defer(runExport, job.key.id())
+    return job
+
+'''helper function to build the query of an export job, in primaryKey order so its cursor stays valid'''
+def exportQuery(job):
+    if job.kind == 'resources':
+        query = Resource.query()
+        if not job.allOwners:
+            query = query.filter(Resource.resource_Owner == job.owner)
+        return query.order(Resource.primaryKey)
+    return Reservation.query(Reservation.reservation_Owner == job.owner).order(Reservation.primaryKey)
+
+'''helper function to write entities as CSV or JSONL, a CSV file starting with its header row'''
+def exportRows(entities, fields, fileFormat, header=False):
+    parts = []
+    if fileFormat == 'csv':
+        writer = csv.writer(ExportSink(parts.append))
+        if header:
+            writer.writerow(fields)
+    for entity in entities:
+        item = apiEntity(entity, fields)
+        if fileFormat == 'csv':
+            cells = [';'.join(item[field]) if isinstance(item[field], list) else item[field] for field in fields]
+            writer.writerow([cell.encode('utf-8') if isinstance(cell, unicode) else
+                             ('' if cell is None else cell) for cell in cells])
+        else:
+            parts.append(json.dumps(item, sort_keys=True) + '\n')
+    return ''.join(parts)
+
+'''file-like adapter handing csv.writer output to a write function'''
+class ExportSink(object):
+    def __init__(self, write):
+        self.write = write
+
+'''helper function to write one page as the next chunk and move the checkpoint past it; the chunk is written first
+under the position the job records, so a replay after a failure overwrites it instead of adding another'''
+def writeExportPage(job, entities, nextCursor, more):
+    if job.kind != 'resources':
+        attachResourceNames(entities)
+    data = exportRows(entities, BULK_FIELDS[job.kind], job.format, header=job.chunkCount == 0)
+    ExportChunk(key=exportChunkKey(job.key, job.chunkCount), data=data).put()
+    job.chunkCount += 1
+    job.rowCount += len(entities)
+    job.cursor = nextCursor.urlsafe() if more and nextCursor else None
+    if job.cursor is None:
+        job.status = 'done'
+    job.put()
+
+'''deferred task exporting the pages of a job from its checkpoint, EXPORT_PAGE_SIZE entities to a chunk, re-queueing
+itself before the task deadline'''
+def runExport(jobId):
+    job = ExportJob.get_by_id(jobId)
+    if job is None or job.status == 'done':
+        return
+    job.status = 'running'
+    deadline = time.time() + EXPORT_TASK_SECONDS
+    query = exportQuery(job)
+    while job.status != 'done':
+        if time.time() > deadline:
+            job.put()
+            deferred.defer(runExport, jobId)
+            return
+        entities, nextCursor, more = query.fetch_page(
+            EXPORT_PAGE_SIZE, start_cursor=Cursor(urlsafe=job.cursor) if job.cursor else None)
+        writeExportPage(job, entities, nextCursor, more)
+
+'''helper function to delete an export job and its chunks'''
+def deleteExportJob(jobKey):
+    ndb.delete_multi(ExportChunk.query(ancestor=jobKey).fetch(keys_only=True) + [jobKey])
+
+'''cron class deleting the export jobs older than EXPORT_KEEP_HOURS with their files'''
+class PruneExports(webapp2.RequestHandler):
+    def get(self):
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(hours=EXPORT_KEEP_HOURS)
+        pruneMatching(ExportJob.query(ExportJob.created < cutoff), deleteExportJob)
+
+'''API class to upload a CSV or JSONL file for import'''
+class ApiImport(ApiHandler):
+    def post(self):
+        upload = self.request.POST.get('file')
+        if hasattr(upload, 'file'):
+            stream = upload.file
+            fileName = upload.filename or ''
+        else:
+            stream = self.request.body_file
+            fileName = ''
+        fileFormat = self.request.get('format') or ('csv' if fileName.lower().endswith('.csv') else 'jsonl')
+        job = createImportJob(self.email, self.request.get('kind'), fileFormat, stream)
+        self.response.headers['Location'] = '/api/v1/import/%d' % job.key.id()
+        self.writeJson(importJobItem(job), status=202)
+
+'''API class to report the progress of an import job of the caller'''
+class ApiImportJob(ApiHandler):
+    def get(self, jobId):
+        job = ImportJob.get_by_id(int(jobId))
+        if job is None or job.owner != self.email:
+            raise ApiError(404, 'Import job not found.')
+        self.writeJson(importJobItem(job))
+
+'''helper function to describe an import job as JSON'''
+def importJobItem(job):
+    return {
+        'job': job.key.id(),
+        'kind': job.kind,
+        'format': job.format,
+        'status': job.status,
+        'rowsRead': job.rowNumber,
+        'imported': job.imported,
+        'failed': job.failed,
+        'errors': job.errors,
+    }
+
+'''API class to start an export of the caller's resources or reservations, or of every resource for admins with
+owner=all, as CSV or JSONL; the reply points at the job, which lists the parts of the file once it is written'''
+class ApiExport(ApiHandler):
+    def post(self):
+        allOwners = self.request.get('owner') == 'all' and users.is_current_user_admin()
+        job = createExportJob(self.email, self.request.get('kind') or 'resources', self.request.get('format') or 'jsonl',
+                              allOwners)
+        self.response.headers['Location'] = '/api/v1/export/%d' % job.key.id()
+        self.writeJson(exportJobItem(job), status=202)
+
+'''helper function to load an export job of the caller'''
+def getExportJob(jobId, email):
+    job = ExportJob.get_by_id(int(jobId))
+    if job is None or job.owner != email:
+        raise ApiError(404, 'Export job not found.')
+    return job
+
+'''API class to report the progress of an export job of the caller'''
+class ApiExportJob(ApiHandler):
+    def get(self, jobId):
+        self.writeJson(exportJobItem(getExportJob(jobId, self.email)))
+
+'''API class to download one part of a finished export; the parts joined in order make up the file'''
+class ApiExportPart(ApiHandler):
+    def get(self, jobId, part):
+        job = getExportJob(jobId, self.email)
+        if job.status != 'done' or not 1 <= int(part) <= job.chunkCount:
+            raise ApiError(404, 'Export part not found.')
+        chunk = exportChunkKey(job.key, int(part) - 1).get()
+        self.response.headers['Content-Type'] = 'text/csv; charset=utf-8' if job.format == 'csv' else 'application/x-ndjson'
+        self.response.headers['Content-Disposition'] = 'attachment; filename="%s-%s.%s"' % (job.kind, part, job.format)
+        self.response.write(chunk.data)
+
+'''helper function to describe an export job as JSON, with the URLs of its parts once it is done'''
+def exportJobItem(job):
+    return {
+        'job': job.key.id(),
+        'kind': job.kind,
+        'format': job.format,
+        'status': job.status,
+        'rows': job.rowCount,
+        'parts': (['/api/v1/export/%d/%d' % (job.key.id(), part) for part in range(1, job.chunkCount + 1)]
+                  if job.status == 'done' else []),
+    }
+# [END bulk]
@@ -0,0 +1,489 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''The HTML pages, the feeds and the search handlers.'''
+
+import json
+import calendar
+import datetime
+from email.utils import formatdate, parsedate_tz, mktime_tz
+
+from google.appengine.api import users
+from google.appengine.api import memcache
+from google.appengine.api import datastore_errors
+from google.appengine.ext import ndb
+
+import webapp2
+
+from resourceShare.settings import (FEED_CACHE_MAX_BYTES, FEED_CACHE_PREFIX, NAME_SEARCH_LIMIT, NAME_SUGGEST_LIMIT,
+                                    RESERVATION_RULE_FIELDS, RULE_KIND, SITE_TIMEZONE, TAG_CLOUD_SIZE, localNow)
+from resourceShare.model.lookup import canonicalPrimaryKey, getByPrimaryKey, getMultiByPrimaryKey, isAllocatedPrimaryKey
+from resourceShare.rendering import renderFragment, renderTemplate
+from resourceShare.model.reservations import Reservation, toMinutes, toTimeString
+from resourceShare.model.counter import attachReservationCounts
+from resourceShare.model.resources import (Resource, attachResourceNames, capTags, fetchResourcePage, fetchTagPage,
+                                           fetchUserResourcePage, newResource, normalizeTag, searchResourcesByName,
+                                           splitTags)
+from resourceShare.model.rules import RecurringReservation, getReservationOfKind
+from resourceShare.model.tags import TagSummary, saveResource
+from resourceShare.feed import feedReservations, generateFeed, getFeedVersion
+from resourceShare.booking.upcoming import readUpcoming, resourceUpcomingKey, upcomingDays, userUpcomingKey
+from resourceShare.booking.bookings import ReservationConflict, bookReservation, cancelReservation
+from resourceShare.booking.recurrence import bookRecurrence, deleteRecurrence
+from resourceShare.booking.effects import (recurrenceBooked, recurrenceCancelled, reservationsBooked,
+                                           reservationsCancelled, resourceSaved)
+from resourceShare import availability
+
+'''helper function to build the template values of the All Resources table fragment'''
+def allResourcesValues(urlsafeCursor):
+    resources, nextCursor = fetchResourcePage(urlsafeCursor)
+    attachReservationCounts(resources)
+    return {'resources': resources, 'nextCursor': nextCursor}
+# [START main_page]
+'''Main class to handel the landing page'''
+class MainPage(webapp2.RequestHandler):
+
+    def get(self):
+        user = users.get_current_user()
+        showFull = True
+        keyVal = self.request.get('keyVal')
+        if(len(keyVal) > 1):
+            showFull = False
+        if user:
+            url = users.create_logout_url(self.request.uri)
+            url_linktext = 'Logout'
+        else:
+            url = users.create_login_url(self.request.uri)
+            url_linktext = 'Login'
+        email = user.email()
+        userResources, userResourcesCursor = fetchUserResourcePage(email, self.request.get('mineCursor'))
+        userReservations = readUpcoming(
+            [userUpcomingKey(email, day) for day in upcomingDays()],
+            RecurringReservation.query(RecurringReservation.reservation_Owner == email,
+                                       RecurringReservation.untilDate >= localNow().date()))
+        allResourcesTable = None
+        if showFull:
+            cursor = self.request.get('cursor')
+            allResourcesTable = renderFragment('allResourcesTable.html', cursor, lambda: allResourcesValues(cursor))
+        attachReservationCounts(userResources)
+        template_values = {
+            'user': user,
+            'allResourcesTable': allResourcesTable,
+            'userResources': userResources,
+            'userResourcesCursor': userResourcesCursor,
+            'keyVal': keyVal,
+            'userReservations': userReservations,
+            'url': url,
+            'url_linktext': url_linktext,
+            'username' : user.nickname().split("@")[0],
+            'showFull':showFull,
+        }
+        renderTemplate(self.response, 'index.html', template_values)
+# [END main_page]
+
+# [START AddResource]
+''' Class to handel addition of resources'''   
+class AddResource(webapp2.RequestHandler):
+    def post(self):
+        user = users.get_current_user()
+        if user:
+            resource = newResource(str(user.email()))
+            resource.resource_Name = self.request.get('resourceName')
+            resource.resource_StartTime = self.request.get('startTime')
+            resource.resource_EndTime = self.request.get('endTime')
+            resource.resource_Duration = toMinutes(resource.resource_EndTime) - toMinutes(resource.resource_StartTime)
+            resource.resource_tag = capTags(splitTags(self.request.get('tags')))
+            saveResource(resource, [])
+            resourceSaved(resource)
+            self.redirect('/')
+        
+    def get(self):
+        user = users.get_current_user()
+        url = users.create_logout_url(self.request.uri)
+        url_linktext = 'Logout'
+        template_values = {
+            'user': user,
+            'username' : user.nickname().split("@")[0],
+            'url': url,
+            'url_linktext': url_linktext,
+            }
+        renderTemplate(self.response, 'newResource.html', template_values)
+# [END AddResource]
+
+# [START AddReservation]
+'''class to handel adding a new reservation requests'''
+class AddReservation(webapp2.RequestHandler):
+    def post(self):
+        user = users.get_current_user()
+        if user:
+            resource = getByPrimaryKey(Resource, self.request.get('resourcePrimaryKey'))
+            if resource is None:
+                self.abort(404)
+            reservation = Reservation()
+            reservation.resource_PrimaryKey = resource.primaryKey
+            reservation.reservation_StartTime = self.request.get('startTime')
+            reservation.reservation_Notes = self.request.get('notes')
+            reservation.reservation_Owner = str(user.email())
+            reservation.reservation_Duration = int(self.request.get('duration'))
+            reservation.reservation_EndTime = toTimeString(toMinutes(reservation.reservation_StartTime) + reservation.reservation_Duration)
+            reservation.reservation_Date = localNow().date()
+            if self.request.get('repeat'):
+                rule = RecurringReservation(**reservation.to_dict(include=RESERVATION_RULE_FIELDS))
+                rule.startDate = reservation.reservation_Date
+                try:
+                    rule.frequency = self.request.get('repeat')
+                    rule.untilDate = datetime.datetime.strptime(self.request.get('until'), '%Y-%m-%d').date()
+                    conflicts = bookRecurrence(resource, rule)
+                except (ValueError, datastore_errors.BadValueError):
+                    conflicts = [rule.startDate]
+                if conflicts:
+                    self.redirect('/addReservation?keyVal=' + str(resource.primaryKey) + '&conflict=1')
+                    return
+                recurrenceBooked(resource, rule)
+                self.redirect('/')
+                return
+            try:
+                bookReservation(resource, reservation)
+            except ReservationConflict:
+                self.redirect('/addReservation?keyVal=' + str(resource.primaryKey) + '&conflict=1')
+                return
+            reservationsBooked(resource, [reservation])
+        self.redirect('/')
+        
+    def get(self):
+        user = users.get_current_user()
+        url = users.create_logout_url(self.request.uri)
+        keyVal = self.request.get('keyVal')
+        reservingResource = getByPrimaryKey(Resource, keyVal)
+        if reservingResource is None:
+            self.abort(404)
+        url_linktext = 'Logout'
+        template_values = {
+            'user': user,
+            'username' : user.nickname().split("@")[0],
+            'reservingResource':reservingResource.resource_Name,
+            'reservingResourceDetails':[reservingResource],
+            'reservingResourceKey': reservingResource.primaryKey,
+            'conflict': self.request.get('conflict') == '1',
+            'url': url,
+            'url_linktext': url_linktext,
+            }
+        renderTemplate(self.response, 'newReservation.html', template_values)
+# [END AddReservation]
+
+# [START ViewResource]
+'''class to handel viewing of a resource requests'''
+class ViewResource(webapp2.RequestHandler):
+    def post(self):
+        user = users.get_current_user()
+        if user:
+            resource = Resource()            
+            resource.resource_Name = self.request.get('resourceName')
+            resource.resource_StartTime = self.request.get('startTime')
+            resource.resource_EndTime = self.request.get('endTime')
+            resource.resource_tag = self.request.get('tags')
+            resource.resource_Owner = str(user.email())
+            resource.put()
+        url = users.create_logout_url(self.request.uri)
+        url_linktext = 'Logout'
+        template_values = {
+            'isSuccess': '1',
+            'user': user,
+            'username' : user.nickname().split("@")[0],
+            'url': url,
+            'url_linktext': url_linktext,
+            }
+        renderTemplate(self.response, 'newResource.html', template_values)
+        
+    def get(self):
+        user = users.get_current_user()
+        isEditable = False
+        keyVal = self.request.get('keyVal')
+        # print keyVal
+        # print user.email()
+        resource = getByPrimaryKey(Resource, keyVal)
+        if resource is None:
+            self.abort(404)
+        outputResource = [resource]
+        # print outputResource[0].resource_Owner
+        upcomingReservations = readUpcoming(
+            [resourceUpcomingKey(resource.primaryKey, day) for day in upcomingDays()],
+            RecurringReservation.query(RecurringReservation.resource_PrimaryKey == resource.primaryKey,
+                                       RecurringReservation.untilDate >= localNow().date()))
+        if str(outputResource[0].resource_Owner) == str(user.email()):
+            isEditable = True
+        # print isEditable
+        url = users.create_logout_url(self.request.uri)
+        url_linktext = 'Logout'
+        # print outputResource
+        template_values = {
+            'isEditable': isEditable,
+            'outputResource': outputResource,
+            'upcomingReservations':upcomingReservations,
+            'user': user,
+            'username' : user.nickname().split("@")[0],
+            'url': url,
+            'url_linktext': url_linktext,
+        }
+        renderTemplate(self.response, 'viewResource.html', template_values)
+# [END ViewResource]
+
+# [START ViewReservation]
+''' class to handel viewing more details of a reservation'''
+class ViewReservation(webapp2.RequestHandler):
+    def post(self):
+        user = users.get_current_user()
+        if user:
+            resource = Resource()            
+            resource.resource_Name = self.request.get('resourceName')
+            resource.resource_StartTime = self.request.get('startTime')
+            resource.resource_EndTime = self.request.get('endTime')
+            resource.resource_tag = self.request.get('notes')
+            resource.resource_Owner = str(user.email())
+            resource.put()
+        url = users.create_logout_url(self.request.uri)
+        url_linktext = 'Logout'
+        template_values = {
+            'isSuccess': '1',
+            'user': user,
+            'username' : user.nickname().split("@")[0],
+            'url': url,
+            'url_linktext': url_linktext,
+            }
+        renderTemplate(self.response, 'newResource.html', template_values)
+        
+    def get(self):
+        user = users.get_current_user()
+        isEditable = False
+        keyVal = self.request.get('keyVal')
+        # print keyVal
+        # print user.email()
+        reservation = getReservationOfKind(self.request.get('kind'), keyVal)
+        if reservation is None:
+            self.abort(404)
+        outputReservation = attachResourceNames([reservation])
+        # print outputResource[0].resource_Owner
+        if str(outputReservation[0].reservation_Owner) == str(user.email()):
+            isEditable = True
+        url = users.create_logout_url(self.request.uri)
+        url_linktext = 'Logout'
+        # print outputReservation
+        template_values = {
+            'isEditable': isEditable,
+            'outputReservation': outputReservation,
+            'user': user,
+            'username' : user.nickname().split("@")[0],
+            'url': url,
+            'url_linktext': url_linktext,
+        }
+        renderTemplate(self.response, 'viewReservation.html', template_values)
+# [END ViewReservation]
+
+# [START EditResource]
+'''class to handel the edit resource post requests'''        
+class EditResource(webapp2.RequestHandler):
+    def post(self):
+        user = users.get_current_user()
+        if user:
+            resource = getByPrimaryKey(Resource, self.request.get('resourceKey'))
+            if resource is None:
+                self.abort(404)
+            rquery = [resource]
+            oldTags = list(rquery[0].resource_tag)
+            rquery[0].resource_Name = self.request.get('resourceName')
+            rquery[0].resource_StartTime = self.request.get('startTime')
+            rquery[0].resource_EndTime = self.request.get('endTime')
+            rquery[0].resource_Duration = toMinutes(rquery[0].resource_EndTime) - toMinutes(rquery[0].resource_StartTime)
+            rquery[0].resource_tag = capTags(splitTags(self.request.get('tags')))
+            saveResource(rquery[0], oldTags)
+            resourceSaved(rquery[0])
+            
+        self.redirect('/')
+# [END EditResource]
+
+# [START DeleteReservation]
+'''class to handel delete a reservation post request; a recurring reservation is cancelled with all its occurrences'''  
+class DeleteReservation(webapp2.RequestHandler):
+    def post(self):
+        user = users.get_current_user()
+        if user:
+            reservationKind = self.request.get('reservationKind')
+            reservation = getReservationOfKind(reservationKind, self.request.get('reservationKey'))
+            if reservation is None:
+                self.abort(404)
+            if reservationKind != RULE_KIND:
+                reservationsCancelled(cancelReservation(reservation))
+            elif deleteRecurrence(reservation):
+                recurrenceCancelled(reservation)
+        self.redirect('/')
+# [END DeleteReservation]
+
+# [START Tags]
+'''class to handel the get request for showing the resources in a tag: the newest ones from the tag summary, or with
+all=1 every one a page at a time'''        
+class Tags(webapp2.RequestHandler):
+    def get(self):
+        user = users.get_current_user()
+        tagName = self.request.get('tag')
+        tagresources = [];
+        tagSummary = None
+        nextCursor = None
+        showAll = bool(self.request.get('all') or self.request.get('cursor'))
+        normalizedTag = normalizeTag(tagName)
+        if normalizedTag:
+            tagSummary = TagSummary.get_by_id(normalizedTag)
+            if showAll:
+                tagresources, nextCursor = fetchTagPage(normalizedTag, self.request.get('cursor'))
+            elif tagSummary is not None:
+                tagresources = [resource for resource in getMultiByPrimaryKey(Resource, tagSummary.recentResources)
+                                if resource is not None]
+            attachReservationCounts(tagresources)
+        tagCloud = renderFragment('tagCloud.html', '', lambda: {
+            'tagCloud': TagSummary.query().order(-TagSummary.count).fetch(TAG_CLOUD_SIZE)})
+        url = users.create_logout_url(self.request.uri)
+        url_linktext = 'Logout'
+        template_values = {
+            'user': user,
+            'username' : user.nickname().split("@")[0],
+            'url': url,
+            'url_linktext': url_linktext,
+            'tagName':tagName,
+            'tagResources': tagresources,
+            'tagSummary': tagSummary,
+            'showAll': showAll,
+            'nextCursor': nextCursor,
+            'tagCloud': tagCloud,
+        }
+        renderTemplate(self.response, 'tag.html', template_values)
+# [END Tags]
+
+# [START Feed]
+'''class to serve the reservations of a resource as an RSS feed that readers can poll'''
+class Feed(webapp2.RequestHandler):
+    def get(self):
+        pkey = self.request.get('keyVal')
+        if not pkey:
+            self.abort(404)
+        if not isAllocatedPrimaryKey(pkey):
+            primaryKey = canonicalPrimaryKey(Resource, pkey)
+            if primaryKey != pkey:
+                self.redirect('/feed?keyVal=' + primaryKey, permanent=True)
+                return
+        resource = getByPrimaryKey(Resource, pkey)
+        if resource is None:
+            self.abort(404)
+        # the feed starts at today, so it changes at midnight as well as on every write
+        today = localNow().date()
+        version = getFeedVersion(pkey)
+        etag = '"%s-%s-%s"' % (pkey, version, today.isoformat())
+        lastModified = max(int(float(version)), calendar.timegm(
+            SITE_TIMEZONE.localize(datetime.datetime.combine(today, datetime.time())).utctimetuple()))
+        self.response.headers['ETag'] = etag
+        self.response.headers['Last-Modified'] = formatdate(lastModified, usegmt=True)
+        self.response.headers['Cache-Control'] = 'no-cache'
+        ifNoneMatch = self.request.headers.get('If-None-Match')
+        ifModifiedSince = self.request.headers.get('If-Modified-Since')
+        if ifNoneMatch:
+            notModified = etag in [tag.strip() for tag in ifNoneMatch.split(',')] or ifNoneMatch.strip() == '*'
+        elif ifModifiedSince:
+            parsed = parsedate_tz(ifModifiedSince)
+            notModified = parsed is not None and lastModified <= mktime_tz(parsed)
+        else:
+            notModified = False
+        if notModified:
+            self.response.status_int = 304
+            return
+        self.response.headers['Content-Type'] = 'application/rss+xml; charset=utf-8'
+        cacheKey = FEED_CACHE_PREFIX + pkey + ':' + version + ':' + today.isoformat()
+        cached = memcache.get(cacheKey)
+        if cached is not None:
+            self.response.write(cached)
+            return
+        body = ''.join(part.encode('utf-8') if isinstance(part, unicode) else part
+                       for part in generateFeed(resource, self.request.host_url, version))
+        self.response.write(body)
+        if len(body) <= FEED_CACHE_MAX_BYTES:
+            memcache.set(cacheKey, body)
+# [END Feed]
+
+# [START RSS]
+'''class to show the RSS code for a particular resource'''
+class RSS(webapp2.RequestHandler):
+    def get(self):
+        user = users.get_current_user()
+        pkey = self.request.get('keyVal')
+        rssResource = getByPrimaryKey(Resource, pkey)
+        if rssResource is None:
+            self.abort(404)
+        selectedReservations = attachResourceNames(feedReservations(rssResource))
+        #print rssResource
+        #print selectedReservations
+        url = users.create_logout_url(self.request.uri)
+        url_linktext = 'Logout'
+        template_values = {
+            'user': user,
+            'username' : user.nickname().split("@")[0],
+            'url': url,
+            'url_linktext': url_linktext,
+            'selectedReservations': selectedReservations,
+            'resource': rssResource,
+        }
+        renderTemplate(self.response, 'rss.html', template_values)
+# [END RSS]
+
+class Search(webapp2.RequestHandler):
+    def get(self):
+        user = users.get_current_user()
+        searchString = self.request.get('name')
+        ty=self.request.get('type')
+        #print searchString
+        #print ty
+        selectedResources = [];
+        final=""
+        if ty=="name":
+            selectedResources = searchResourcesByName(searchString, NAME_SEARCH_LIMIT)
+        if ty=="time":
+            start = toMinutes(self.request.get('startTime'))
+            end = start + int(self.request.get('duration'))
+            final = toTimeString(end)
+            freeKeys = availability.availabilityIndex.freeResources(start, end)
+            selectedResources = [resource for resource in ndb.get_multi(freeKeys) if resource is not None]
+        attachReservationCounts(selectedResources)
+        url = users.create_logout_url(self.request.uri)
+        url_linktext = 'Logout'
+        template_values = {
+            'user': user,
+            'username' : user.nickname().split("@")[0],
+            'url': url,
+            'url_linktext': url_linktext,
+            'selectedResources': selectedResources,
+            'searchString':searchString,
+            'startTime':self.request.get('startTime'),
+            'endTime':final,
+            'type':ty,
+        }
+        renderTemplate(self.response, 'search.html', template_values)
+
+'''class to answer typeahead requests for resource names with JSON'''
+class SuggestResource(webapp2.RequestHandler):
+    def get(self):
+        suggestions = []
+        for resource in searchResourcesByName(self.request.get('q'), NAME_SUGGEST_LIMIT):
+            suggestions.append({
+                'name': resource.resource_Name,
+                'primaryKey': resource.primaryKey,
+                'url': '/viewResource?keyVal=' + str(resource.primaryKey),
+            })
+        self.response.headers['Content-Type'] = 'application/json'
+        self.response.write(json.dumps(suggestions))
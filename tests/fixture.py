@@ -0,0 +1,127 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''The test bed the tests and the benchmarks share.
+
+Needs the App Engine SDK on PYTHONPATH and WebTest installed. setUpStubs starts
+every stub the app talks to, signed in as an admin so X-Perf headers are
+answered, and resetInstance gives the in-process state of the app the state of
+a fresh instance. StubTestCase does both around every test.'''
+
+import datetime
+import json
+import os
+import unittest
+
+from google.appengine.datastore import datastore_stub_util
+from google.appengine.ext import deferred
+from google.appengine.ext import testbed
+from google.appengine.ext.ndb import tasklets
+import webtest
+
+import resourceShare
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OWNER = 'test@example.com'
+
+'''helper function to start every stub the app talks to, signed in as email and as an admin'''
+def setUpStubs(email=OWNER):
+    bed = testbed.Testbed()
+    bed.activate()
+    bed.setup_env(USER_EMAIL=email, USER_ID='1', USER_IS_ADMIN='1', overwrite=True)
+    bed.init_datastore_v3_stub(consistency_policy=datastore_stub_util.PseudoRandomHRConsistencyPolicy(probability=1))
+    bed.init_memcache_stub()
+    bed.init_taskqueue_stub(root_path=APP_DIR)
+    bed.init_user_stub()
+    bed.init_mail_stub()
+    resourceShare.installRpcHooks()
+    return bed
+
+'''helper function to start a new NDB context, as every request on App Engine gets'''
+def freshContext():
+    tasklets.set_context(tasklets.make_default_context())
+
+'''helper function to give the in-process state of the app the state of a fresh instance, after setUpStubs gave it
+empty stubs'''
+def resetInstance():
+    freshContext()
+    resourceShare.model.lookup.keyAllocator = resourceShare.KeyAllocator()
+    resourceShare.model.lookup.lookupStats = resourceShare.LookupStats()
+    resourceShare.availability.availabilityIndex = resourceShare.AvailabilityIndex()
+
+'''helper function to request a page in a fresh NDB context with the X-Perf-Debug and API headers set'''
+def send(client, method, url, body=None):
+    freshContext()
+    headers = {'X-Perf-Debug': '1', resourceShare.API_CSRF_HEADER: 'test'}
+    if isinstance(body, tuple) and body[0] == 'json':
+        return client.request(url, method=method, body=json.dumps(body[1]), headers=dict(headers, **{
+            'Content-Type': 'application/json'}), expect_errors=True)
+    if isinstance(body, tuple):
+        return client.request(url, method=method, body=body[1], headers=headers, expect_errors=True)
+    if method == 'POST':
+        return client.post(url, body or {}, headers=headers, expect_errors=True)
+    return client.request(url, method=method, headers=headers, expect_errors=True)
+
+'''helper function to run the tasks queued on a queue, deferred ones included, until none is left'''
+def runTasks(bed, queueName='default'):
+    stub = bed.get_stub(testbed.TASKQUEUE_SERVICE_NAME)
+    while True:
+        tasks = stub.get_filtered_tasks(queue_names=[queueName])
+        if not tasks:
+            return
+        stub.FlushQueue(queueName)
+        for task in tasks:
+            if task.url == '/_ah/queue/deferred':
+                deferred.run(task.payload)
+
+'''base class of the tests: fresh stubs and a fresh instance around every test, and helpers to store resources and
+book reservations through the code paths the app uses'''
+class StubTestCase(unittest.TestCase):
+    def setUp(self):
+        self.bed = setUpStubs()
+        resetInstance()
+        self.today = resourceShare.localNow().date()
+        self.tomorrow = self.today + datetime.timedelta(days=1)
+
+    def tearDown(self):
+        self.bed.deactivate()
+
+    def makeResource(self, name='Room', startTime='08:00', endTime='20:00', tags=(), owner=OWNER):
+        resource = resourceShare.applyResourceJson(resourceShare.newResource(owner), {
+            'resource_Name': name, 'resource_StartTime': startTime, 'resource_EndTime': endTime,
+            'resource_tag': list(tags)})
+        resourceShare.saveResource(resource, [])
+        resourceShare.resourceSaved(resource)
+        return resource
+
+    def makeReservation(self, resource, startTime, duration, day=None, owner=OWNER):
+        return resourceShare.reservationFromJson({
+            'reservation_StartTime': startTime, 'reservation_Duration': duration,
+            'reservation_Date': (day or self.tomorrow).isoformat()}, resource, owner)
+
+    def book(self, resource, startTime, duration, day=None, owner=OWNER):
+        reservation = self.makeReservation(resource, startTime, duration, day, owner)
+        resourceShare.bookReservation(resource, reservation)
+        resourceShare.reservationsBooked(resource, [reservation])
+        return reservation
+
+    def makeRule(self, resource, startTime, duration, frequency='WEEKLY', untilDays=28, owner=OWNER, **fields):
+        data = dict({'reservation_StartTime': startTime, 'reservation_Duration': duration, 'frequency': frequency,
+                     'startDate': self.tomorrow.isoformat(),
+                     'untilDate': (self.tomorrow + datetime.timedelta(days=untilDays)).isoformat()}, **fields)
+        return resourceShare.recurrenceFromJson(data, resource, owner)
+
+    def client(self, strict=True):
+        return webtest.TestApp(resourceShare.PerformanceMiddleware(resourceShare.application, resourceShare.RPC_BUDGETS,
+                                                                   strict=strict))
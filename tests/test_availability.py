@@ -0,0 +1,95 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''Checks that the availability engine answers time searches from the bookings and windows the datastore holds.'''
+
+import unittest
+
+import resourceShare
+from tests import fixture
+
+class AvailabilityTest(fixture.StubTestCase):
+    def setUp(self):
+        fixture.StubTestCase.setUp(self)
+        self.resource = self.makeResource('Room', '08:00', '12:00')
+        fixture.runTasks(self.bed)
+
+    def isFree(self, startTime, duration):
+        start = resourceShare.toMinutes(startTime)
+        return self.resource.key in resourceShare.availability.availabilityIndex.freeResources(start, start + duration)
+
+    def testPublishedBookingIsNotFree(self):
+        self.assertTrue(self.isFree('09:00', 30))
+        self.book(self.resource, '09:00', 30, day=self.today)
+        self.assertFalse(self.isFree('09:15', 30))
+        self.assertTrue(self.isFree('09:30', 30))
+
+    def testOutsideTheWindowIsNotFree(self):
+        self.assertFalse(self.isFree('11:45', 30))
+        self.assertFalse(self.isFree('07:30', 60))
+
+    def testBookingLostBeforePublishingIsPutRight(self):
+        self.isFree('09:00', 30)
+        resourceShare.bookReservation(self.resource, self.makeReservation(self.resource, '09:00', 30, self.today))
+        self.assertTrue(self.isFree('09:00', 30))
+        fixture.runTasks(self.bed)
+        self.assertFalse(self.isFree('09:00', 30))
+
+    def testCancellationLostBeforePublishingIsPutRight(self):
+        reservation = self.book(self.resource, '09:00', 30, day=self.today)
+        fixture.runTasks(self.bed)
+        resourceShare.cancelReservations([reservation])
+        self.assertFalse(self.isFree('09:00', 30))
+        fixture.runTasks(self.bed)
+        self.assertTrue(self.isFree('09:00', 30))
+
+    def testRuleOccurringTodayIsNotFree(self):
+        rule = self.makeRule(self.resource, '10:00', 60, frequency='DAILY', startDate=self.today.isoformat())
+        self.assertEqual(resourceShare.bookRecurrence(self.resource, rule), [])
+        resourceShare.recurrenceBooked(self.resource, rule)
+        self.assertFalse(self.isFree('10:30', 15))
+        resourceShare.skipOccurrence(rule, self.today)
+        fixture.runTasks(self.bed)
+        self.assertTrue(self.isFree('10:30', 15))
+
+    def testWindowChangeReachesTheEngine(self):
+        self.isFree('09:00', 30)
+        self.resource.resource_EndTime = '09:00'
+        resourceShare.saveResource(self.resource, list(self.resource.resource_tag))
+        fixture.runTasks(self.bed)
+        self.assertFalse(self.isFree('09:00', 30))
+
+    def testSnapshotMatchesAScan(self):
+        self.book(self.resource, '09:00', 30, day=self.today)
+        resourceShare.buildAvailabilitySnapshot()
+        version, state = resourceShare.readAvailabilitySnapshot(self.today)
+        windows, bookings = state.rows()
+        scannedWindows, scannedBookings = resourceShare.buildAvailabilityState(self.today).rows()
+        self.assertEqual(sorted(windows), sorted(scannedWindows))
+        self.assertEqual(sorted(bookings), sorted(scannedBookings))
+
+    def testWarmupLoadsOnlyAnExistingSnapshot(self):
+        fixture.resetInstance()
+        self.assertFalse(resourceShare.availability.availabilityIndex.loadSnapshot())
+        self.assertIsNone(resourceShare.availability.availabilityIndex.state)
+        self.book(self.resource, '09:00', 30, day=self.today)
+        resourceShare.buildAvailabilitySnapshot()
+        fixture.resetInstance()
+        response = fixture.send(self.client(), 'GET', '/_ah/warmup')
+        self.assertTrue(response.json['availabilitySnapshot'])
+        self.assertIsNotNone(resourceShare.availability.availabilityIndex.state)
+        self.assertFalse(self.isFree('09:00', 30))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''Checks booking and cancelling single reservations: conflicts, the schedule, the count and the upcoming views
+every booking keeps, in the booking functions and through the JSON API.'''
+
+import datetime
+import json
+import unittest
+
+from google.appengine.api import memcache
+
+import resourceShare
+from tests import fixture
+
+class BookingTest(fixture.StubTestCase):
+    def setUp(self):
+        fixture.StubTestCase.setUp(self)
+        self.resource = self.makeResource('Room', startTime='08:00', endTime='20:00')
+
+    def scheduled(self, day=None):
+        fixture.freshContext()
+        schedule = resourceShare.scheduleKey(self.resource.primaryKey, day or self.tomorrow).get()
+        return list(schedule.reservationKeys) if schedule else []
+
+    def count(self):
+        fixture.freshContext()
+        memcache.flush_all()
+        resource = resourceShare.getByPrimaryKey(resourceShare.Resource, self.resource.primaryKey)
+        return resourceShare.attachReservationCounts([resource])[0].reservationCount
+
+    def upcoming(self):
+        fixture.freshContext()
+        return resourceShare.readUpcoming([resourceShare.userUpcomingKey(fixture.OWNER, self.tomorrow),
+                                           resourceShare.resourceUpcomingKey(self.resource.primaryKey, self.tomorrow)])
+
+    def testBookingFillsTheScheduleCountAndUpcomingViews(self):
+        reservation = self.book(self.resource, '09:00', 30)
+        self.assertEqual(reservation.key.get().reservation_Date, self.tomorrow)
+        self.assertEqual(self.scheduled(), [reservation.primaryKey])
+        self.assertEqual(self.count(), 1)
+        entries = self.upcoming()
+        self.assertEqual([entry['primaryKey'] for entry in entries], [reservation.primaryKey] * 2)
+        self.assertEqual(set(entry['resource_Name'] for entry in entries), set(['Room']))
+
+    def testOverlappingReservationConflicts(self):
+        first = self.book(self.resource, '09:00', 30)
+        with self.assertRaises(resourceShare.ReservationConflict):
+            self.book(self.resource, '09:15', 30)
+        following = self.book(self.resource, '09:30', 30)
+        self.assertEqual(self.scheduled(), [first.primaryKey, following.primaryKey])
+        self.assertEqual(self.count(), 2)
+
+    def testSameSlotOnAnotherDayIsFree(self):
+        self.book(self.resource, '09:00', 30)
+        later = self.tomorrow + datetime.timedelta(days=1)
+        reservation = self.book(self.resource, '09:00', 30, day=later)
+        self.assertEqual(self.scheduled(later), [reservation.primaryKey])
+
+    def testReservationOutsideTheWindowConflicts(self):
+        with self.assertRaises(resourceShare.ReservationConflict):
+            self.book(self.resource, '07:30', 60)
+        with self.assertRaises(resourceShare.ReservationConflict):
+            self.book(self.resource, '19:45', 30)
+        self.assertEqual(self.scheduled(), [])
+        self.assertEqual(self.count(), 0)
+
+    def testReservationMeetingARuleOccurrenceConflicts(self):
+        rule = self.makeRule(self.resource, '18:00', 30, frequency='DAILY', untilDays=6)
+        self.assertEqual(resourceShare.bookRecurrence(self.resource, rule), [])
+        with self.assertRaises(resourceShare.ReservationConflict):
+            self.book(self.resource, '18:15', 30)
+        self.book(self.resource, '18:30', 30)
+
+    def testCancellingFreesTheSlot(self):
+        reservation = self.book(self.resource, '09:00', 30)
+        self.assertEqual(resourceShare.cancelReservation(reservation), [reservation])
+        self.assertIsNone(reservation.key.get())
+        self.assertEqual(self.scheduled(), [])
+        self.assertEqual(self.count(), 0)
+        self.assertEqual(self.upcoming(), [])
+        self.book(self.resource, '09:00', 30)
+
+    def testCancellingTwiceCancelsOnce(self):
+        reservation = self.book(self.resource, '09:00', 30)
+        resourceShare.cancelReservation(reservation)
+        self.assertEqual(resourceShare.cancelReservation(reservation), [])
+        self.assertEqual(self.count(), 0)
+
+    def testBatchBooksEachSlotOnceAndReportsTheConflicts(self):
+        reservations = [self.makeReservation(self.resource, startTime, 30) for startTime in ('09:00', '09:15', '10:00')]
+        booked, conflicts = resourceShare.bookReservations(self.resource, reservations)
+        self.assertEqual(booked, [reservations[0], reservations[2]])
+        self.assertEqual(conflicts, [reservations[1]])
+        self.assertEqual(sorted(self.scheduled()), sorted([reservations[0].primaryKey, reservations[2].primaryKey]))
+        self.assertEqual(self.count(), 2)
+
+    def testReplayedBatchKeepingItsKeysBooksOnce(self):
+        reservations = [self.makeReservation(self.resource, startTime, 30) for startTime in ('09:00', '10:00')]
+        resourceShare.assignReservationKeys(reservations)
+        for attempt in range(2):
+            booked, conflicts = resourceShare.bookReservations(self.resource, reservations, keepKeys=True,
+                                                               confirm=False)
+            self.assertEqual(sorted(reservation.primaryKey for reservation in booked),
+                             sorted(reservation.primaryKey for reservation in reservations))
+            self.assertEqual(conflicts, [])
+        self.assertEqual(len(self.scheduled()), 2)
+        self.assertEqual(self.count(), 2)
+
+    def testBatchesOfManyOwnersStayWithinTheirEntityGroups(self):
+        reservations = [self.makeReservation(self.resource, '09:00', 30, owner='user%d@example.com' % index)
+                        for index in range(resourceShare.RESERVATION_BATCH_SIZE)]
+        batches = list(resourceShare.reservationBatches(reservations))
+        self.assertEqual(sum(len(batch) for batch in batches), len(reservations))
+        for batch in batches:
+            owners = set(reservation.reservation_Owner for reservation in batch)
+            self.assertLessEqual(len(batch) + len(owners), resourceShare.RESERVATION_BATCH_SIZE)
+
+class BookingApiTest(fixture.StubTestCase):
+    def setUp(self):
+        fixture.StubTestCase.setUp(self)
+        self.resource = self.makeResource('Room')
+        self.app = self.client(strict=False)
+
+    def reservationJson(self, startTime, duration=30):
+        return {'resource_PrimaryKey': self.resource.primaryKey, 'reservation_StartTime': startTime,
+                'reservation_Duration': duration, 'reservation_Date': self.tomorrow.isoformat()}
+
+    def testBookingAnswersCreatedThenConflict(self):
+        response = fixture.send(self.app, 'POST', '/api/v1/reservations', ('json', self.reservationJson('09:00')))
+        self.assertEqual(response.status_int, 201)
+        created = json.loads(response.body)
+        self.assertEqual(created['resource_Name'], 'Room')
+        self.assertEqual(created['reservation_EndTime'], '09:30')
+        response = fixture.send(self.app, 'POST', '/api/v1/reservations', ('json', self.reservationJson('09:15')))
+        self.assertEqual(response.status_int, 409)
+
+    def testBatchReportsTheOutcomeOfEachItem(self):
+        items = [self.reservationJson(startTime) for startTime in ('09:00', '09:15', '10:00')]
+        response = fixture.send(self.app, 'POST', '/api/v1/reservations/batch', ('json', {'items': items}))
+        self.assertEqual(response.status_int, 200)
+        self.assertEqual([item['status'] for item in json.loads(response.body)['items']],
+                         ['created', 'conflict', 'created'])
+
+    def testBatchDeleteCancelsTheCallersReservations(self):
+        reservation = self.book(self.resource, '09:00', 30)
+        response = fixture.send(self.app, 'POST', '/api/v1/reservations/batchDelete',
+                                ('json', {'keys': [reservation.primaryKey, 'missing']}))
+        self.assertEqual(json.loads(response.body), {'deleted': [reservation.primaryKey], 'notFound': ['missing']})
+        fixture.freshContext()
+        self.assertIsNone(reservation.key.get())
+
+if __name__ == '__main__':
+    unittest.main()
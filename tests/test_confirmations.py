@@ -0,0 +1,61 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''Checks that confirmations are queued by the transactions that store bookings, and only for bookings that stay.'''
+
+import unittest
+
+import resourceShare
+from tests import fixture
+
+class ConfirmationTest(fixture.StubTestCase):
+    def setUp(self):
+        fixture.StubTestCase.setUp(self)
+        self.resource = self.makeResource('Room')
+
+    def pending(self):
+        fixture.runTasks(self.bed, resourceShare.MAIL_QUEUE)
+        return resourceShare.PendingConfirmation.query(ancestor=resourceShare.outboxKey(fixture.OWNER)).fetch()
+
+    def testBookedReservationIsConfirmed(self):
+        reservation = self.book(self.resource, '09:00', 30)
+        pending = self.pending()
+        self.assertEqual([confirmation.resource_PrimaryKey for confirmation in pending], [self.resource.primaryKey])
+        self.assertEqual(pending[0].key.id(), 'reservation:' + reservation.primaryKey)
+
+    def testConflictingReservationIsNotConfirmed(self):
+        self.book(self.resource, '09:00', 30)
+        with self.assertRaises(resourceShare.ReservationConflict):
+            self.book(self.resource, '09:15', 30)
+        self.assertEqual(len(self.pending()), 1)
+
+    def testImportedReservationsAreNotConfirmed(self):
+        reservation = self.makeReservation(self.resource, '09:00', 30)
+        resourceShare.assignReservationKeys([reservation])
+        resourceShare.bookReservations(self.resource, [reservation], keepKeys=True, confirm=False)
+        self.assertEqual(self.pending(), [])
+
+    def testRuleTakenBackIsNotConfirmed(self):
+        self.book(self.resource, '18:00', 30, day=self.tomorrow)
+        rule = self.makeRule(self.resource, '18:00', 30)
+        self.assertEqual(resourceShare.bookRecurrence(self.resource, rule), [self.tomorrow])
+        self.assertEqual(len(self.pending()), 1)
+
+    def testBookedRuleIsConfirmed(self):
+        rule = self.makeRule(self.resource, '18:00', 30)
+        self.assertEqual(resourceShare.bookRecurrence(self.resource, rule), [])
+        self.assertEqual([confirmation.key.id() for confirmation in self.pending()], ['rule:' + rule.primaryKey])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''Checks bulk imports: the rows that import, the rows reported as failed, the tag summaries and schedules they
+update, and the upload and progress API.'''
+
+import json
+import unittest
+from StringIO import StringIO
+
+import resourceShare
+from tests import fixture
+
+RESOURCES_CSV = '\n'.join([
+    'resource_Name,resource_StartTime,resource_EndTime,resource_tag',
+    'Lab A,08:00,18:00,lab;Optics',
+    'Lab B,09:00,17:00,lab',
+    'Backwards,18:00,08:00,lab',
+    ',08:00,18:00,',
+]) + '\n'
+
+class ImportTest(fixture.StubTestCase):
+    def runImport(self, kind, fileFormat, data):
+        job = resourceShare.createImportJob(fixture.OWNER, kind, fileFormat, StringIO(data))
+        fixture.runTasks(self.bed)
+        fixture.freshContext()
+        return job.key.get()
+
+    def reservationLines(self, *records):
+        return ''.join(json.dumps(dict({'reservation_Duration': 30, 'reservation_Date': self.tomorrow.isoformat()},
+                                       **record)) + '\n' for record in records)
+
+    def testResourcesImportWithTheirTags(self):
+        job = self.runImport('resources', 'csv', RESOURCES_CSV)
+        self.assertEqual(job.status, 'done')
+        self.assertEqual((job.rowNumber, job.imported, job.failed), (4, 2, 2))
+        resources = resourceShare.Resource.query(resourceShare.Resource.resource_Owner == fixture.OWNER).fetch()
+        self.assertEqual(sorted(resource.resource_Name for resource in resources), ['Lab A', 'Lab B'])
+        self.assertEqual(resourceShare.TagSummary.get_by_id('lab').count, 2)
+        self.assertEqual(resourceShare.TagSummary.get_by_id('optics').count, 1)
+
+    def testBadRowsAreReportedByNumber(self):
+        job = self.runImport('resources', 'csv', RESOURCES_CSV)
+        self.assertEqual(job.errors, [[3, 'resource_EndTime cannot be before resource_StartTime.'],
+                                      [4, 'resource_Name is required.']])
+
+    def testUnknownColumnIsRefusedBeforeAnyRowIsStored(self):
+        with self.assertRaises(resourceShare.ApiError) as raised:
+            resourceShare.createImportJob(fixture.OWNER, 'resources', 'csv', StringIO('resource_Name,colour\nLab,red\n'))
+        self.assertEqual(raised.exception.status, 400)
+        self.assertEqual(resourceShare.ImportJob.query().fetch(), [])
+        self.assertEqual(resourceShare.ImportChunk.query().fetch(), [])
+
+    def testReservationsAreBookedAndTheirConflictsReported(self):
+        resource = self.makeResource('Room', startTime='08:00', endTime='20:00')
+        job = self.runImport('reservations', 'jsonl', self.reservationLines(
+            {'resource_PrimaryKey': resource.primaryKey, 'reservation_StartTime': '09:00'},
+            {'resource_PrimaryKey': resource.primaryKey, 'reservation_StartTime': '09:15'},
+            {'resource_PrimaryKey': '999999', 'reservation_StartTime': '10:00'},
+            {'resource_PrimaryKey': resource.primaryKey, 'reservation_StartTime': '07:00'}))
+        self.assertEqual(job.status, 'done')
+        self.assertEqual((job.imported, job.failed), (1, 3))
+        conflict = 'The slot is outside the resource availability or already reserved.'
+        self.assertEqual(sorted(job.errors), [[2, conflict], [3, 'Resource not found.'], [4, conflict]])
+        schedule = resourceShare.scheduleKey(resource.primaryKey, self.tomorrow).get()
+        self.assertEqual(len(schedule.reservationKeys), 1)
+
+    def testImportedReservationsQueueNoConfirmations(self):
+        resource = self.makeResource('Room')
+        self.runImport('reservations', 'jsonl', self.reservationLines(
+            {'resource_PrimaryKey': resource.primaryKey, 'reservation_StartTime': '09:00'}))
+        fixture.runTasks(self.bed, resourceShare.MAIL_QUEUE)
+        self.assertEqual(resourceShare.PendingConfirmation.query(
+            ancestor=resourceShare.outboxKey(fixture.OWNER)).fetch(), [])
+
+class ImportApiTest(fixture.StubTestCase):
+    def testUploadAnswersWithTheJobToPoll(self):
+        client = self.client(strict=False)
+        data = '{"resource_Name": "Lab A", "resource_StartTime": "08:00", "resource_EndTime": "18:00"}\n'
+        response = fixture.send(client, 'POST', '/api/v1/import?kind=resources&format=jsonl', ('raw', data))
+        self.assertEqual(response.status_int, 202)
+        location = response.headers['Location']
+        self.assertEqual(json.loads(response.body)['status'], 'queued')
+        fixture.runTasks(self.bed)
+        response = fixture.send(client, 'GET', location)
+        self.assertEqual(response.status_int, 200)
+        item = json.loads(response.body)
+        self.assertEqual((item['kind'], item['format'], item['status']), ('resources', 'jsonl', 'done'))
+        self.assertEqual((item['rowsRead'], item['imported'], item['failed'], item['errors']), (1, 1, 0, []))
+
+    def testBadKindIsRefused(self):
+        response = fixture.send(self.client(strict=False), 'POST', '/api/v1/import?kind=rules&format=jsonl',
+                                ('raw', '{}\n'))
+        self.assertEqual(response.status_int, 400)
+
+if __name__ == '__main__':
+    unittest.main()
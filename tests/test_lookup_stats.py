@@ -0,0 +1,56 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''Checks that primaryKey lookups count where NDB found each key: the context cache, memcache or the datastore.'''
+
+import unittest
+
+from google.appengine.api import memcache
+
+import resourceShare
+from tests import fixture
+
+class LookupStatsTest(fixture.StubTestCase):
+    def setUp(self):
+        fixture.StubTestCase.setUp(self)
+        self.resource = self.makeResource('Room')
+        memcache.flush_all()
+        fixture.resetInstance()
+
+    def lookup(self):
+        resource = resourceShare.getByPrimaryKey(resourceShare.Resource, self.resource.primaryKey)
+        self.assertEqual(resource.key, self.resource.key)
+
+    def counts(self):
+        snapshot = resourceShare.model.lookup.lookupStats.snapshot()
+        return dict((outcome, snapshot.get('Resource.' + outcome, 0))
+                    for outcome in ('byKey', 'contextCache', 'memcache', 'datastore'))
+
+    def testColdLookupIsADatastoreMiss(self):
+        self.lookup()
+        self.assertEqual(self.counts(), {'byKey': 1, 'contextCache': 0, 'memcache': 0, 'datastore': 1})
+
+    def testRepeatedLookupHitsTheContextCache(self):
+        self.lookup()
+        self.lookup()
+        self.assertEqual(self.counts(), {'byKey': 2, 'contextCache': 1, 'memcache': 0, 'datastore': 1})
+
+    def testLookupInANewContextHitsMemcache(self):
+        self.lookup()
+        fixture.freshContext()
+        self.lookup()
+        self.assertEqual(self.counts(), {'byKey': 2, 'contextCache': 0, 'memcache': 1, 'datastore': 1})
+
+if __name__ == '__main__':
+    unittest.main()
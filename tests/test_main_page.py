@@ -0,0 +1,49 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''Checks that the landing page lists the resources of the signed in user a page at a time.'''
+
+import re
+import unittest
+
+import resourceShare
+from tests import fixture
+
+class MainPageTest(fixture.StubTestCase):
+    def setUp(self):
+        fixture.StubTestCase.setUp(self)
+        self.owned = resourceShare.USER_RESOURCES_PAGE_SIZE + 5
+        for index in range(self.owned):
+            self.makeResource('Room %d' % index)
+
+    def listed(self, response):
+        return re.findall(r'rss\?keyVal=(\w+)', response.body)
+
+    def testOwnResourcesArePaged(self):
+        client = self.client()
+        first = fixture.send(client, 'GET', '/?keyVal=onlyUser')
+        self.assertEqual(first.status_int, 200)
+        self.assertEqual(len(self.listed(first)), resourceShare.USER_RESOURCES_PAGE_SIZE)
+        cursor = re.search(r'mineCursor=([^#"]+)#userResources', first.body).group(1)
+        second = fixture.send(client, 'GET', '/?keyVal=onlyUser&mineCursor=' + cursor)
+        self.assertEqual(len(self.listed(second)), self.owned - resourceShare.USER_RESOURCES_PAGE_SIZE)
+        self.assertFalse(set(self.listed(first)) & set(self.listed(second)))
+        self.assertNotIn('mineCursor=', second.body)
+
+    def testBadCursorStartsOver(self):
+        response = fixture.send(self.client(), 'GET', '/?keyVal=onlyUser&mineCursor=nonsense')
+        self.assertEqual(len(self.listed(response)), resourceShare.USER_RESOURCES_PAGE_SIZE)
+
+if __name__ == '__main__':
+    unittest.main()
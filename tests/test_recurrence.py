@@ -0,0 +1,148 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''Checks booking, skipping and cancelling recurring reservations, how they are counted, and the day arithmetic that
+expands them.'''
+
+import datetime
+import unittest
+
+from google.appengine.api import memcache
+
+import resourceShare
+from tests import fixture
+
+class RecurrenceCountTest(fixture.StubTestCase):
+    def setUp(self):
+        fixture.StubTestCase.setUp(self)
+        self.resource = self.makeResource('Room')
+        # a daily rule from tomorrow over seven days occurs seven times
+        self.rule = self.makeRule(self.resource, '18:00', 30, frequency='DAILY', untilDays=6)
+        self.assertEqual(resourceShare.bookRecurrence(self.resource, self.rule), [])
+
+    def count(self):
+        fixture.freshContext()
+        memcache.flush_all()
+        resource = resourceShare.getByPrimaryKey(resourceShare.Resource, self.resource.primaryKey)
+        return resourceShare.attachReservationCounts([resource])[0].reservationCount
+
+    def testRuleCountsEachOccurrence(self):
+        self.assertEqual(self.count(), 7)
+
+    def testSkippingAnOccurrenceUncountsIt(self):
+        resourceShare.skipOccurrence(self.rule, self.tomorrow)
+        self.assertEqual(self.count(), 6)
+
+    def testSkippingTwiceOrOffTheRuleChangesNothing(self):
+        resourceShare.skipOccurrence(self.rule, self.tomorrow)
+        resourceShare.skipOccurrence(self.rule, self.tomorrow)
+        resourceShare.skipOccurrence(self.rule, self.tomorrow + datetime.timedelta(days=30))
+        self.assertEqual(self.count(), 6)
+
+    def testDeletingARuleUncountsWhatItStillCounts(self):
+        resourceShare.skipOccurrence(self.rule, self.tomorrow)
+        self.assertTrue(resourceShare.deleteRecurrence(self.rule))
+        self.assertEqual(self.count(), 0)
+        self.assertFalse(resourceShare.deleteRecurrence(self.rule))
+        self.assertEqual(self.count(), 0)
+
+    def testRuleStoredBeforeOccurrenceCountingCountsOnce(self):
+        stored = self.rule.key.get()
+        stored.countedOccurrences = None
+        stored.put()
+        resourceShare.changeReservationCount(self.resource.primaryKey, 1 - 7)
+        resourceShare.skipOccurrence(self.rule, self.tomorrow)
+        self.assertEqual(self.count(), 1)
+        resourceShare.deleteRecurrence(self.rule)
+        self.assertEqual(self.count(), 0)
+
+class RecurrenceBookingTest(fixture.StubTestCase):
+    def setUp(self):
+        fixture.StubTestCase.setUp(self)
+        self.resource = self.makeResource('Room', startTime='08:00', endTime='20:00')
+
+    def testWeeklyRuleBlocksOnlyTheDaysItOccursOn(self):
+        rule = self.makeRule(self.resource, '18:00', 30, untilDays=13)
+        self.assertEqual(resourceShare.bookRecurrence(self.resource, rule), [])
+        with self.assertRaises(resourceShare.ReservationConflict):
+            self.book(self.resource, '18:00', 30, day=self.tomorrow + datetime.timedelta(days=7))
+        self.book(self.resource, '18:00', 30, day=self.tomorrow + datetime.timedelta(days=1))
+
+    def testRuleMeetingAReservationReturnsTheClashAndIsTakenBack(self):
+        clash = self.tomorrow + datetime.timedelta(days=2)
+        self.book(self.resource, '18:15', 30, day=clash)
+        rule = self.makeRule(self.resource, '18:00', 30, frequency='DAILY', untilDays=6)
+        self.assertEqual(resourceShare.bookRecurrence(self.resource, rule), [clash])
+        fixture.freshContext()
+        self.assertIsNone(rule.key.get())
+        self.assertEqual(resourceShare.getRecurrences(self.resource.primaryKey).rules, [])
+        self.book(self.resource, '18:00', 30)
+
+    def testOverlappingRulesClash(self):
+        first = self.makeRule(self.resource, '18:00', 30, frequency='DAILY', untilDays=6)
+        self.assertEqual(resourceShare.bookRecurrence(self.resource, first), [])
+        second = self.makeRule(self.resource, '18:15', 30, untilDays=6)
+        self.assertEqual(resourceShare.bookRecurrence(self.resource, second), [self.tomorrow])
+        fixture.freshContext()
+        self.assertIsNone(second.key.get())
+        self.assertEqual([spec['primaryKey'] for spec in resourceShare.getRecurrences(self.resource.primaryKey).rules],
+                         [first.primaryKey])
+
+    def testRuleOutsideTheWindowIsRefused(self):
+        rule = self.makeRule(self.resource, '19:45', 30)
+        self.assertEqual(resourceShare.bookRecurrence(self.resource, rule), [self.tomorrow])
+        fixture.freshContext()
+        self.assertIsNone(rule.key.get())
+
+    def testSkippedOccurrenceFreesItsSlot(self):
+        rule = self.makeRule(self.resource, '18:00', 30, frequency='DAILY', untilDays=6)
+        self.assertEqual(resourceShare.bookRecurrence(self.resource, rule), [])
+        rule = resourceShare.skipOccurrence(rule, self.tomorrow)
+        self.book(self.resource, '18:00', 30)
+        occurrences = resourceShare.expandRecurrences([rule], self.today, self.tomorrow + datetime.timedelta(days=6))
+        self.assertEqual([occurrence.reservation_Date for occurrence in occurrences],
+                         [self.tomorrow + datetime.timedelta(days=days) for days in range(1, 7)])
+
+class RecurrenceSpecTest(unittest.TestCase):
+    # 2030-01-07 is a Monday
+    MONDAY = datetime.date(2030, 1, 7).toordinal()
+
+    def spec(self, frequency, interval=1, weekdays=(), days=27, skipped=()):
+        return {'primaryKey': '1', 'frequency': frequency, 'interval': interval, 'weekdays': sorted(weekdays),
+                'first': self.MONDAY, 'last': self.MONDAY + days, 'start': 18 * 60, 'end': 18 * 60 + 30,
+                'skipped': sorted(self.MONDAY + day for day in skipped)}
+
+    def days(self, spec, fromDay=0, toDay=27):
+        return [ordinal - self.MONDAY for ordinal in
+                resourceShare.occurrenceOrdinals(spec, self.MONDAY + fromDay, self.MONDAY + toDay)]
+
+    def testEveryOtherWeekOnMondaysAndWednesdays(self):
+        spec = self.spec('WEEKLY', interval=2, weekdays=[0, 2])
+        self.assertEqual(self.days(spec), [0, 2, 14, 16])
+        self.assertEqual([day for day in range(28) if resourceShare.occursOn(spec, self.MONDAY + day)], [0, 2, 14, 16])
+        self.assertEqual(resourceShare.occurrenceCount(spec), 4)
+
+    def testWindowStartingMidRuleKeepsTheRulePeriod(self):
+        self.assertEqual(self.days(self.spec('WEEKLY', interval=2, weekdays=[0, 2]), fromDay=3), [14, 16])
+        self.assertEqual(self.days(self.spec('DAILY', interval=3), fromDay=4, toDay=12), [6, 9, 12])
+
+    def testSkippedDaysAndDaysOutsideTheRuleDoNotOccur(self):
+        spec = self.spec('DAILY', days=6, skipped=[2])
+        self.assertEqual(self.days(spec, fromDay=-3, toDay=10), [0, 1, 3, 4, 5, 6])
+        self.assertFalse(resourceShare.occursOn(spec, self.MONDAY - 1))
+        self.assertFalse(resourceShare.occursOn(spec, self.MONDAY + 7))
+        self.assertEqual(resourceShare.occurrenceCount(spec), 6)
+
+if __name__ == '__main__':
+    unittest.main()
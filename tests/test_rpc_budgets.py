@@ -0,0 +1,80 @@
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''Requests every route of rpc_budgets.yaml under strict budget checking, cold and warm, so a route making more
+datastore RPCs than its budget fails the test.'''
+
+import unittest
+
+from google.appengine.api import memcache
+import webtest
+
+import resourceShare
+from tests import fixture
+
+# a URL of each budgeted route, filled in with the seeded resource, reservation and rule
+ROUTE_URLS = [
+    ('MainPage', '/'),
+    ('MainPage', '/?keyVal=onlyUser'),
+    ('ViewResource', '/viewResource?keyVal=%(resource)s'),
+    ('ViewReservation', '/viewReservation?keyVal=%(reservation)s'),
+    ('ViewReservation', '/viewReservation?kind=rule&keyVal=%(rule)s'),
+    ('Search', '/searchResource?type=name&name=Room'),
+    ('Search', '/searchResource?type=time&duration=30&startTime=10:00'),
+    ('Tags', '/tags?tag=lab'),
+    ('Tags', '/tags?tag=lab&all=1'),
+    ('RSS', '/rss?keyVal=%(resource)s'),
+    ('Feed', '/feed?keyVal=%(resource)s'),
+    ('AddReservation', '/addReservation?keyVal=%(resource)s'),
+]
+
+class RpcBudgetTest(fixture.StubTestCase):
+    def setUp(self):
+        fixture.StubTestCase.setUp(self)
+        resources = [self.makeResource('Room %d' % index, tags=['lab']) for index in range(5)]
+        reservation = self.book(resources[0], '09:00', 30)
+        rule = self.makeRule(resources[0], '18:00', 30)
+        self.assertEqual(resourceShare.bookRecurrence(resources[0], rule), [])
+        resourceShare.recurrenceBooked(resources[0], rule)
+        self.seeded = {'resource': resources[0].primaryKey, 'reservation': reservation.primaryKey,
+                       'rule': rule.primaryKey}
+
+    def testEveryBudgetedRouteIsRequested(self):
+        self.assertEqual(set(route for route, url in ROUTE_URLS), set(resourceShare.RPC_BUDGETS))
+
+    def testRoutesStayWithinTheirBudgets(self):
+        client = self.client(strict=True)
+        for route, url in ROUTE_URLS:
+            for cold in (True, False):
+                if cold:
+                    memcache.flush_all()
+                response = fixture.send(client, 'GET', url % self.seeded)
+                self.assertEqual(response.status_int, 200, '%s answered %s' % (url, response.status))
+                summary = client.app.lastSummary
+                self.assertEqual(summary['route'], route)
+                self.assertFalse(summary['overBudget'], '%s made %d datastore RPCs %s, over its budget of %d' % (
+                    url, summary['datastoreRpcs'], 'cold' if cold else 'warm', summary['rpcBudget']))
+
+    def testStrictModeFailsARequestOverBudget(self):
+        application = resourceShare.PerformanceMiddleware(resourceShare.application, {'MainPage': 0}, strict=True)
+        client = webtest.TestApp(application)
+        with self.assertRaises(resourceShare.RpcBudgetExceeded):
+            fixture.send(client, 'GET', '/')
+
+    def testBudgetsAreReadFromTheConfigFile(self):
+        self.assertEqual(resourceShare.loadRpcBudgets(resourceShare.RPC_BUDGETS_FILE), resourceShare.RPC_BUDGETS)
+        self.assertTrue(all(isinstance(budget, int) and budget > 0 for budget in resourceShare.RPC_BUDGETS.values()))
+
+if __name__ == '__main__':
+    unittest.main()
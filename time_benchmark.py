@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+
+# Copyright 2016 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''Compares the time filter and search hot paths before and after times were stored as minutes of the day.
+
+Needs the App Engine SDK on PYTHONPATH, but no datastore: the entities are
+built in memory. The "before" paths are copies of the code the app ran when
+times were only "HH:MM" strings: the upcoming reservations filter parsing every
+end time with strptime, and the time search turning every resource's times into
+integers. The "after" paths are the ones the app runs now: the same filter on
+the minute fields, the upcoming reservations view filter on epoch seconds, and
+the availability engine. Every path runs --runs times over --resources
+resources and --reservations reservations.'''
+
+import argparse
+import datetime
+import random
+import time
+
+import resourceShare
+
+DEFAULT_RESOURCES = 10000
+DEFAULT_RESERVATIONS = 10000
+DEFAULT_RUNS = 20
+SLOT_MINUTES = 15
+SEED = 2016
+
+'''the upcoming reservations filter as it was: parses the end time of every reservation on every page view'''
+def filterReservationsOnEndTimeBefore(reservationList):
+    returnList = []
+    for reservation in reservationList:
+        presentDateTime = datetime.datetime.now() - datetime.timedelta(minutes=240)
+        converteddate = datetime.datetime.combine(presentDateTime.date(), datetime.datetime.strptime(reservation.reservation_EndTime, '%H:%M').time())
+        if (converteddate - presentDateTime).total_seconds() > 0:
+            returnList.append(reservation)
+    return returnList
+
+'''the same filter on the minute fields'''
+def filterReservationsOnEndTimeAfter(reservationList):
+    now = resourceShare.localNow()
+    minute = now.hour * 60 + now.minute
+    return [reservation for reservation in reservationList if resourceShare.reservationInterval(reservation)[1] > minute]
+
+'''the time search as it was: formats the end time through str() of a datetime and compares every resource's times
+as integers made from their strings'''
+def searchOnTimeBefore(allResources, startTime, duration):
+    selectedResources = []
+    endTime = str((datetime.datetime.strptime(startTime, '%H:%M') + datetime.timedelta(minutes=duration)))
+    times = endTime.split(":")
+    final = times[0].split(" ")[1] + ":" + times[1]
+    for resource in allResources:
+        if int(resource.resource_StartTime.replace(":", "")) <= int(startTime.replace(":", "")):
+            if int(resource.resource_EndTime.replace(":", "")) >= int(final.replace(":", "")):
+                selectedResources.append(resource)
+    return selectedResources
+
+'''the same search on the minute fields, still visiting every resource'''
+def searchOnTimeAfter(allResources, startTime, duration):
+    start = resourceShare.toMinutes(startTime)
+    end = start + duration
+    return [resource for resource in allResources
+            if resource.resource_StartMinute <= start and resource.resource_EndMinute >= end]
+
+'''helper function to build resources with minute fields filled in as their put would'''
+def buildResources(count, generator):
+    resources = []
+    for index in range(count):
+        start = generator.randrange(6 * 60, 10 * 60, SLOT_MINUTES)
+        resource = resourceShare.Resource(primaryKey=str(resourceShare.LEGACY_KEY_MAX + index + 1),
+                                          resource_StartTime=resourceShare.toTimeString(start),
+                                          resource_EndTime=resourceShare.toTimeString(start + generator.randrange(6, 14) * 60))
+        resource.resource_StartMinute = resourceShare.toMinutes(resource.resource_StartTime)
+        resource.resource_EndMinute = resourceShare.toMinutes(resource.resource_EndTime)
+        resources.append(resource)
+    return resources
+
+'''helper function to build reservations of the resources over the coming week, minute fields filled in'''
+def buildReservations(count, resources, generator):
+    today = resourceShare.localNow().date()
+    reservations = []
+    for index in range(count):
+        resource = generator.choice(resources)
+        start = generator.randrange(resource.resource_StartMinute, resource.resource_EndMinute - 60, SLOT_MINUTES)
+        duration = generator.choice([15, 30, 60])
+        reservation = resourceShare.Reservation(primaryKey=str(resourceShare.LEGACY_KEY_MAX + index + 1),
+                                                resource_PrimaryKey=resource.primaryKey,
+                                                resource_Name='Room %s' % resource.primaryKey,
+                                                reservation_Owner='benchmark@example.com',
+                                                reservation_StartTime=resourceShare.toTimeString(start),
+                                                reservation_EndTime=resourceShare.toTimeString(start + duration),
+                                                reservation_Duration=duration,
+                                                reservation_Date=today + datetime.timedelta(days=generator.randint(0, 6)))
+        reservation.reservation_StartMinute, reservation.reservation_EndMinute = resourceShare.reservationInterval(
+            reservation, computed=True)
+        reservations.append(reservation)
+    return reservations
+
+def report(step, runs, itemCount, seconds, detail=''):
+    print('%-34s %5d runs %9.4f s/run %12.0f items/s   %s' % (step, runs, seconds / runs,
+                                                            runs * itemCount / max(seconds, 1e-9), detail))
+
+'''helper function to time runs of a function, returning its last result'''
+def timed(step, runs, itemCount, function):
+    started = time.time()
+    for run in range(runs):
+        result = function()
+    report(step, runs, itemCount, time.time() - started, '%d matched' % len(result))
+    return result
+
+def benchmark(resourceCount, reservationCount, runs):
+    generator = random.Random(SEED)
+    resources = buildResources(resourceCount, generator)
+    reservations = buildReservations(reservationCount, resources, generator)
+
+    timed('filter before (strptime)', runs, reservationCount, lambda: filterReservationsOnEndTimeBefore(reservations))
+    timed('filter after (minute fields)', runs, reservationCount, lambda: filterReservationsOnEndTimeAfter(reservations))
+    view = resourceShare.UpcomingReservations(entries=[])
+    view.add([entry for entry in (resourceShare.upcomingEntry(reservation) for reservation in reservations)
+              if entry is not None])
+    timed('filter after (upcoming view)', runs, len(view.entries), lambda: view.upcoming(time.time()))
+
+    startTime = '12:00'
+    timed('search before (string to int)', runs, resourceCount, lambda: searchOnTimeBefore(resources, startTime, 60))
+    timed('search after (minute fields)', runs, resourceCount, lambda: searchOnTimeAfter(resources, startTime, 60))
+    state = resourceShare.AvailabilityState(resourceShare.localNow().date())
+    for resource in resources:
+        state.setWindow(resource.primaryKey, resourceShare.entityKey(resourceShare.Resource, resource.primaryKey),
+                        resourceShare.resourceWindow(resource))
+    start = resourceShare.toMinutes(startTime)
+    timed('search after (availability engine)', runs, resourceCount,
+          lambda: state.free(start, start + 60, resourceShare.TIME_SEARCH_LIMIT))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the time filter and search paths before and after.')
+    parser.add_argument('--resources', type=int, default=DEFAULT_RESOURCES, help='resources to search')
+    parser.add_argument('--reservations', type=int, default=DEFAULT_RESERVATIONS, help='reservations to filter')
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS, help='runs of every path')
+    options = parser.parse_args()
+    benchmark(options.resources, options.reservations, options.runs)